@@ -0,0 +1,151 @@
+import os
+import json
+import collections
+
+# 語彙ファイルが無い時の語彙（以前のキーワードと同じもの）
+DEFAULT_LEXICON = {
+    "emotions": {
+        "happy": {"嬉しい": 1.0, "楽しい": 1.0, "やったー": 1.0, "！！": 1.0, "わーい": 1.0},
+        "angry": {"怒": 1.0, "むかっ": 1.0, "許さない": 1.0, "ひどい": 1.0},
+        "sad": {"悲しい": 1.0, "さみしい": 1.0, "泣": 1.0, "つらい": 1.0},
+        "surprised": {"びっくり": 1.0, "えっ": 1.0, "まさか": 1.0, "驚": 1.0},
+    },
+    "negations": [],
+    "negation_window": 2,
+    "negation_weight": -0.5,
+    "threshold": 1.0,
+}
+
+# 複数の文字列を1回の走査で探す
+class PatternMatcher:
+    """Aho-Corasick法で、patterns のどれかが現れる位置をテキストを1回走査するだけで全て探します。"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]  # 状態 -> {文字: 次の状態}
+        self.fail = [0]  # 状態 -> 一致に失敗した時に戻る状態
+        self.output = [[]]  # 状態 -> その状態で一致が終わる文字列
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(pattern)
+
+    def _link(self):
+        # 浅い状態から順に、一番長い接尾辞の状態を失敗時の戻り先にする
+        pending = collections.deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self.goto[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def finditer(self, text):
+        """見つけた文字列ごとに (開始位置, 終了位置, 文字列) を返すジェネレータです。"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.output[state]:
+                yield i + 1 - len(pattern), i + 1, pattern
+
+# 語彙を照合できる形にしたもの
+CompiledLexicon = collections.namedtuple(
+    "CompiledLexicon",
+    ["matcher", "keywords", "negations", "emotions", "negation_window", "negation_weight", "threshold"])
+
+# 重み付きの語彙による感情の判定
+class EmotionClassifier:
+    """重み付きの語彙（JSON）でテキストの感情ごとの点数を付けます。
+
+    語彙ファイルは DEFAULT_LEXICON と同じ形です。emotions は感情ごとの {語: 重み}、
+    negations は直後に付くと語の意味を打ち消す語（「くない」など）です。
+    語の終わりから negation_window 文字以内に打ち消しの語が始まっていれば、
+    その語の重みに negation_weight を掛けます。長い語に含まれる短い語（「泣き虫」の「泣」など）は数えません。
+    一番点数の高い感情が threshold 以上ならその感情、そうでなければ normal と判定します。
+    同点なら emotions に先に書いた感情です。
+
+    maybe_reload() はファイルの更新時刻が変わっていれば読み直します。
+    読めなかった時は前の語彙のまま判定を続けます。
+    """
+
+    def __init__(self, path=None, log=print):
+        self.path = path
+        self.log = log
+        self.mtime = None
+        self.lexicon = self.compile(DEFAULT_LEXICON)
+
+    @staticmethod
+    def compile(lexicon):
+        """語彙（辞書）を照合できる形にします。形が正しくなければValueErrorです。"""
+        keywords = collections.defaultdict(list)  # 語 -> [(感情, 重み)]
+        emotions = tuple(lexicon["emotions"])
+        for emotion, words in lexicon["emotions"].items():
+            for word, weight in words.items():
+                keywords[word].append((emotion, float(weight)))
+        negations = frozenset(lexicon.get("negations", ()))
+        return CompiledLexicon(PatternMatcher(set(keywords) | negations), dict(keywords), negations,
+                               emotions, int(lexicon.get("negation_window", 2)),
+                               float(lexicon.get("negation_weight", -0.5)),
+                               float(lexicon.get("threshold", 1.0)))
+
+    def maybe_reload(self):
+        """語彙ファイルが変わっていれば読み直し、読み直した時はTrueを返します。"""
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False  # ファイルが無ければ今の語彙のまま
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lexicon = self.compile(json.load(f))
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            self.log(f"感情の語彙を読み込めません（前の語彙を使います）: {e}")
+            return False
+        # 参照を差し替えるだけなので、判定中の他のスレッドは前の語彙のまま終われる
+        self.lexicon = lexicon
+        self.log(f"感情の語彙を読み込みました: {len(lexicon.keywords)}語")
+        return True
+
+    def score(self, text):
+        """テキストの感情ごとの点数（0より大きいものだけ）を返します。"""
+        lexicon = self.lexicon
+        matches = sorted(lexicon.matcher.finditer(text), key=lambda match: (match[0], -match[1]))
+        negation_starts = [start for start, _, word in matches if word in lexicon.negations]
+
+        scores = dict.fromkeys(lexicon.emotions, 0.0)
+        covered = 0  # 数えた語の終わり（これより前で終わる語は、数えた語に含まれている）
+        for start, end, word in matches:
+            if word not in lexicon.keywords or end <= covered:
+                continue
+            covered = end
+            negated = any(end <= position <= end + lexicon.negation_window for position in negation_starts)
+            for emotion, weight in lexicon.keywords[word]:
+                scores[emotion] += weight * lexicon.negation_weight if negated else weight
+        return {emotion: score for emotion, score in scores.items() if score > 0}
+
+    def classify(self, text):
+        """テキストの (感情, 感情ごとの点数) を返します。"""
+        scores = self.score(text)
+        emotion = max(scores, key=scores.get, default="normal")
+        if scores.get(emotion, 0.0) < self.lexicon.threshold:
+            emotion = "normal"
+        return emotion, scores
@@ -0,0 +1,123 @@
+import time
+import heapq
+import itertools
+import threading
+import collections
+
+# call_later などが返すタイマー
+class Timer:
+    """EventLoopに登録したタイマーです。cancel()で取り消せます。"""
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+# イベントとタイマーで動くメインループ
+class EventLoop:
+    """他のスレッドから post() されたイベントと、単調時計のタイマーを処理するループです。
+
+    処理するものが無い間は次のタイマーの時刻まで（無ければイベントが来るまで）
+    眠っているので、ポーリングせずにミリ秒単位で反応できます。ハンドラとタイマーは
+    すべてループを回しているスレッドで順番に実行されます。
+
+    clock には時刻を返す関数を渡せます。シミュレーションでは仮想時計を渡し、
+    run_once(block=False) で時刻を進めながら回します。
+    """
+
+    def __init__(self, clock=time.monotonic, error_handler=None):
+        self.clock = clock
+        self.error_handler = error_handler  # error_handler(例外)。Noneならprintする
+        self.handlers = collections.defaultdict(list)
+        self._events = collections.deque()
+        self._timers = []  # (時刻, 通し番号, Timer) のヒープ
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+
+    def on(self, kind, handler):
+        """kindのイベントが来た時に handler(payload) を呼ぶよう登録します。"""
+        self.handlers[kind].append(handler)
+
+    def post(self, kind, payload=None):
+        """イベントを積みます。どのスレッドからでも呼べます。"""
+        with self._cond:
+            self._events.append((kind, payload))
+            self._cond.notify()
+
+    def call_at(self, when, callback, *args):
+        """時刻whenに callback(*args) を呼ぶタイマーを登録します。"""
+        timer = Timer(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._timers, (when, next(self._sequence), timer))
+            self._cond.notify()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """delay秒後に callback(*args) を呼ぶタイマーを登録します。"""
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def next_deadline(self):
+        """次に実行するタイマーの時刻を返します。無ければNoneです。"""
+        with self._cond:
+            self._drop_cancelled()
+            return self._timers[0][0] if self._timers else None
+
+    def _drop_cancelled(self):
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+
+    def _take_ready(self, block):
+        # 実行できるイベントと期限の来たタイマーを取り出す（無ければblockに応じて待つ）
+        with self._cond:
+            while True:
+                self._drop_cancelled()
+                events = list(self._events)
+                self._events.clear()
+                now = self.clock()
+                timers = []
+                while self._timers and self._timers[0][0] <= now:
+                    timer = heapq.heappop(self._timers)[2]
+                    if not timer.cancelled:
+                        timers.append(timer)
+                if events or timers or not block or self._stopping:
+                    return events, timers
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._cond.wait(timeout)
+
+    def run_once(self, block=True):
+        """溜まっているイベントと期限の来たタイマーを実行し、実行した数を返します。"""
+        events, timers = self._take_ready(block)
+        for kind, payload in events:
+            for handler in self.handlers.get(kind, ()):
+                self._call(handler, payload)
+        for timer in timers:
+            if not timer.cancelled:
+                self._call(timer.callback, *timer.args)
+        return len(events) + len(timers)
+
+    def _call(self, callback, *args):
+        # ハンドラの例外でループが止まらないようにする
+        try:
+            callback(*args)
+        except Exception as e:
+            if self.error_handler:
+                self.error_handler(e)
+            else:
+                print(f"イベント処理エラー: {e}")
+
+    def run_forever(self):
+        """stop()が呼ばれるまでループを回します。"""
+        self._stopping = False
+        while not self._stopping:
+            self.run_once(block=True)
+
+    def stop(self):
+        """run_forever()を終わらせます。どのスレッドからでも呼べます。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
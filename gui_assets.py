@@ -0,0 +1,246 @@
+import os
+import time
+import struct
+import hashlib
+
+GUI_ASSET_CACHE_DIR = "./gui_cache"  # 画面サイズに合わせて縮小した画像の保存先
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNGのヘッダから画像サイズを読む
+def read_png_size(path):
+    """PNGファイルの (幅, 高さ) をヘッダだけ読んで返します。PNGでなければNoneです。"""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+# 画像の元サイズを取得
+def read_image_size(path):
+    """画像の (幅, 高さ) を返します。PNG以外の場合だけPILで開きます。"""
+    size = read_png_size(path)
+    if size is None:
+        from PIL import Image
+        with Image.open(path) as image:
+            size = image.size
+    return size
+
+# 表示領域に合わせた画像サイズを計算
+def fit_image_size(image_size, frame_size, min_ratio=0.6):
+    """縦横比を保ったまま、領域の min_ratio 以上に引き伸ばし、領域からはみ出さないサイズを返します。"""
+    img_width, img_height = image_size
+    frame_width, frame_height = frame_size
+    aspect_ratio = img_width / img_height
+
+    # 最低限のサイズ（小さい解像度の場合は引き伸ばす）
+    min_width = max(int(frame_width * min_ratio), img_width)
+    min_height = max(int(frame_height * min_ratio), img_height)
+
+    if min_width / min_height > aspect_ratio:
+        new_height = min_height
+        new_width = int(new_height * aspect_ratio)
+    else:
+        new_width = min_width
+        new_height = int(new_width / aspect_ratio)
+
+    # 領域に収める（大きすぎる場合は縮小）
+    if new_width > frame_width:
+        new_width = int(frame_width)
+        new_height = int(new_width / aspect_ratio)
+    if new_height > frame_height:
+        new_height = int(frame_height)
+        new_width = int(new_height * aspect_ratio)
+    return max(new_width, 1), max(new_height, 1)
+
+# 元画像の内容のハッシュ
+def file_digest(path):
+    """ファイル内容のmd5を返します（画像が差し替えられたらキャッシュも作り直すため）。"""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# 縮小済み画像のキャッシュ
+def get_scaled_image(source, size, cache_dir=GUI_ASSET_CACHE_DIR):
+    """source を size (幅, 高さ) に縮小したPNGのパスを返します。
+
+    縮小済みの画像は「元画像のハッシュ + サイズ」をファイル名にして cache_dir に保存するので、
+    同じ画像・同じ画面サイズなら2回目以降はPILを読み込まずにそのまま使えます。
+    """
+    width, height = size
+    stem = os.path.splitext(os.path.basename(source))[0]
+    cache_path = os.path.join(cache_dir, f"{stem}_{file_digest(source)[:16]}_{width}x{height}.png")
+    if os.path.exists(cache_path):
+        return cache_path
+
+    from PIL import Image  # 縮小が必要な時だけ読み込む
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(source) as image:
+        scaled = image.resize((width, height), Image.Resampling.LANCZOS)
+    tmp_path = cache_path + ".tmp"
+    scaled.save(tmp_path, format="PNG")
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+# 領域に合わせて縮小した画像のパス
+def get_fitted_image(source, frame_size, cache_dir=GUI_ASSET_CACHE_DIR):
+    """source を frame_size に収まるよう縮小したPNGのパスと、そのサイズを返します。"""
+    size = fit_image_size(read_image_size(source), frame_size)
+    return get_scaled_image(source, size, cache_dir), size
+
+# 表示内容が変わった時だけウィジェットを更新
+class WidgetUpdater:
+    """ウィジェットに最後に設定した値を覚えておき、変わった項目だけ config() します。
+
+    Tkはconfig()のたびに再レイアウトと再描画をするので、毎秒同じ文字列を
+    設定し直すだけでもCPUを使います。
+    """
+
+    def __init__(self):
+        self._values = {}  # ウィジェット -> {項目: 値}
+        self.skipped = 0  # 値が同じで更新しなかった回数
+
+    def set(self, widget, **options):
+        """値が変わった項目だけ widget.config() に渡します。更新したらTrueを返します。"""
+        current = self._values.setdefault(widget, {})
+        changed = {key: value for key, value in options.items() if current.get(key) != value}
+        if not changed:
+            self.skipped += 1
+            return False
+        widget.config(**changed)
+        current.update(changed)
+        return True
+
+# GUIの1フレームにかかった時間の集計
+class FrameStats:
+    """GUI処理1回（1フレーム）ごとの時間を集計し、report_interval 秒ごとに報告します。"""
+
+    def __init__(self, report=print, report_interval=600.0, clock=time.perf_counter, observe=None):
+        self.report = report
+        self.observe = observe  # observe(名前, 秒) をフレームごとに呼ぶ（計測用）
+        self.report_interval = report_interval
+        self.clock = clock
+        self._reset(clock())
+
+    def _reset(self, now):
+        self.frames = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.by_name = {}  # 名前 -> [回数, 合計時間]
+        self._since = now
+
+    def start(self):
+        """フレームの開始時刻を返します。end() に渡してください。"""
+        return self.clock()
+
+    def end(self, started, name="frame"):
+        """フレームの終了を記録し、報告の時刻になっていれば報告します。"""
+        now = self.clock()
+        elapsed = now - started
+        self.frames += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        entry = self.by_name.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        if self.observe:
+            self.observe(name, elapsed)
+        if now - self._since >= self.report_interval:
+            self.report(self.summary())
+            self._reset(now)
+        return elapsed
+
+    def summary(self):
+        """集計結果を1行の文字列で返します。"""
+        if not self.frames:
+            return "GUIフレーム: 記録なし"
+        parts = ", ".join(f"{name} {count}回 平均{total / count * 1000:.2f}ms"
+                          for name, (count, total) in sorted(self.by_name.items()))
+        return (f"GUIフレーム: {self.frames}回 平均{self.total / self.frames * 1000:.2f}ms "
+                f"最大{self.max * 1000:.2f}ms ({parts})")
+
+# キャラクターの表情と口の形
+SPRITE_EMOTIONS = ("normal", "happy", "angry", "sad", "surprised")
+SPRITE_MOUTHS = ("closed", "open")
+
+# 表情・口の形に対応する画像ファイルを探す
+def find_sprite_source(sprite_dir, emotion, mouth, prefix="zunda"):
+    """{prefix}_{表情}_mouth_{口}.png を探します。口を閉じた画像は {prefix}_{表情}.png でも構いません。"""
+    names = [f"{prefix}_{emotion}_mouth_{mouth}.png"]
+    if mouth == "closed":
+        names.append(f"{prefix}_{emotion}.png")
+    for name in names:
+        path = os.path.join(sprite_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+# 表情と口パクの画像をまとめて持つアトラス
+class SpriteAtlas:
+    """全ての表情 × 口の形の画像を起動時に縮小・デコードしてメモリに持っておきます。
+
+    切り替え時は辞書を引いてウィジェットに渡すだけなので、デコードも縮小もしません。
+    画像が無い組み合わせは「同じ表情の口を閉じた画像」→「normalの同じ口」→
+    「normalの口を閉じた画像」の順に代わりを使います。デコード後のサイズ
+    （幅 × 高さ × 4バイト）の合計が max_bytes を超える画像は読み込まず、代わりの画像で表示します。
+
+    Args:
+        load_image: 縮小済みPNGのパスから表示用の画像（tk.PhotoImageなど）を作る関数。
+    """
+
+    def __init__(self, sprite_dir, load_image, max_bytes, cache_dir=GUI_ASSET_CACHE_DIR):
+        self.sprite_dir = sprite_dir
+        self.load_image = load_image
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.frames = {}  # (表情, 口) -> 画像（代わりの画像も解決済み）
+        self.loaded = {}  # (表情, 口) -> 実際に読み込んだ画像
+        self.skipped = []  # メモリ上限で読み込まなかった (表情, 口)
+        self.bytes = 0
+
+    def load(self, frame_size):
+        """frame_size に収まるよう全フレームを読み込みます。normalの口を閉じた画像が無ければ例外です。"""
+        by_source = {}  # 同じ画像ファイルは1回だけ読み込む
+        # 優先度の高い順（normal → 各表情の口を閉じた画像 → 各表情の口を開けた画像）
+        order = [("normal", "closed"), ("normal", "open")]
+        order += [(emotion, mouth) for mouth in SPRITE_MOUTHS for emotion in SPRITE_EMOTIONS
+                  if emotion != "normal"]
+        for key in order:
+            source = find_sprite_source(self.sprite_dir, *key)
+            if source is None:
+                continue
+            if source in by_source:
+                self.loaded[key] = by_source[source]
+                continue
+            width, height = fit_image_size(read_image_size(source), frame_size)
+            size_bytes = width * height * 4
+            if key != ("normal", "closed") and self.bytes + size_bytes > self.max_bytes:
+                self.skipped.append(key)
+                continue
+            image = self.load_image(get_scaled_image(source, (width, height), self.cache_dir))
+            by_source[source] = image
+            self.loaded[key] = image
+            self.bytes += size_bytes
+
+        if ("normal", "closed") not in self.loaded:
+            raise FileNotFoundError(f"{self.sprite_dir} に normal の画像がありません")
+        for emotion in SPRITE_EMOTIONS:
+            for mouth in SPRITE_MOUTHS:
+                fallbacks = [(emotion, mouth), (emotion, "closed"), ("normal", mouth), ("normal", "closed")]
+                key = next(key for key in fallbacks if key in self.loaded)
+                self.frames[(emotion, mouth)] = self.loaded[key]
+        return self
+
+    def get(self, emotion, mouth="closed"):
+        """表情と口の形に対応する画像を返します。"""
+        frame = self.frames.get((emotion, mouth))
+        return frame if frame is not None else self.frames[("normal", mouth)]
+
+    def summary(self):
+        """読み込んだ画像の数とメモリ使用量を1行の文字列で返します。"""
+        line = (f"スプライト: {len(self.loaded)}/{len(SPRITE_EMOTIONS) * len(SPRITE_MOUTHS)}フレーム "
+                f"{self.bytes / 1024 / 1024:.1f}MB (上限{self.max_bytes / 1024 / 1024:.0f}MB)")
+        if self.skipped:
+            line += f" 上限のため省略: {', '.join(f'{e}/{m}' for e, m in self.skipped)}"
+        return line
@@ -0,0 +1,3 @@
+from .ultrasonic import UltrasonicRanger, MockGPIO, SPEED_OF_SOUND
+from .hal import (Hardware, HardwareBusyError, create_backend, get_hardware,
+                  LED_PINS, TRIG_PIN, ECHO_PIN)
@@ -0,0 +1,153 @@
+import os
+import threading
+
+from led_engine import LedEngine
+from .ultrasonic import UltrasonicRanger, SPEED_OF_SOUND
+
+# ピンの割り当て（BCM番号）
+LED_PINS = (16, 20, 21)  # 赤, 緑, 青
+LED_PWM_FREQUENCY = 1000
+TRIG_PIN = 15
+ECHO_PIN = 14
+
+HARDWARE_BACKEND = os.environ.get("ZUNDA_HW_BACKEND", "auto")  # auto, rpi, sim, replay:<パス>, record:<パス>
+HARDWARE_LOCK_FILE = os.environ.get("ZUNDA_HW_LOCK", "/tmp/zunda_hardware.lock")
+
+# 他のプロセスがピンを使っている
+class HardwareBusyError(RuntimeError):
+    pass
+
+# 設定に合わせてバックエンドを作る
+def create_backend(spec=None):
+    """HARDWARE_BACKEND の指定に合わせてバックエンドを作ります。
+
+    auto は RPi.GPIO が読み込めれば rpi、読み込めなければ sim です。
+    replay:<パス> は記録した距離を再生し、record:<パス> は実機（autoと同じ選び方）の
+    距離をそのパスに記録します。
+    """
+    spec = spec or HARDWARE_BACKEND
+    if spec.startswith("replay:"):
+        from .replay import ReplayBackend
+        return ReplayBackend(spec[len("replay:"):], echo_pin=ECHO_PIN)
+    if spec.startswith("record:"):
+        from .replay import RecordingBackend
+        return RecordingBackend(create_backend("auto"), spec[len("record:"):])
+    if spec == "auto":
+        try:
+            import RPi.GPIO  # noqa: F401
+            spec = "rpi"
+        except ImportError:
+            spec = "sim"
+    if spec == "rpi":
+        from .rpi import RpiBackend
+        return RpiBackend()
+    if spec == "sim":
+        from .sim import SimBackend
+        return SimBackend(echo_pin=ECHO_PIN)
+    raise ValueError(f"不明なハードウェアバックエンドです: {spec}")
+
+# ピンの持ち主
+class Hardware:
+    """LEDと超音波センサーのピンを1か所で持つクラスです。
+
+    import しただけではハードウェアに触らず、ranger や led_engine に初めて
+    アクセスした時にバックエンドを開きます。実機のバックエンドはロックファイルを
+    flock() で押さえるので、led_sens.py と zunda_talk6.py が同時にピンを使うことはありません。
+    """
+
+    def __init__(self, backend=None, lock_path=HARDWARE_LOCK_FILE):
+        self._backend = backend
+        self.lock_path = lock_path
+        self._gpio = None
+        self._ranger = None
+        self._led_engine = None
+        self._lock_file = None
+        self._lock = threading.RLock()
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = create_backend()
+            return self._backend
+
+    @property
+    def gpio(self):
+        """バックエンドのGPIO（RPi.GPIO か MockGPIO）。初めて使う時に初期化します。"""
+        with self._lock:
+            if self._gpio is None:
+                backend = self.backend
+                if backend.exclusive:
+                    self._acquire_pins()
+                self._gpio = backend.open()
+            return self._gpio
+
+    def _acquire_pins(self):
+        import fcntl
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise HardwareBusyError(f"他のプロセスがGPIOを使っています（{self.lock_path}）")
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+
+    @property
+    def ranger(self):
+        """超音波センサーのドライバ（UltrasonicRanger）。"""
+        with self._lock:
+            if self._ranger is None:
+                self._ranger = UltrasonicRanger(self.gpio, TRIG_PIN, ECHO_PIN,
+                                                speed_of_sound=SPEED_OF_SOUND)
+                self.backend.attach(self._ranger)
+            return self._ranger
+
+    @property
+    def led_engine(self):
+        """RGB LEDのアニメーションエンジン（LedEngine）。"""
+        with self._lock:
+            if self._led_engine is None:
+                self.gpio  # ピンを押さえてから出力を作る
+                pins = [self.backend.create_pwm(pin, LED_PWM_FREQUENCY) for pin in LED_PINS]
+                self._led_engine = LedEngine(pins)
+            return self._led_engine
+
+    def set_led_color(self, r, g, b, fade=0.0):
+        """LEDの色を設定します（各色 0～65535）。"""
+        self.led_engine.set_color((r, g, b), fade)
+
+    def get_distance(self):
+        """最新の測定距離(cm)を返します。"""
+        return self.ranger.get_distance()
+
+    def close(self):
+        """測定とLEDを止め、LEDを消してピンを解放します。"""
+        with self._lock:
+            if self._ranger is not None:
+                self._ranger.stop()
+                self._ranger = None
+            if self._led_engine is not None:
+                self._led_engine.stop()  # LEDも消える
+                self._led_engine = None
+            if self._gpio is not None:
+                self._backend.close()
+                self._gpio = None
+            if self._lock_file is not None:
+                self._lock_file.close()  # flockも外れる
+                self._lock_file = None
+
+_hardware = None
+_hardware_lock = threading.Lock()
+
+# プロセスで1つのHardwareを返す
+def get_hardware():
+    """プロセス全体で共有する Hardware を返します（まだハードウェアには触りません）。"""
+    global _hardware
+    with _hardware_lock:
+        if _hardware is None:
+            _hardware = Hardware()
+        return _hardware
@@ -0,0 +1,85 @@
+import time
+import bisect
+import threading
+
+from presence import read_distance_trace
+from .sim import SimBackend
+
+# 距離の記録を再生するバックエンド
+class ReplayBackend(SimBackend):
+    """「時刻,距離」のCSVを、open() した時刻を0秒として模擬センサーから返します。
+
+    記録の最後まで来たら、loop がTrueなら最初に戻り、Falseなら最後の距離のままです。
+    """
+
+    name = "replay"
+
+    def __init__(self, path, loop=False, clock=time.monotonic, echo_pin=14):
+        super().__init__(distance_fn=self._distance_at_now, echo_pin=echo_pin)
+        rows = read_distance_trace(path)
+        if not rows:
+            raise ValueError(f"距離の記録が空です: {path}")
+        origin = rows[0][0]
+        self.times = [t - origin for t, _ in rows]
+        self.distances = [distance for _, distance in rows]
+        self.loop = loop
+        self.clock = clock
+        self.started = None
+
+    def open(self):
+        self.started = self.clock()
+        return super().open()
+
+    def distance_at(self, elapsed):
+        """再生開始から elapsed 秒の距離を返します。"""
+        if self.loop and self.times[-1] > 0:
+            elapsed %= self.times[-1]
+        index = bisect.bisect_right(self.times, elapsed) - 1
+        return self.distances[max(0, index)]
+
+    def _distance_at_now(self):
+        return self.distance_at(self.clock() - (self.started or self.clock()))
+
+# 距離を記録するバックエンド
+class RecordingBackend:
+    """別のバックエンドをそのまま使いながら、測定した距離を「時刻,距離」のCSVに書き出します。
+
+    書き出したファイルは ReplayBackend や presence.py でそのまま再生できます。
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.name = f"record({backend.name})"
+        self.exclusive = backend.exclusive
+        self._file = None
+        self._origin = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("time,distance\n")
+        return self.backend.open()
+
+    def create_pwm(self, pin, frequency):
+        return self.backend.create_pwm(pin, frequency)
+
+    def attach(self, ranger):
+        self.backend.attach(ranger)
+        ranger.add_listener(self._record)
+
+    def _record(self, distance, measured_at):
+        # 測定スレッドから呼ばれる
+        with self._lock:
+            if self._file is None:
+                return
+            if self._origin is None:
+                self._origin = measured_at
+            self._file.write(f"{measured_at - self._origin:.3f},{distance:.1f}\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.backend.close()
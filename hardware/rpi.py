@@ -0,0 +1,31 @@
+# Raspberry Pi実機のバックエンド（RPi.GPIO + pwmio）
+class RpiBackend:
+    """実機のGPIOとPWMを使うバックエンドです。ライブラリは open() の時に初めて読み込みます。"""
+
+    name = "rpi"
+    exclusive = True  # ピンを使うプロセスは1つだけにする
+
+    def __init__(self):
+        self.gpio = None
+
+    def open(self):
+        """GPIOをBCMモードで初期化し、RPi.GPIO モジュールを返します。"""
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)  # GPIOをBCMモードで使用
+        GPIO.setwarnings(False)  # GPIO警告無効化
+        self.gpio = GPIO
+        return GPIO
+
+    def create_pwm(self, pin, frequency):
+        """BCMピン番号 pin の pwmio.PWMOut を作ります。"""
+        import board
+        import pwmio
+        return pwmio.PWMOut(getattr(board, f"D{pin}"), frequency=frequency, duty_cycle=0)
+
+    def attach(self, ranger):
+        pass
+
+    def close(self):
+        if self.gpio is not None:
+            self.gpio.cleanup()
+            self.gpio = None
@@ -0,0 +1,51 @@
+import os
+
+from .ultrasonic import MockGPIO
+
+SIM_DEFAULT_DISTANCE = float(os.environ.get("ZUNDA_SIM_DISTANCE", "200"))  # 模擬センサーの初期距離(cm)
+
+# 模擬PWM出力
+class SimPWMOut:
+    """pwmio.PWMOut の代わりに duty_cycle を覚えておくだけの出力です。"""
+
+    def __init__(self, pin, frequency=1000, duty_cycle=0):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = duty_cycle
+
+    def deinit(self):
+        pass
+
+# ハードウェア無しで動かすバックエンド
+class SimBackend:
+    """MockGPIO と SimPWMOut を使うバックエンドです。距離は set_distance() か distance_fn で決めます。"""
+
+    name = "sim"
+    exclusive = False
+
+    def __init__(self, distance_fn=None, echo_pin=14):
+        self.distance = SIM_DEFAULT_DISTANCE
+        self.distance_fn = distance_fn or (lambda: self.distance)
+        self.echo_pin = echo_pin
+        self.pwm_outputs = {}  # ピン番号 -> SimPWMOut
+        self.gpio = None
+
+    def set_distance(self, distance):
+        """模擬センサーが返す距離(cm)を変えます。Noneならエコーを返しません。"""
+        self.distance = distance
+
+    def open(self):
+        self.gpio = MockGPIO(distance_fn=lambda: self.distance_fn(), echo_pin=self.echo_pin)
+        return self.gpio
+
+    def create_pwm(self, pin, frequency):
+        self.pwm_outputs[pin] = SimPWMOut(pin, frequency)
+        return self.pwm_outputs[pin]
+
+    def attach(self, ranger):
+        pass
+
+    def close(self):
+        if self.gpio is not None:
+            self.gpio.cleanup()
+            self.gpio = None
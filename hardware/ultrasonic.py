@@ -0,0 +1,290 @@
+import time
+import threading
+
+SPEED_OF_SOUND = 34370  # 20℃での音速(cm/s)
+
+# 超音波センサー（HC-SR04）の距離測定ドライバ
+class UltrasonicRanger:
+    """Echoピンのエッジ割り込みで時刻を記録して距離を測るドライバです。
+
+    測定は専用スレッドが interval 秒ごとに行い、最新の値は get_latest() で
+    どのスレッドからでも取り出せます。エッジ検出が使えない環境では、
+    time.monotonic() を使ったタイムアウト付きのポーリングで測ります。
+    エコーが返ってこなかった場合は max_distance（範囲外）として扱います。
+
+    Args:
+        gpio: RPi.GPIO モジュール、または同じAPIを持つ MockGPIO。
+        trig_pin (int): Trigピン番号（BCM）。
+        echo_pin (int): Echoピン番号（BCM）。
+        interval (float): 測定間隔（秒）。
+        timeout (float): エコー待ちのタイムアウト（秒）。
+        max_distance (float): エコーが無い時に返す距離（cm）。
+        observe: 測定スレッドが1回測定するたびに observe(かかった秒数) を呼びます（計測用）。
+    """
+
+    def __init__(self, gpio, trig_pin, echo_pin, interval=0.1, timeout=0.03,
+                 max_distance=400.0, speed_of_sound=SPEED_OF_SOUND, use_edge_detect=True,
+                 observe=None):
+        self.gpio = gpio
+        self.trig_pin = trig_pin
+        self.echo_pin = echo_pin
+        self.interval = interval
+        self.timeout = timeout
+        self.max_distance = max_distance
+        self.speed_of_sound = speed_of_sound
+        self.use_edge_detect = use_edge_detect
+        self.observe = observe
+        self.missed_echoes = 0  # エコーが返ってこなかった回数
+        self._rise_time = None
+        self._fall_time = None
+        self._echo_done = threading.Event()
+        self._latest = None  # (距離, 測定時刻)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._is_setup = False
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """測定のたびに測定スレッドから callback(距離, 測定時刻) を呼ぶよう登録します。"""
+        self._listeners.append(callback)
+
+    def setup(self):
+        """ピンを設定し、可能ならEchoピンのエッジ検出を登録します。"""
+        if self._is_setup:
+            return
+        self.gpio.setup(self.trig_pin, self.gpio.OUT)
+        self.gpio.setup(self.echo_pin, self.gpio.IN)
+        self.gpio.output(self.trig_pin, self.gpio.LOW)
+        if self.use_edge_detect:
+            try:
+                self.gpio.add_event_detect(self.echo_pin, self.gpio.BOTH, callback=self._on_edge)
+            except (RuntimeError, AttributeError) as e:
+                print(f"エッジ検出が使えないのでポーリングで測定します: {e}")
+                self.use_edge_detect = False
+        self._is_setup = True
+
+    def _on_edge(self, channel):
+        # GPIOの割り込みスレッドから呼ばれる。立ち上がり・立ち下がりの時刻を記録するだけ
+        # どちらのエッジかは届いた順番で決める（近距離ではコールバックが呼ばれるまでに
+        # パルスが終わっていることがあり、その時点のピンの値では判断できない）
+        now = time.monotonic()
+        if self._rise_time is None:
+            self._rise_time = now
+        elif self._fall_time is None:
+            self._fall_time = now
+            self._echo_done.set()
+
+    def _trigger(self):
+        self.gpio.output(self.trig_pin, self.gpio.HIGH)
+        time.sleep(0.000010)
+        self.gpio.output(self.trig_pin, self.gpio.LOW)
+
+    def _poll_echo(self):
+        # エッジ検出が使えない場合のポーリング。タイムアウトで必ず抜ける
+        deadline = time.monotonic() + self.timeout
+        while not self.gpio.input(self.echo_pin):
+            if time.monotonic() > deadline:
+                return None
+        t1 = time.monotonic()
+        while self.gpio.input(self.echo_pin):
+            if time.monotonic() > deadline:
+                return None
+        t2 = time.monotonic()
+        return t2 - t1
+
+    def measure_once(self):
+        """1回測定して距離(cm)を返します。エコーが無ければNoneです。"""
+        self.setup()
+        if self.use_edge_detect:
+            if self.gpio.input(self.echo_pin):
+                return None  # 前のエコーがまだ続いている（そのエッジを今回のものと取り違えないように）
+            self._rise_time = None
+            self._fall_time = None
+            self._echo_done.clear()
+            self._trigger()
+            if not self._echo_done.wait(self.timeout):
+                return None
+            pulse = self._fall_time - self._rise_time
+        else:
+            self._trigger()
+            pulse = self._poll_echo()
+            if pulse is None:
+                return None
+        return pulse * self.speed_of_sound / 2
+
+    def _publish(self, distance):
+        measured_at = time.monotonic()
+        with self._cond:
+            self._latest = (distance, measured_at)
+            self._cond.notify_all()
+        for callback in self._listeners:
+            try:
+                callback(distance, measured_at)
+            except Exception as e:
+                print(f"距離リスナーのエラー: {e}")
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            distance = self.measure_once()
+            if self.observe:
+                self.observe(time.monotonic() - started)
+            if distance is None:
+                self.missed_echoes += 1
+                distance = self.max_distance
+            self._publish(distance)
+
+            # 測定にかかった時間を差し引いて一定間隔を保つ
+            next_time += self.interval
+            wait = next_time - time.monotonic()
+            if wait < 0:
+                next_time = time.monotonic()
+                wait = 0
+            self._stop_event.wait(wait)
+
+    def start(self):
+        """測定スレッドを開始します。"""
+        if self._thread is not None:
+            return
+        self.setup()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """測定スレッドを止め、エッジ検出を解除します。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._is_setup and self.use_edge_detect:
+            try:
+                self.gpio.remove_event_detect(self.echo_pin)
+            except (RuntimeError, AttributeError):
+                pass
+        self._is_setup = False
+
+    def get_latest(self):
+        """最新の (距離, 測定時刻) を返します。まだ測定していなければNoneです。"""
+        with self._cond:
+            return self._latest
+
+    def wait_for_reading(self, after=None, timeout=None):
+        """測定時刻がafterより新しい値が出るまで待ち、(距離, 測定時刻) を返します。"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._latest is not None and (after is None or self._latest[1] > after),
+                timeout)
+            return self._latest
+
+    def get_distance(self):
+        """最新の距離(cm)を返します。最初の測定がまだなら、それを待ちます。"""
+        reading = self.get_latest() or self.wait_for_reading(timeout=1.0)
+        return reading[0] if reading else self.max_distance
+
+# RPi.GPIOの代わりに使う模擬GPIO（Raspberry Pi以外でのテスト用）
+class MockGPIO:
+    """Trigの立ち下がりで、distance_fn() の距離に応じたエコーパルスをEchoピンに出します。
+
+    distance_fn が None を返すとエコーを出しません（測定タイムアウトの再現）。
+    """
+
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, distance_fn=lambda: 100.0, echo_pin=14, speed_of_sound=SPEED_OF_SOUND):
+        self.distance_fn = distance_fn
+        self.echo_pin = echo_pin
+        self.speed_of_sound = speed_of_sound
+        self.levels = {}
+        self.callbacks = {}
+        self._echo_window = None  # (立ち上がり時刻, 立ち下がり時刻)
+        self._echo_override = None  # 割り込みコールバック中に見せるEchoの値
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, **kwargs):
+        self.levels.setdefault(pin, self.LOW)
+
+    def output(self, pin, value):
+        previous = self.levels.get(pin, self.LOW)
+        self.levels[pin] = value
+        if pin != self.echo_pin and previous == self.HIGH and value == self.LOW:
+            self._schedule_echo()
+
+    def input(self, pin):
+        if pin != self.echo_pin:
+            return self.levels.get(pin, self.LOW)
+        if self._echo_override is not None:
+            return self._echo_override
+        # Echoの値は時刻から決める（GILの都合でタイマーが遅れても測定値がずれないように）
+        window = self._echo_window
+        if window and window[0] <= time.monotonic() < window[1]:
+            return self.HIGH
+        return self.LOW
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, *pins):
+        self.levels.clear()
+        self.callbacks.clear()
+
+    def _schedule_echo(self):
+        distance = self.distance_fn()
+        if distance is None:
+            self._echo_window = None
+            return
+        rise = time.monotonic() + 0.0005
+        fall = rise + distance * 2 / self.speed_of_sound
+        self._echo_window = (rise, fall)
+        if self.echo_pin in self.callbacks:
+            threading.Thread(target=self._fire_edges, args=(rise, fall), daemon=True).start()
+
+    def _fire_edges(self, rise, fall):
+        # 実機の割り込みと同じく、立ち上がりと立ち下がりでコールバックを呼ぶ
+        for edge_time, level in ((rise, self.HIGH), (fall, self.LOW)):
+            time.sleep(max(0.0, edge_time - time.monotonic()))
+            callback = self.callbacks.get(self.echo_pin)
+            if callback is None:
+                return
+            self._echo_override = level
+            try:
+                callback(self.echo_pin)
+            finally:
+                self._echo_override = None
+
+if __name__ == "__main__":
+    # Raspberry Pi上ではRPi.GPIO、それ以外では模擬GPIOで距離を表示する
+    try:
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+    except ImportError:
+        GPIO = MockGPIO(distance_fn=lambda: 120.0)
+
+    ranger = UltrasonicRanger(GPIO, trig_pin=15, echo_pin=14)
+    ranger.start()
+    try:
+        last = None
+        while True:
+            last = ranger.wait_for_reading(after=last[1] if last else None)
+            print(f"Distance: {last[0]:.1f} cm")
+    except KeyboardInterrupt:
+        ranger.stop()
+        GPIO.cleanup()
@@ -0,0 +1,287 @@
+import math
+import time
+import threading
+
+LED_MAX = 65535  # duty_cycleの最大値
+LED_FPS = 50  # アニメーションのフレームレート
+LED_GAMMA = 2.2  # ガンマ補正の値（明るさの見た目を線形にする）
+GAMMA_TABLE_BITS = 10  # ガンマ補正表の精度（2^10段階）
+
+# 虹色の色を生成する関数
+def wheel(pos):
+    """虹色のグラデーションを生成する関数。
+
+    Args:
+        pos (int): 色の位置 (0～255)。
+
+    Returns:
+        tuple: (r, g, b) のタプル。各色は0～65535の範囲の値。
+    """
+    if pos < 85:
+        return (int(pos * 3 * 257), int((255 - pos * 3) * 257), 0)
+    elif pos < 170:
+        pos -= 85
+        return (int((255 - pos * 3) * 257), 0, int(pos * 3 * 257))
+    else:
+        pos -= 170
+        return 0, int(pos * 3 * 257), int((255 - pos * 3) * 257)
+
+WHEEL_TABLE = tuple(wheel(pos) for pos in range(256))  # wheel()の計算済みの表
+
+# ガンマ補正表を作る
+def build_gamma_table(gamma=LED_GAMMA, bits=GAMMA_TABLE_BITS):
+    """明るさ(0～65535)の上位bitsビットから、補正後のduty_cycleを引く表を返します。"""
+    steps = (1 << bits) - 1
+    return tuple(int(round((i / steps) ** gamma * LED_MAX)) for i in range(steps + 1))
+
+# 2色の間を補間
+def mix_color(a, b, ratio):
+    """a から b へ ratio (0～1) だけ進んだ色を返します。"""
+    return tuple(int(x + (y - x) * ratio) for x, y in zip(a, b))
+
+# 色を倍率で暗くする
+def scale_color(color, level):
+    return tuple(int(c * level) for c in color)
+
+# LEDの効果の基底クラス
+class LedEffect:
+    """LEDエンジンが毎フレーム render(経過秒) を呼んで色を決める効果です。
+
+    duration が None なら止めるまで続き、秒数なら経過後は最後の色のままになります。
+    static がTrueの効果は色が時間で変わらないので、エンジンは1回描いたら次の効果まで眠ります。
+    """
+
+    duration = None
+    static = False
+
+    def render(self, elapsed):
+        raise NotImplementedError
+
+# 一定の色
+class Solid(LedEffect):
+    static = True
+
+    def __init__(self, color):
+        self.color = tuple(color)
+
+    def render(self, elapsed):
+        return self.color
+
+# ゆっくり明るくなったり暗くなったりする
+class Pulse(LedEffect):
+    def __init__(self, color, period=2.0, min_level=0.2, duration=None):
+        self.color = tuple(color)
+        self.period = period
+        self.min_level = min_level
+        self.duration = duration
+
+    def render(self, elapsed):
+        wave = (1 - math.cos(2 * math.pi * elapsed / self.period)) / 2
+        return scale_color(self.color, self.min_level + (1 - self.min_level) * wave)
+
+# 虹色のグラデーション
+class Rainbow(LedEffect):
+    """period 秒で虹色を1周します（led_sens.pyのrainbow()と同じ色の並びです）。"""
+
+    def __init__(self, period=2.56, duration=None):
+        self.period = period
+        self.duration = duration
+
+    def render(self, elapsed):
+        return WHEEL_TABLE[int(elapsed / self.period * 256) & 255]
+
+# 点滅
+class Blink(LedEffect):
+    def __init__(self, color, interval=0.5, duration=None):
+        self.color = tuple(color)
+        self.interval = interval  # 点灯・消灯それぞれの秒数
+        self.duration = duration
+
+    def render(self, elapsed):
+        return self.color if int(elapsed / self.interval) % 2 == 0 else (0, 0, 0)
+
+# 音量の包絡線に合わせた明るさ（口パク）
+class Envelope(LedEffect):
+    """levels（0～255の bytes）を frame_sec ごとの明るさとして color を明滅させます。
+
+    包絡線は音声の合成時に計算済みなので、再生中は表を引くだけです。
+    最後まで再生したら color の明るさに戻ります。
+    """
+
+    def __init__(self, color, levels, frame_sec, min_level=0.15):
+        self.color = tuple(color)
+        self.levels = levels
+        self.frame_sec = frame_sec
+        self.min_level = min_level
+        self.duration = len(levels) * frame_sec
+
+    def render(self, elapsed):
+        index = int(elapsed / self.frame_sec)
+        if index >= len(self.levels):
+            return self.color
+        level = self.levels[max(0, index)] / 255
+        return scale_color(self.color, self.min_level + (1 - self.min_level) * level)
+
+# 距離に応じた点滅（近いほど速く点滅し、遠い時は虹色）
+class DistanceBlink(LedEffect):
+    """get_distance() の距離に合わせて色と点滅の速さを変えます。
+
+    get_distance() はエンジンのロックの中で毎フレーム呼ぶので、測定を待たずに
+    最新の測定値を返す関数にしてください。まだ測定値が無ければNoneを返せます。
+    bands は (この距離未満, 色) の近い順のリストです。どれにも入らない時や距離がNoneの時は虹色を表示します。
+    点滅の速さが変わっても位相を積み上げるので、点滅が途中で飛びません。
+    """
+
+    def __init__(self, get_distance, bands=((50, (LED_MAX, 0, 0)), (100, (0, LED_MAX, 0)),
+                                            (150, (0, 0, LED_MAX))), rainbow_period=2.56):
+        self.get_distance = get_distance
+        self.bands = bands
+        self.rainbow = Rainbow(rainbow_period)
+        self._phase = 0.0
+        self._last = 0.0
+
+    def render(self, elapsed):
+        dt = elapsed - self._last
+        self._last = elapsed
+        distance = self.get_distance()
+        if distance is None:
+            return self.rainbow.render(elapsed)
+        for limit, color in self.bands:
+            if distance < limit:
+                blink_speed = max(0.1, distance / 100)  # 点灯・消灯それぞれの秒数（最小0.1秒）
+                self._phase = (self._phase + dt / blink_speed) % 2
+                return color if self._phase < 1 else (0, 0, 0)
+        return self.rainbow.render(elapsed)
+
+# LEDアニメーションエンジン
+class LedEngine:
+    """RGBの3本のPWMピンを専用スレッドで一定のフレームレートで更新します。
+
+    post() は効果を差し替えるだけですぐに戻るので、どのスレッドからでも呼べます。
+    fade 秒を指定すると、その時の色から新しい効果へなめらかに移ります。
+    出力にはガンマ補正をかけ、前のフレームと同じduty_cycleは書き込みません。
+    時間で変わらない効果を描き終わったら、次の post() まで眠ります。
+
+    Args:
+        pins: 赤・緑・青の pwmio.PWMOut（duty_cycle 属性を持つもの）。
+    """
+
+    def __init__(self, pins, fps=LED_FPS, gamma=LED_GAMMA, clock=time.monotonic):
+        self.pins = tuple(pins)
+        self.frame_interval = 1.0 / fps
+        self.gamma_table = build_gamma_table(gamma) if gamma else None
+        self.clock = clock
+        self.color = (0, 0, 0)  # 直近に描いた色（ガンマ補正前）
+        self.frames = 0  # 描いたフレーム数
+        self.writes = 0  # duty_cycleに書き込んだ回数
+        self.skipped_writes = 0  # 値が変わらず書き込まなかった回数
+        self._duty = [None] * len(self.pins)
+        self._effect = None
+        self._effect_start = 0.0
+        self._fade_from = None
+        self._fade_sec = 0.0
+        self._idle = True  # 次のpost()まで描く必要が無い
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def post(self, effect, fade=0.0, start=None):
+        """効果を差し替えます。fade 秒かけて今の色から新しい効果へ移ります。
+
+        start には効果の0秒目にする時刻（clockと同じ基準）を指定できます。
+        音声の再生開始時刻に合わせる時に使います。
+        """
+        with self._cond:
+            self._effect = effect
+            self._effect_start = self.clock() if start is None else start
+            self._fade_from = self.color if fade > 0 else None
+            self._fade_sec = fade
+            self._idle = False
+            self._cond.notify()
+
+    def set_color(self, color, fade=0.0):
+        """一定の色にします（fade 秒かけて移ります）。"""
+        self.post(Solid(color), fade)
+
+    def _render(self, now):
+        # self._condを持った状態で呼ぶ。描く色と、この先も描き続ける必要があるかを返す
+        effect = self._effect
+        elapsed = now - self._effect_start
+        if effect.duration is not None and elapsed > effect.duration:
+            elapsed = effect.duration
+        color = effect.render(elapsed)
+        animating = not effect.static and (effect.duration is None or elapsed < effect.duration)
+        if self._fade_from is not None:
+            if elapsed < self._fade_sec:
+                color = mix_color(self._fade_from, color, elapsed / self._fade_sec)
+                animating = True
+            else:
+                self._fade_from = None
+        return color, animating
+
+    def _write(self, color):
+        self.color = color
+        for i, (pin, value) in enumerate(zip(self.pins, color)):
+            value = max(0, min(LED_MAX, value))
+            if self.gamma_table:
+                value = self.gamma_table[value >> (16 - GAMMA_TABLE_BITS)]
+            if value == self._duty[i]:
+                self.skipped_writes += 1
+                continue
+            pin.duty_cycle = value
+            self._duty[i] = value
+            self.writes += 1
+
+    def _run(self):
+        next_frame = self.clock()
+        while True:
+            with self._cond:
+                while self._idle and not self._stopping:
+                    self._cond.wait()
+                    next_frame = self.clock()
+                if self._stopping:
+                    return
+                color, animating = self._render(self.clock())
+                self._idle = not animating
+            self._write(color)
+            self.frames += 1
+
+            # 描画にかかった時間を差し引いて一定のフレームレートを保つ
+            next_frame += self.frame_interval
+            wait = next_frame - self.clock()
+            if wait < 0:
+                next_frame = self.clock()
+                wait = 0
+            with self._cond:
+                if not self._idle and not self._stopping:
+                    self._cond.wait(wait)
+
+    def render_once(self):
+        """今の効果を1フレームだけ描きます（スレッドを使わないシミュレーション用）。"""
+        with self._cond:
+            if self._effect is None:
+                return self.color
+            color, animating = self._render(self.clock())
+            self._idle = not animating
+        self._write(color)
+        self.frames += 1
+        return color
+
+    def start(self):
+        """描画スレッドを開始します。"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, off=True):
+        """描画スレッドを止めます。off がTrueならLEDを消します。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if off:
+            self._write((0, 0, 0))
@@ -0,0 +1,202 @@
+import time
+import bisect
+import threading
+import http.server
+
+# ヒストグラムの既定のバケット（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ラベルをPrometheusの形式にする
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+# カウンタ
+class Counter:
+    """増えるだけの数です。"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text="", labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, format_labels(self.labels), self.value
+
+# 時間の分布
+class Histogram:
+    """固定のバケットに観測値を数えるヒストグラムです。
+
+    observe() は二分探索で数を1つ増やすだけなので、ホットパスで呼んでもほぼ負担になりません。
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は+Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        """with文で囲んだ処理の時間を観測します。"""
+        return Span(self)
+
+    def quantile(self, q):
+        """バケットの上端で近似した分位数を返します（観測が無ければNone）。"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            largest = self.max
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (largest,), counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, largest)
+        return largest
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            total_sum = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield self.name + "_bucket", format_labels(self.labels, [("le", repr(bound))]), cumulative
+        yield self.name + "_bucket", format_labels(self.labels, [("le", "+Inf")]), total
+        yield self.name + "_sum", format_labels(self.labels), total_sum
+        yield self.name + "_count", format_labels(self.labels), total
+
+# with文で時間を計る
+class Span:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+# メトリクスの一覧
+class Registry:
+    """カウンタとヒストグラムを名前とラベルで管理し、Prometheusのテキスト形式で出力します。"""
+
+    def __init__(self):
+        self.metrics = {}  # (名前, ラベル) -> メトリクス
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = cls(name, help_text, key[1], **kwargs)
+                self.metrics[key] = metric
+            return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Prometheusのテキスト形式（version 0.0.4）の文字列を返します。"""
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: (metric.name, metric.labels))
+        lines = []
+        last_name = None
+        for metric in metrics:
+            if metric.name != last_name:
+                if metric.help:
+                    lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                last_name = metric.name
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """観測のあったヒストグラムを「名前 回数 平均 p95」で並べた1行を返します。"""
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: (metric.name, metric.labels))
+        parts = []
+        for metric in metrics:
+            if metric.kind != "histogram" or not metric.count:
+                continue
+            name = metric.name.replace("zunda_", "").replace("_seconds", "")
+            if metric.labels:
+                name += "[" + ",".join(value for _, value in metric.labels) + "]"
+            parts.append(f"{name} {metric.count}回 平均{metric.sum / metric.count * 1000:.1f}ms "
+                         f"p95≦{metric.quantile(0.95) * 1000:.1f}ms")
+        return "計測: " + (" / ".join(parts) if parts else "記録なし")
+
+REGISTRY = Registry()
+
+# 既定の一覧にカウンタを作る
+def counter(name, help_text="", **labels):
+    return REGISTRY.counter(name, help_text, **labels)
+
+# 既定の一覧にヒストグラムを作る
+def histogram(name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+    return REGISTRY.histogram(name, help_text, buckets, **labels)
+
+# /metrics を返すHTTPハンドラ
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # アクセスのたびにターミナルへ出さない
+
+# メトリクスのHTTPサーバーを開始
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """http://host:port/metrics でメトリクスを返すサーバーを専用スレッドで開始し、サーバーを返します。"""
+    handler = type("Handler", (MetricsHandler,), {"registry": registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
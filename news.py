@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import http.server
+import itertools
+import collections
+
+import requests
+
+DEFAULT_BASE_URL = "https://newsdata.io/api/1"
+NEWS_CONNECT_TIMEOUT_SEC = 3.05  # 接続のタイムアウト
+NEWS_READ_TIMEOUT_SEC = 10  # 応答を待つタイムアウト
+
+# NewsData.io APIクライアントの実装
+class NewsDataClient:
+    """NewsData.io の /latest を取得するクライアントです。
+
+    接続は requests.Session で使い回し、接続・読み込みそれぞれにタイムアウトを掛けます。
+    前回の応答に ETag / Last-Modified があれば条件付きリクエストにし、
+    変わっていなければ NOT_MODIFIED を返します。
+    """
+
+    NOT_MODIFIED = "not_modified"
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL,
+                 timeout=(NEWS_CONNECT_TIMEOUT_SEC, NEWS_READ_TIMEOUT_SEC), log=print):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.log = log
+        self.etag = None
+        self.last_modified = None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_latest_news(self, country: str = "jp", category: str = "top", limit: int = 10):
+        """
+        指定した国とカテゴリの最新ニュースを取得
+
+        Args:
+            country (str): 国コード (例: jp, us, gb)
+            category (str): カテゴリ (例: top, business, technology)
+            limit (int): 取得するニュースの数
+
+        Returns:
+            API応答データ（dict）。前回から変わっていなければ NOT_MODIFIED、失敗したらNone。
+        """
+        url = f"{self.base_url}/latest"
+        params = {
+            "country": country,
+            "category": category,
+            "apikey": self.api_key
+        }
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                return self.NOT_MODIFIED
+            if not response.ok:
+                self.log(f"ニュース取得エラー: ステータスコード {response.status_code}")
+                return None
+            data = response.json()
+            if data.get("status") != "success" or "results" not in data:
+                self.log("ニュース取得エラー: API応答が正しくありません")
+                return None
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            # 記事数をlimitに制限
+            data["results"] = data["results"][:limit]
+            return data
+        except (requests.RequestException, ValueError) as e:
+            # 例外の文字列にはURL（APIキーを含む）が入ることがある
+            self.log(f"ニュース取得エラー: {str(e).replace(self.api_key, '***')}")
+            return None
+
+    def close(self):
+        self.session.close()
+
+# ニュースの定期更新スレッド
+class NewsRefresher:
+    """interval 秒ごとに fetch() を呼んでニュースを取り直します（取得中も今のニュースを使い続けます）。
+
+    fetch() は成功（変わっていない場合も含む）ならTrue、失敗ならFalseを返す関数です。
+    失敗した時は retry_base 秒から倍々に retry_max 秒まで、ゆらぎを付けた間隔で再試行します
+    （全台が同じ時刻にAPIへ集中しないよう、待ち時間の後半をランダムにします）。
+    """
+
+    def __init__(self, fetch, interval, retry_base=30.0, retry_max=3600.0, log=print,
+                 clock=time.monotonic):
+        self.fetch = fetch
+        self.interval = interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.log = log
+        self.clock = clock
+        self.failures = 0  # 連続失敗回数
+        self.next_at = None  # 次に取得する時刻
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def retry_delay(self):
+        """連続失敗回数に応じた次の再試行までの秒数です。"""
+        wait = min(self.retry_base * 2 ** (self.failures - 1), self.retry_max)
+        return wait / 2 + random.uniform(0, wait / 2)
+
+    def refresh_now(self):
+        """次の取得を今すぐにします（失敗後の再試行待ちの間は待ちます）。"""
+        if self.failures == 0:
+            self.next_at = self.clock()
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopping:
+            wait = self.next_at - self.clock()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            try:
+                ok = self.fetch()
+            except Exception as e:
+                self.log(f"ニュース更新エラー: {e}")
+                ok = False
+            if ok:
+                self.failures = 0
+                self.next_at = self.clock() + self.interval
+            else:
+                self.failures += 1
+                delay = self.retry_delay()
+                self.next_at = self.clock() + delay
+                self.log(f"ニュース更新失敗（{self.failures}回目）: {delay:.0f}秒後に再試行")
+
+    def start(self, delay=0.0):
+        """delay 秒後に最初の取得をする更新スレッドを開始します。"""
+        if self._thread is not None:
+            return
+        self.next_at = self.clock() + delay
+        self._thread = threading.Thread(target=self._run, name="news", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+# ニュース記事の保存先（追記型のJSON Lines）
+class NewsStore:
+    """対話に使う項目だけを1行1記事で追記していく保存先です。
+
+    API応答から FIELDS の項目だけを残し、article_id（無ければタイトル）で重複を除いて、
+    新しい記事の行だけをファイルの末尾に追記します。メモリには新しい max_articles 件だけを持ちます。
+    ファイルが保持分の2倍より大きくなったら、保持分だけを一時ファイルに書いて置き換えます。
+    load() はファイルの末尾から保持分の行だけを読みます。
+    重複の判定には、保持分とは別に、最近見た記事のキーを max_seen 件まで覚えておきます
+    （取得1回分の記事数が max_articles より多くても、保持分から外れた記事を追記し直さないように）。
+    最後に取得した時刻はファイルの更新時刻で表します（新しい記事が無くても更新します）。
+
+    annotate を渡すと、記事をメモリに取り込む時（merge() と load()）に1回だけ annotate(記事) を呼び、
+    返した項目（見出しの感情など）を加えます。加えた項目はファイルには書きません。
+    """
+
+    FIELDS = ("article_id", "title", "pubDate", "source_id")
+    READ_BLOCK_BYTES = 8192
+
+    def __init__(self, path, max_articles=50, log=print, annotate=None, max_seen=1000):
+        self.path = path
+        self.max_articles = max_articles
+        self.max_seen = max_seen
+        self.log = log
+        self.annotate = annotate
+        self.articles = collections.OrderedDict()  # キー -> 記事（古い順）
+        self.seen = collections.OrderedDict()  # 最近見た記事のキー -> True（古い順）
+        self.file_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def compact(cls, article):
+        """対話に使う項目だけを残した記事を返します。"""
+        return {field: article[field] for field in cls.FIELDS if article.get(field)}
+
+    def _annotated(self, article):
+        if self.annotate is None:
+            return article
+        return {**article, **self.annotate(article)}
+
+    @staticmethod
+    def key_for(article):
+        return article.get("article_id") or hashlib.md5(article.get("title", "").encode("utf-8")).hexdigest()
+
+    def _read_tail_lines(self, f, size):
+        # 末尾からブロック単位で読み、保持分の行（と少しの余裕）が揃ったらやめる
+        data = b""
+        position = size
+        while position > 0 and data.count(b"\n") <= self.max_articles * 2:
+            read = min(self.READ_BLOCK_BYTES, position)
+            position -= read
+            f.seek(position)
+            data = f.read(read) + data
+        lines = data.split(b"\n")
+        if position > 0:
+            lines = lines[1:]  # 途中から読んだ最初の行は欠けている
+        return lines
+
+    def load(self):
+        """ファイルの末尾から新しい記事を読み込み、件数を返します。"""
+        with self._lock:
+            self.articles.clear()
+            self.seen.clear()
+            try:
+                with open(self.path, "rb") as f:
+                    self.file_bytes = os.fstat(f.fileno()).st_size
+                    lines = self._read_tail_lines(f, self.file_bytes)
+            except FileNotFoundError:
+                self.file_bytes = 0
+                return 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    article = json.loads(line)
+                except ValueError:
+                    continue  # 書き込み途中で切れた行など
+                key = self.key_for(article)
+                self._remember(key)
+                self.articles.pop(key, None)
+                self.articles[key] = article
+            while len(self.articles) > self.max_articles:
+                self.articles.popitem(last=False)
+            for key, article in self.articles.items():
+                self.articles[key] = self._annotated(article)
+            return len(self.articles)
+
+    def merge(self, results):
+        """API応答の記事（新しい順）のうち、まだ無いものを追記し、追加した件数を返します。"""
+        with self._lock:
+            added = []
+            for article in reversed(results):  # ファイルは古い順に並べる
+                article = self.compact(article)
+                key = self.key_for(article)
+                if not article.get("title") or key in self.seen:
+                    continue
+                self._remember(key)
+                self.articles[key] = self._annotated(article)
+                added.append(article)
+            while len(self.articles) > self.max_articles:
+                self.articles.popitem(last=False)
+
+            if added:
+                data = "".join(json.dumps(article, ensure_ascii=False) + "\n" for article in added)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(data)
+                self.file_bytes += len(data.encode("utf-8"))
+                if self.file_bytes > 2 * self._window_bytes() + self.READ_BLOCK_BYTES:
+                    self._rewrite()
+            else:
+                self.touch()
+            return len(added)
+
+    def _remember(self, key):
+        # self._lockを持った状態で呼ぶ
+        self.seen.pop(key, None)
+        self.seen[key] = True
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+
+    def _window_bytes(self):
+        return sum(len(json.dumps(self.compact(article), ensure_ascii=False).encode("utf-8")) + 1
+                   for article in self.articles.values())
+
+    def _rewrite(self):
+        # 保持分だけを一時ファイルに書いて置き換える
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for article in self.articles.values():
+                f.write(json.dumps(self.compact(article), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.file_bytes = os.path.getsize(self.path)
+        self.log(f"ニュースの保存先を整理: {len(self.articles)}件")
+
+    def touch(self):
+        """記事が増えなくても、取得した時刻としてファイルの更新時刻を今にします。"""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            open(self.path, "a").close()
+
+    def last_updated(self):
+        """最後に取得した時刻（time.time()基準）を返します。まだ無ければNoneです。"""
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def reannotate(self):
+        """メモリの記事に annotate() の項目を付け直します（判定の基準が変わった時など）。"""
+        with self._lock:
+            for key, article in self.articles.items():
+                self.articles[key] = self._annotated(article)
+
+    def recent(self, count):
+        """新しい順に count 件の記事を返します。"""
+        with self._lock:
+            return list(itertools.islice(reversed(self.articles.values()), count))
+
+# オフラインで試すためのNewsData.io互換スタブサーバー
+class StubNewsHandler(http.server.BaseHTTPRequestHandler):
+    articles = []
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/").split("/")[-1] != "latest":
+            self.send_error(404)
+            return
+        time.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            self.send_error(503)
+            return
+        body = json.dumps({"status": "success", "totalResults": len(self.articles),
+                           "results": self.articles}, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        sys.stderr.write("[stub] " + format % args + "\n")
+
+# スタブサーバーを起動
+def run_stub_server(port, articles, delay=0.0, fail_rate=0.0):
+    handler = type("Handler", (StubNewsHandler,),
+                   {"articles": articles, "delay": delay, "fail_rate": fail_rate})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"スタブサーバー: NEWS_BASE_URL=http://127.0.0.1:{port}/api/1")
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="NewsData.io互換のスタブサーバー（オフラインでの動作確認用）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--file", help="記事を読み込むJSON（news_cache.jsonと同じ形式）")
+    parser.add_argument("--delay", type=float, default=0.0, help="応答までの秒数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="503を返す確率")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            articles = json.load(f).get("results", [])
+    else:
+        articles = [{"article_id": f"stub{i}", "title": f"テスト用のニュース{i}です",
+                     "pubDate": "2026-01-01 00:00:00"} for i in range(10)]
+    run_stub_server(args.port, articles, args.delay, args.fail_rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import sys
+import collections
+
+# 在室状態（遠い順）と、その状態に入る距離(cm)
+PRESENCE_STATES = ("absent", "approaching", "near", "close")
+PRESENCE_ENTER_DISTANCES = (150, 100, 50)  # approaching, near, close に入る距離
+PRESENCE_HYSTERESIS = 15  # 状態から出る時は入る距離よりこの分だけ遠くまで離れる必要がある
+PRESENCE_DEBOUNCE_SEC = 0.3  # 新しい状態がこの秒数続いたら確定する
+
+# 移動方向の判定に使う速度(cm/s)。負の値が近づく方向
+MOTION_APPROACH_SPEED = -20.0
+MOTION_LEAVE_SPEED = 20.0
+
+# 距離のフィルタ（メディアン + EMA + 外れ値除去 + 速度推定）
+class DistanceFilter:
+    """超音波センサーの生の距離を平滑化し、速度(cm/s)を推定します。
+
+    直近 window 個のメディアンを取り、さらに指数移動平均(EMA)をかけます。
+    直前のメディアンから max_jump 以上飛んだ値は外れ値として捨てますが、
+    max_rejects 回続いた場合は本当に距離が変わったものとして受け入れます。
+    """
+
+    def __init__(self, window=5, alpha=0.5, max_jump=80.0, max_rejects=3, velocity_alpha=0.3):
+        self.alpha = alpha
+        self.max_jump = max_jump
+        self.max_rejects = max_rejects
+        self.velocity_alpha = velocity_alpha
+        self.samples = collections.deque(maxlen=window)
+        self.value = None  # フィルタ後の距離
+        self.velocity = 0.0
+        self.rejected = 0  # 外れ値として捨てた累計
+        self._consecutive_rejects = 0
+        self._last_time = None
+
+    def update(self, distance, t):
+        """生の距離と測定時刻(秒)を受け取り、(フィルタ後の距離, 速度) を返します。"""
+        if self.samples:
+            median = sorted(self.samples)[len(self.samples) // 2]
+            if abs(distance - median) > self.max_jump and self._consecutive_rejects < self.max_rejects:
+                self._consecutive_rejects += 1
+                self.rejected += 1
+                return self.value, self.velocity
+            if self._consecutive_rejects >= self.max_rejects:
+                # 飛んだ先の値が続いたので、古い履歴を捨てて追従する
+                self.samples.clear()
+        self._consecutive_rejects = 0
+        self.samples.append(distance)
+        median = sorted(self.samples)[len(self.samples) // 2]
+
+        previous = self.value
+        if previous is None:
+            self.value = median
+        else:
+            self.value = previous + self.alpha * (median - previous)
+            dt = t - self._last_time
+            if dt > 0:
+                raw_velocity = (self.value - previous) / dt
+                self.velocity += self.velocity_alpha * (raw_velocity - self.velocity)
+        self._last_time = t
+        return self.value, self.velocity
+
+# 在室状態の変化イベント
+PresenceEvent = collections.namedtuple(
+    "PresenceEvent", ["time", "state", "previous", "distance", "velocity", "motion"])
+
+# 移動方向
+def classify_motion(velocity):
+    """速度(cm/s)から "approaching" / "leaving" / "still" を返します。"""
+    if velocity <= MOTION_APPROACH_SPEED:
+        return "approaching"
+    if velocity >= MOTION_LEAVE_SPEED:
+        return "leaving"
+    return "still"
+
+# 在室状態の状態機械
+class PresenceTracker:
+    """フィルタ後の距離から absent → approaching → near → close の状態を判定します。
+
+    状態の境界にはヒステリシスがあり、新しい状態が debounce_sec 続くまで確定しないので、
+    境界付近に立っている人や1回だけのノイズで状態が行き来しません。
+    状態が変わった時だけ PresenceEvent を返します。
+    """
+
+    def __init__(self, enter_distances=PRESENCE_ENTER_DISTANCES, hysteresis=PRESENCE_HYSTERESIS,
+                 debounce_sec=PRESENCE_DEBOUNCE_SEC):
+        self.enter_distances = enter_distances
+        self.hysteresis = hysteresis
+        self.debounce_sec = debounce_sec
+        self.level = 0  # PRESENCE_STATESの添字
+        self.since = None  # 現在の状態になった時刻
+        self._candidate = None
+        self._candidate_since = None
+
+    @property
+    def state(self):
+        return PRESENCE_STATES[self.level]
+
+    def _target_level(self, distance):
+        level = self.level
+        while level < len(self.enter_distances) and distance < self.enter_distances[level]:
+            level += 1
+        while level > 0 and distance >= self.enter_distances[level - 1] + self.hysteresis:
+            level -= 1
+        return level
+
+    def update(self, distance, velocity, t):
+        """フィルタ後の距離を受け取り、状態が確定して変わった場合はイベントのリストを返します。"""
+        if self.since is None:
+            self.since = t
+        if distance is None:
+            return []
+
+        target = self._target_level(distance)
+        if target == self.level:
+            self._candidate = None
+            return []
+        if target != self._candidate:
+            self._candidate = target
+            self._candidate_since = t
+        if t - self._candidate_since < self.debounce_sec:
+            return []
+
+        previous = self.state
+        self.level = target
+        self.since = t
+        self._candidate = None
+        return [PresenceEvent(t, self.state, previous, distance, velocity, classify_motion(velocity))]
+
+# 距離の記録ファイルを読む
+def read_distance_trace(path):
+    """「時刻,距離」のCSV（#で始まる行と見出し行は無視）を (時刻, 距離) のリストで返します。"""
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split(",")
+            try:
+                rows.append((float(fields[0]), float(fields[1])))
+            except ValueError:
+                continue  # 見出し行
+    return rows
+
+# 記録した距離をフィルタと状態機械に通す
+def replay_distance_trace(rows, distance_filter=None, tracker=None):
+    """(時刻, 距離) の列を再生し、発生した PresenceEvent のリストを返します。"""
+    distance_filter = distance_filter or DistanceFilter()
+    tracker = tracker or PresenceTracker()
+    events = []
+    for t, distance in rows:
+        filtered, velocity = distance_filter.update(distance, t)
+        events += tracker.update(filtered, velocity, t)
+    return events
+
+if __name__ == "__main__":
+    # 使い方: python presence.py 距離の記録.csv
+    for event in replay_distance_trace(read_distance_trace(sys.argv[1])):
+        print(f"{event.time:8.2f}s {event.previous:>11} -> {event.state:<11} "
+              f"{event.distance:6.1f} cm {event.velocity:+7.1f} cm/s ({event.motion})")
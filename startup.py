@@ -0,0 +1,89 @@
+import time
+import threading
+import concurrent.futures
+
+# 段階ごとに分けた起動処理
+class Startup:
+    """起動処理を名前付きの段階に分けて実行し、段階ごとの開始時刻と所要時間を記録します。
+
+    run() はその場で実行し、background() は専用スレッドで実行して準備完了の Future を返します。
+    background() の after に Future を渡すと、それらが終わってから始めます
+    （失敗していても始めるので、必要なら Future の結果を確かめてください）。
+
+    Args:
+        started: 起動の基準時刻（clockと同じ基準）。省略するとこのオブジェクトを作った時刻です。
+    """
+
+    def __init__(self, started=None, clock=time.monotonic, log=print):
+        self.clock = clock
+        self.log = log
+        self.started = clock() if started is None else started
+        self.phases = []  # [名前, 開始（起動からの秒）, 所要時間（実行中はNone）, スレッド名, 結果]
+        self.marks = {}  # 名前 -> 起動からの秒
+        self._lock = threading.Lock()
+
+    def record(self, name, begin, end, result="ok"):
+        """計測済みの段階を記録します（モジュールの読み込みなど）。"""
+        with self._lock:
+            self.phases.append([name, begin - self.started, end - begin,
+                                threading.current_thread().name, result])
+
+    def run(self, name, func, *args):
+        """段階 name として func(*args) をこのスレッドで実行し、結果を返します。"""
+        with self._lock:
+            entry = [name, self.clock() - self.started, None, threading.current_thread().name, "running"]
+            self.phases.append(entry)
+        try:
+            result = func(*args)
+        except Exception:
+            entry[4] = "error"
+            raise
+        else:
+            entry[4] = "ok"
+            return result
+        finally:
+            entry[2] = self.clock() - self.started - entry[1]
+
+    def background(self, name, func, *args, after=()):
+        """段階 name を専用スレッドで実行し、func の戻り値を結果に持つ Future を返します。"""
+        future = concurrent.futures.Future()
+
+        def worker():
+            try:
+                future.set_result(self.run(name, func, *args))
+            except Exception as e:
+                self.log(f"起動処理「{name}」のエラー: {e}")
+                future.set_exception(e)
+
+        self.when_done(after, worker, thread_name=name)
+        return future
+
+    def when_done(self, futures, func, *args, thread_name=None):
+        """futures が全て終わってから、専用スレッドで func(*args) を呼びます（段階としては記録しません）。"""
+        def worker():
+            concurrent.futures.wait(futures)
+            func(*args)
+
+        threading.Thread(target=worker, name=thread_name, daemon=True).start()
+
+    def mark(self, name):
+        """起動から name の時点（最初の発話など）までの秒数を1回だけ記録して返します。"""
+        with self._lock:
+            if name in self.marks:
+                return None
+            self.marks[name] = self.clock() - self.started
+            return self.marks[name]
+
+    def report(self):
+        """段階ごとの開始時刻と所要時間の表を文字列で返します。"""
+        with self._lock:
+            phases = [list(entry) for entry in self.phases]
+            marks = dict(self.marks)
+        lines = ["起動時間:"]
+        for name, begin, elapsed, thread_name, result in sorted(phases, key=lambda entry: entry[1]):
+            elapsed = "実行中" if elapsed is None else f"{elapsed:6.2f}s"
+            status = "" if result in ("ok", "running") else f" [{result}]"
+            lines.append(f"  {name:<16} {begin:6.2f}s から {elapsed} ({thread_name}){status}")
+        for name, at in sorted(marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<16} {at:6.2f}s")
+        return "\n".join(lines)
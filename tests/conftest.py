@@ -0,0 +1,10 @@
+import os
+import sys
+
+# リポジトリ直下のモジュール（zunda_talk6 など）を読み込めるようにする
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ハードウェアと音声出力は使わない（zunda_talk6を読み込む前に設定する）
+os.environ.setdefault("ZUNDA_HW_BACKEND", "sim")
+os.environ.setdefault("ZUNDA_AUDIO_SINK", "null")
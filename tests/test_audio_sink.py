@@ -0,0 +1,47 @@
+import wave
+import array
+
+import zunda_talk6 as zunda
+
+BYTES_PER_SEC = zunda.AUDIO_SAMPLE_RATE * zunda.AUDIO_CHANNELS * zunda.AUDIO_SAMPLE_WIDTH
+
+# 値が start から1ずつ増える16bitのPCM
+def ramp_pcm(start, count):
+    return array.array("h", range(start, start + count)).tobytes()
+
+def test_file_sink_concatenates_clips_without_gaps(tmp_path):
+    path = tmp_path / "out.wav"
+    # 周期（AUDIO_PERIOD_FRAMES）の途中で終わる長さにして、つなぎ目に隙間や重なりが無いことを見る
+    first = ramp_pcm(0, zunda.AUDIO_PERIOD_FRAMES * 2 + 123)
+    second = ramp_pcm(10000, zunda.AUDIO_PERIOD_FRAMES + 7)
+    finished = []
+    sink = zunda.FileAudioSink(str(path))
+    sink.enqueue(first, label="first", on_finish=lambda clip, completed: finished.append((clip.label, completed)))
+    sink.enqueue(memoryview(second), label="second",
+                 on_finish=lambda clip, completed: finished.append((clip.label, completed)))
+    assert sink.wait_until_idle(timeout=5.0)
+    sink.close()
+
+    with wave.open(str(path), "rb") as wav:
+        assert wav.getframerate() == zunda.AUDIO_SAMPLE_RATE
+        assert wav.readframes(wav.getnframes()) == first + second
+    assert finished == [("first", True), ("second", True)]
+
+def test_stop_reports_queued_clips_as_not_played():
+    finished = []
+    started = []
+    sink = zunda.NullAudioSink()  # 実時間で書き込むので、1秒のクリップは積まれたまま残る
+    try:
+        for label in ("a", "b", "c"):
+            sink.enqueue(bytes(BYTES_PER_SEC), label=label,
+                         on_start=lambda clip, start: started.append(clip.label),
+                         on_finish=lambda clip, completed: finished.append((clip.label, completed)))
+        assert not sink.wait_until_idle(timeout=0.1)
+        sink.stop()
+        assert sink.wait_until_idle(timeout=2.0)
+    finally:
+        sink.close()
+
+    assert started == ["a"]
+    assert sorted(finished) == [("a", False), ("b", False), ("c", False)]
+    assert sink.bytes_written < BYTES_PER_SEC
@@ -0,0 +1,59 @@
+import os
+import json
+
+import pytest
+
+from conftest import ROOT
+from emotion import EmotionClassifier, PatternMatcher
+
+@pytest.fixture
+def classifier():
+    classifier = EmotionClassifier(os.path.join(ROOT, "emotion_lexicon.json"), log=lambda message: None)
+    assert classifier.maybe_reload()
+    return classifier
+
+def test_matcher_finds_overlapping_patterns():
+    matcher = PatternMatcher(["he", "she", "his", "hers"])
+    assert sorted(matcher.finditer("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+@pytest.mark.parametrize("text", ["嬉しくない", "楽しくなかった"])
+def test_negation_cancels_keyword(classifier, text):
+    emotion, scores = classifier.classify(text)
+    assert emotion == "normal"
+    assert "happy" not in scores
+
+def test_negation_inside_keyword_is_not_negation(classifier):
+    assert classifier.classify("許せないのだ")[0] == "angry"
+
+def test_contained_keyword_counts_once(classifier):
+    emotion, scores = classifier.classify("泣き虫なのだ")
+    assert emotion == "sad"
+    assert scores == {"sad": 1.0}
+
+def test_headline_weights(classifier):
+    # 重みの合計が一番大きい感情を選ぶ（まさか 1.0 + 異例 1.0 > 事故 1.0）
+    emotion, scores = classifier.classify("まさかの異例の事故")
+    assert emotion == "surprised"
+    assert scores == {"surprised": 2.0, "sad": 1.0}
+    # 重みが threshold に届かなければ normal
+    assert classifier.classify("新作が人気")[0] == "normal"
+    assert classifier.classify("工場で火災、被害は調査中")[0] == "sad"
+
+def test_default_lexicon_without_file():
+    classifier = EmotionClassifier(None)
+    assert not classifier.maybe_reload()
+    assert classifier.classify("わーい！")[0] == "happy"
+
+def test_reload_keeps_previous_lexicon_on_error(tmp_path):
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({"emotions": {"happy": {"ずんだ": 2.0}}}), encoding="utf-8")
+    messages = []
+    classifier = EmotionClassifier(str(path), log=messages.append)
+    assert classifier.maybe_reload()
+    assert classifier.classify("ずんだ餅")[0] == "happy"
+
+    path.write_text("{壊れたJSON", encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert not classifier.maybe_reload()
+    assert classifier.classify("ずんだ餅")[0] == "happy"
+    assert any("読み込めません" in message for message in messages)
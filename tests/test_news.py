@@ -0,0 +1,116 @@
+import threading
+import http.server
+
+import pytest
+
+import news
+
+ARTICLES = [{"article_id": f"a{i}", "title": f"テスト用のニュース{i}です", "pubDate": "2026-01-01 00:00:00"}
+            for i in range(5)]
+
+# テスト用にスタブサーバーを空いているポートで起動する
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(articles=ARTICLES, fail_rate=0.0):
+        handler = type("Handler", (news.StubNewsHandler,),
+                       {"articles": articles, "fail_rate": fail_rate, "log_message": lambda *args: None})
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/api/1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def make_client(base_url, logs):
+    return news.NewsDataClient("secret-key", base_url=base_url, timeout=(1.0, 2.0), log=logs.append)
+
+def test_client_fetches_and_limits(stub_server):
+    logs = []
+    client = make_client(stub_server(), logs)
+    try:
+        data = client.get_latest_news(limit=3)
+    finally:
+        client.close()
+    assert data["status"] == "success"
+    assert [article["article_id"] for article in data["results"]] == ["a0", "a1", "a2"]
+    assert client.etag
+    assert logs == []
+
+def test_client_returns_not_modified_for_same_etag(stub_server):
+    client = make_client(stub_server(), [])
+    try:
+        assert client.get_latest_news() is not None
+        assert client.get_latest_news() == news.NewsDataClient.NOT_MODIFIED
+    finally:
+        client.close()
+
+def test_client_reports_server_errors(stub_server):
+    logs = []
+    client = make_client(stub_server(fail_rate=1.0), logs)
+    try:
+        assert client.get_latest_news() is None
+    finally:
+        client.close()
+    assert logs == ["ニュース取得エラー: ステータスコード 503"]
+
+def test_client_hides_api_key_on_connection_error():
+    logs = []
+    client = make_client("http://127.0.0.1:1/api/1", logs)
+    try:
+        assert client.get_latest_news() is None
+    finally:
+        client.close()
+    assert len(logs) == 1
+    assert "secret-key" not in logs[0]
+
+def test_store_merge_dedupes_and_appends(tmp_path):
+    path = tmp_path / "news.jsonl"
+    store = news.NewsStore(str(path), log=lambda message: None)
+    # APIは新しい順に返す。同じ記事はIDで、IDの無い記事はタイトルで重複を除く
+    assert store.merge([{"article_id": "b", "title": "二つ目", "extra": "捨てる項目"},
+                        {"article_id": "a", "title": "一つ目"},
+                        {"title": "IDなし"},
+                        {"article_id": "c"}]) == 3
+    assert store.merge([{"article_id": "a", "title": "一つ目"}, {"title": "IDなし"}]) == 0
+    assert store.merge([{"article_id": "d", "title": "四つ目"}, {"article_id": "b", "title": "二つ目"}]) == 1
+
+    assert [article["title"] for article in store.recent(10)] == ["四つ目", "二つ目", "一つ目", "IDなし"]
+    assert "extra" not in store.recent(10)[1]
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 4
+
+def test_store_does_not_readd_articles_dropped_from_memory(tmp_path):
+    store = news.NewsStore(str(tmp_path / "news.jsonl"), max_articles=2, log=lambda message: None)
+    batch = [{"article_id": f"n{i}", "title": f"記事{i}"} for i in range(5)]
+    assert store.merge(batch) == 5
+    assert store.merge(batch) == 0
+    assert [article["article_id"] for article in store.recent(10)] == ["n0", "n1"]
+
+def test_store_reload_keeps_latest_articles(tmp_path):
+    path = tmp_path / "news.jsonl"
+    store = news.NewsStore(str(path), max_articles=3, log=lambda message: None)
+    for i in range(10):
+        store.merge([{"article_id": f"n{i}", "title": f"記事{i}"}])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"article_id": "broken", "ti')  # 書き込み途中で切れた行
+
+    annotated = []
+    reloaded = news.NewsStore(str(path), max_articles=3, log=lambda message: None,
+                              annotate=lambda article: annotated.append(article["article_id"]) or {"emotion": "normal"})
+    assert reloaded.load() == 3
+    assert [article["article_id"] for article in reloaded.recent(10)] == ["n9", "n8", "n7"]
+    assert all(article["emotion"] == "normal" for article in reloaded.recent(10))
+    assert annotated == ["n7", "n8", "n9"]
+    # 読み直した後も、ファイルにある記事は追記し直さない
+    assert reloaded.merge([{"article_id": "n9", "title": "記事9"}, {"article_id": "n10", "title": "記事10"}]) == 1
+
+def test_store_load_without_file(tmp_path):
+    store = news.NewsStore(str(tmp_path / "missing.jsonl"), log=lambda message: None)
+    assert store.load() == 0
+    assert store.last_updated() is None
+    assert store.merge([]) == 0
+    assert store.last_updated() is not None
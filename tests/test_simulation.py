@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+# シナリオ, キャッシュ済みから始めるか -> (p95の上限(秒), ヒット率の下限)
+LIMITS = {
+    ("single", False): (2.0, 0.0),
+    ("single", True): (1.5, 0.95),
+    ("stream", False): (2.5, 0.5),
+    ("stream", True): (1.5, 0.95),
+}
+
+# zunda_sim.py run をベンチマークと同じく別プロセスで実行する（状態を持ち越さない）
+def run_scenario(scenario, warm, seed=1):
+    command = [sys.executable, os.path.join(ROOT, "zunda_sim.py"), "run",
+               "--scenario", scenario, "--seed", str(seed), "--json"]
+    if warm:
+        command.append("--warm")
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True,
+                            timeout=300).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+@pytest.mark.parametrize("scenario, warm", sorted(LIMITS))
+def test_scenario_meets_limits(scenario, warm):
+    p95_limit, hit_rate_limit = LIMITS[scenario, warm]
+    result = run_scenario(scenario, warm)
+    assert result["visits"] > 0
+    assert result["missed"] == 0
+    assert result["latency_p95"] is not None and result["latency_p95"] <= p95_limit
+    assert result["cache_hit_rate"] >= hit_rate_limit
+
+def test_scenario_is_deterministic():
+    first = run_scenario("single", False)
+    second = run_scenario("single", False)
+    for key in ("visits", "missed", "latency_p50", "latency_p95", "clips_played", "synth_calls"):
+        assert first[key] == second[key]
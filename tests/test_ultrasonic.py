@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from hardware.ultrasonic import UltrasonicRanger, MockGPIO
+
+TRIG_PIN = 15
+ECHO_PIN = 14
+
+# エッジ検出が使えないGPIO（ポーリングへの切り替えの確認用）
+class NoEdgeGPIO(MockGPIO):
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        raise RuntimeError("エッジ検出は使えません")
+
+def make_ranger(gpio, **kwargs):
+    return UltrasonicRanger(gpio, TRIG_PIN, ECHO_PIN, **kwargs)
+
+# 何回か測って中央値を使う（模擬GPIOの割り込みはスレッドなので、起床の遅れで数cmずれることがある。
+# ポーリングでは、短いパルスの間にスレッドが止まるとエコーを取りこぼすことがある）
+def measure_median(ranger, count=9):
+    values = []
+    for _ in range(count):
+        value = ranger.measure_once()
+        if value is not None:
+            values.append(value)
+        time.sleep(ranger.timeout)  # 測定スレッドと同じく間を空けて、前のエコーを次の測定に混ぜない
+    assert len(values) > count // 2
+    return sorted(values)[len(values) // 2]
+
+@pytest.mark.parametrize("distance", [5.0, 30.0, 100.0, 250.0])
+def test_edge_detect_accuracy(distance):
+    ranger = make_ranger(MockGPIO(distance_fn=lambda: distance, echo_pin=ECHO_PIN))
+    assert measure_median(ranger) == pytest.approx(distance, rel=0.05, abs=5.0)
+    assert ranger.use_edge_detect
+
+@pytest.mark.parametrize("distance", [10.0, 150.0])
+def test_polling_fallback_accuracy(distance):
+    ranger = make_ranger(NoEdgeGPIO(distance_fn=lambda: distance, echo_pin=ECHO_PIN))
+    # ポーリングはスレッドが止まった分だけ長く測るので、エッジ検出より誤差を大きく見る
+    assert measure_median(ranger, count=15) == pytest.approx(distance, rel=0.3, abs=5.0)
+    assert not ranger.use_edge_detect
+
+@pytest.mark.parametrize("gpio_class", [MockGPIO, NoEdgeGPIO])
+def test_missed_echo_returns_none(gpio_class):
+    ranger = make_ranger(gpio_class(distance_fn=lambda: None, echo_pin=ECHO_PIN), timeout=0.01)
+    assert ranger.measure_once() is None
+
+def test_measuring_thread_publishes_readings():
+    readings = []
+    durations = []
+    ranger = make_ranger(MockGPIO(distance_fn=lambda: None, echo_pin=ECHO_PIN),
+                         interval=0.01, timeout=0.005, observe=durations.append)
+    ranger.add_listener(lambda distance, measured_at: readings.append(distance))
+    ranger.start()
+    try:
+        reading = ranger.wait_for_reading(timeout=1.0)
+    finally:
+        ranger.stop()
+    # エコーが無ければ範囲外（max_distance）として扱い、数える
+    assert reading[0] == ranger.max_distance
+    assert readings and readings[0] == ranger.max_distance
+    assert ranger.missed_echoes >= 1
+    assert durations
@@ -0,0 +1,48 @@
+import sys
+import array
+
+# 16bitのPCMをサンプルの並びとして見る
+def pcm_samples(pcm):
+    """16bit・リトルエンディアンのPCM（bytes/memoryview）をコピーせずに "h" の memoryview にします。"""
+    view = memoryview(pcm).cast("B")
+    return view[:len(view) - len(view) % 2].cast("h")
+
+# 前後の無音を除いた範囲
+def voiced_range(samples, threshold, margin):
+    """振幅が threshold を超える最初と最後のサンプルの前後 margin サンプルまでの (開始, 終了) を返します。
+
+    全体が無音なら全体の範囲を返します。
+    """
+    start = next((i for i in range(len(samples)) if abs(samples[i]) > threshold), None)
+    if start is None:
+        return 0, len(samples)
+    end = next(i for i in range(len(samples) - 1, start - 1, -1) if abs(samples[i]) > threshold) + 1
+    return max(0, start - margin), min(len(samples), end + margin)
+
+# PCMを短いクロスフェードでつなぐ
+def splice_pcm(segments, crossfade):
+    """サンプルの並び（pcm_samples()の結果）を順につなげた array("h") を返します。
+
+    つなぎ目では前の終わりと次の始まりを crossfade サンプルだけ重ねて、直線的に入れ替えます。
+    出力のバッファは1つだけ確保し、各サンプルはそこへ1回だけコピーします。
+    """
+    if sys.byteorder != "little":
+        crossfade = 0  # 重ねる計算はリトルエンディアンのサンプルを前提にしている
+    overlaps = [min(crossfade, len(prev), len(seg)) for prev, seg in zip(segments, segments[1:])]
+    total = sum(len(seg) for seg in segments) - sum(overlaps)
+    out = array.array("h", bytes(2 * total))
+    out_bytes = memoryview(out).cast("B")
+
+    position = 0
+    for i, seg in enumerate(segments):
+        overlap = overlaps[i - 1] if i else 0
+        # 重なる部分は前の音を小さく、次の音を大きくしながら足す
+        base = position - overlap
+        for j in range(overlap):
+            weight = (j + 1) / (overlap + 1)
+            out[base + j] = int(out[base + j] * (1 - weight) + seg[j] * weight)
+        # 残りはそのままコピー
+        rest = len(seg) - overlap
+        out_bytes[2 * position:2 * (position + rest)] = seg[overlap:].cast("B")
+        position += rest
+    return out
@@ -0,0 +1,112 @@
+import queue
+import threading
+import collections
+
+# VOICEVOXのモデルを上限付きで読み込んでおくプール
+class VoiceModelPool:
+    """話者・スタイルIDごとのモデルを最大 capacity 個までメモリに置きます。
+
+    VOICEVOX Coreの load_model は時間がかかり、モデルごとにメモリを使うので、
+    Raspberry Piでは全スタイルを読み込んでおけません。acquire() は合成に使うスタイルIDを返します。
+    読み込み済みならそのまま使い、空きがあれば読み込み、満杯なら最後に使ったのが一番古い
+    モデルを unload_model で外してから読み込みます。Coreに unload_model が無い場合
+    （0.14まで）はモデルを外せないので、上限を超える分は default_style で代用します。
+    default_style は外しません。
+
+    prefetch() は次に使いそうなスタイルを専用スレッドで先に読み込みます。
+
+    Args:
+        get_core: VOICEVOX Coreを返す関数（初期化前なら初期化する）。
+        lock: Coreを同時に1スレッドだけが使うためのロック（合成と共有する）。
+    """
+
+    def __init__(self, get_core, lock, capacity=3, default_style=1, log=print):
+        self.get_core = get_core
+        self.lock = lock
+        self.capacity = capacity
+        self.default_style = default_style
+        self.log = log
+        self.resident = collections.OrderedDict()  # 読み込んだスタイルID -> True（使ったのが古い順）
+        self.loads = 0
+        self.unloads = 0
+        self.fallbacks = 0  # 上限のため default_style で代用した回数
+        self._refused = set()  # 代用をログに出したスタイルID
+        self._prefetch_queue = queue.Queue()
+        self._prefetch_thread = None
+
+    def acquire(self, style, prefetch=False):
+        """style の合成に使うスタイルIDを返します。lock を持った状態で呼んでください。
+
+        prefetch がTrueの時は、空きが作れなければ代用せずにNoneを返します。
+        """
+        core = self.get_core()
+        if style in self.resident:
+            self.resident.move_to_end(style)
+            return style
+        if core.is_model_loaded(style):
+            # 別の経路で読み込まれたモデル（プールの上限には数えない）
+            return style
+        # default_style も同じく古いモデルを外してから読み込む（外せなくても代わりが無いので読み込む）
+        if not self._make_room(core) and style != self.default_style:
+            if prefetch:
+                return None
+            self.fallbacks += 1
+            if style not in self._refused:
+                self._refused.add(style)
+                self.log(f"VOICEVOX モデル {style} は上限（{self.capacity}個）のため読み込まず、"
+                         f"{self.default_style} で代用します")
+            return self.acquire(self.default_style)
+
+        self.log(f"VOICEVOX モデル {style} をロード中...")
+        core.load_model(style)
+        self.loads += 1
+        self.resident[style] = True
+        return style
+
+    def _make_room(self, core):
+        # 上限未満になるまで古いモデルを外す。外せなければFalse
+        unload = getattr(core, "unload_model", None)
+        while len(self.resident) >= self.capacity:
+            victim = next((style for style in self.resident if style != self.default_style), None)
+            if victim is None or unload is None:
+                return False
+            unload(victim)
+            del self.resident[victim]
+            self.unloads += 1
+            self.log(f"VOICEVOX モデル {victim} を解放しました")
+        return True
+
+    def is_resident(self, style):
+        """style のモデルがプールに読み込み済みかを返します（lock は不要です）。"""
+        return style in self.resident
+
+    def prefetch(self, *styles):
+        """styles のうち未読み込みのモデルを先読みスレッドで読み込みます（すぐに戻ります）。"""
+        if self._prefetch_thread is None:
+            return  # start() 前（VOICEVOXが使えない時など）は何もしない
+        for style in styles:
+            if not self.is_resident(style):
+                self._prefetch_queue.put(style)
+
+    def _prefetch_worker(self):
+        while True:
+            style = self._prefetch_queue.get()
+            if self.is_resident(style):
+                continue  # 待っている間に合成で読み込まれた
+            try:
+                with self.lock:
+                    self.acquire(style, prefetch=True)
+            except Exception as e:
+                self.log(f"VOICEVOX モデル {style} の先読みエラー: {e}")
+
+    def start(self):
+        """先読みスレッドを開始します。"""
+        if self._prefetch_thread is None:
+            self._prefetch_thread = threading.Thread(target=self._prefetch_worker, daemon=True)
+            self._prefetch_thread.start()
+
+    def summary(self):
+        """読み込み中のモデルと読み込み・解放の回数を1行の文字列で返します。"""
+        resident = ", ".join(str(style) for style in self.resident) or "なし"
+        return (f"VOICEVOX モデル: {resident}（上限{self.capacity}個） "
+                f"ロード {self.loads}回 / 解放 {self.unloads}回 / 代用 {self.fallbacks}回")
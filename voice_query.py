@@ -0,0 +1,168 @@
+import os
+import copy
+import json
+import string
+import hashlib
+import threading
+import collections
+
+QUERY_CACHE_DIR = "./query_cache"  # AudioQuery（テキスト解析の結果）の保存先
+
+# 文の区切りに入れる無音のモーラ（VOICEVOXが「、」に入れるものと同じ形）
+PAUSE_MORA = {"text": "、", "consonant": None, "consonant_length": None,
+              "vowel": "pau", "vowel_length": 0.3, "pitch": 0.0}
+
+# テンプレートを固定部分と差し込み部分に分ける
+def split_template(template):
+    """"{prompt}? なるほどなのだ！" のような差し込みが1つのテンプレートを (前, 後) に分けます。
+
+    差し込みが1つでなければNoneです。
+    """
+    parts = list(string.Formatter().parse(template))
+    fields = [field for _, field, _, _ in parts if field is not None]
+    if len(fields) != 1:
+        return None
+    prefix = parts[0][0]
+    suffix = "".join(literal for literal, _, _, _ in parts[1:])
+    return prefix, suffix
+
+# テキストに合うテンプレートを探す
+def match_template_parts(text, templates):
+    """text が templates のどれかから作られた文なら (前, 差し込み, 後) を返します。前と後は空の場合があります。"""
+    for template in templates:
+        split = split_template(template)
+        if split is None:
+            continue
+        prefix, suffix = split
+        if (len(text) > len(prefix) + len(suffix)
+                and text.startswith(prefix) and text.endswith(suffix)):
+            return prefix, text[len(prefix):len(text) - len(suffix)], suffix
+    return None
+
+# テキストを合うテンプレートの部分に分ける
+def match_template(text, templates):
+    """text が templates のどれかから作られた文なら [前, 差し込み, 後]（空の部分は除く）を返します。"""
+    parts = match_template_parts(text, templates)
+    if parts is None:
+        return None
+    return [part for part in parts if part]
+
+# AudioQueryをつなげる
+def join_audio_queries(queries):
+    """辞書にしたAudioQueryのアクセント句を順につなげた1つのAudioQueryを返します。
+
+    つなぎ目で前の部分の最後のアクセント句に無音が無ければ PAUSE_MORA を入れます。
+    話速などの設定は最初の部分のものを使います。
+    """
+    joined = copy.deepcopy(queries[0])
+    joined["accent_phrases"] = []
+    for i, query in enumerate(queries):
+        phrases = copy.deepcopy(query["accent_phrases"])
+        if phrases and i < len(queries) - 1 and not phrases[-1].get("pause_mora"):
+            phrases[-1]["pause_mora"] = dict(PAUSE_MORA)
+        joined["accent_phrases"] += phrases
+    joined["kana"] = ""  # 部分ごとの解析なので、全体の読みは持たない
+    return joined
+
+# AudioQueryの保存先
+class QueryCache:
+    """テキストごとのAudioQuery（アクセント句と話者ごとの音高・長さ）をJSONファイルに保存します。
+
+    1つのテキストにつき1ファイル（<md5>.json）で、話者・スタイルIDごとの結果をまとめて持ちます。
+    最近使ったものは max_memory 件までメモリにも持ちます。ファイル数が max_files を超えたら、
+    load() の時に更新時刻の古いものから削除します。
+    """
+
+    def __init__(self, cache_dir=QUERY_CACHE_DIR, max_files=5000, max_memory=200):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self.max_memory = max_memory
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()  # キー -> {"text": テキスト, "styles": {スタイルID: 辞書}}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(text):
+        return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self):
+        """保存先を作り、ファイル数が上限を超えていれば古いものを削除します。削除した数を返します。"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        excess = len(entries) - self.max_files
+        if excess <= 0:
+            return 0
+        for _, path in sorted(entries)[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return excess
+
+    def _read(self, text):
+        # self._lockを持った状態で呼ぶ
+        key = self.key_for(text)
+        entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(self.path_for(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if entry is None or entry.get("text") != text:
+                entry = {"text": text, "styles": {}}
+            self._remember(key, entry)
+        else:
+            self._memory.move_to_end(key)
+        return entry
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get(self, text, style):
+        """text を style で解析したAudioQuery（辞書）を返します。無ければNoneです。"""
+        with self._lock:
+            query = self._read(text)["styles"].get(str(style))
+            if query is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(query)
+
+    def get_any(self, text):
+        """text をどれかの話者で解析したAudioQuery（辞書）を返します。無ければNoneです。"""
+        with self._lock:
+            query = next(iter(self._read(text)["styles"].values()), None)
+            return copy.deepcopy(query)
+
+    def put(self, text, style, query):
+        """text を style で解析したAudioQuery（辞書）を保存します。"""
+        with self._lock:
+            entry = self._read(text)
+            entry["styles"][str(style)] = copy.deepcopy(query)
+            path = self.path_for(self.key_for(text))
+            tmp_path = f"{path}.tmp"
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, path)
+            except OSError:
+                pass  # 保存できなくてもメモリには残っているので合成は続けられる
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "memory": len(self._memory)}
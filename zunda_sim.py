@@ -0,0 +1,521 @@
+import os
+import io
+import math
+import sys
+import json
+import time
+import wave
+import queue
+import random
+import argparse
+import dataclasses
+import shutil
+import tempfile
+import subprocess
+
+# ハードウェアと音声出力は使わない（zunda_talk6を読み込む前に設定する）
+os.environ.setdefault("ZUNDA_HW_BACKEND", "sim")
+os.environ.setdefault("ZUNDA_AUDIO_SINK", "null")
+
+import zunda_talk6 as zunda
+from event_loop import EventLoop
+from hardware import Hardware
+from hardware.sim import SimBackend
+from hardware.replay import ReplayBackend
+from presence import PRESENCE_ENTER_DISTANCES
+
+SIM_SAMPLE_INTERVAL = 0.1  # 模擬センサーの測定間隔（UltrasonicRangerと同じ）
+SIM_BACKGROUND_DISTANCE = 300.0  # 誰もいない時の距離
+SIM_NOISE_CM = 1.5  # 測定値に足すノイズの標準偏差
+SIM_OUTLIER_RATE = 0.01  # エコーが返らず範囲外(400cm)になる割合
+SIM_SPEECH_SEC_PER_CHAR = 0.12  # 模擬音声の1文字あたりの長さ
+SIM_ANALYSIS_SHARE = 0.3  # 1文字あたりの合成時間のうち、テキスト解析（audio_query）の割合
+SIM_NEWS_TITLES = [
+    "新しい駅ビルが来月オープン、地元の特産品売り場も",
+    "今年の桜の開花は平年より一週間早い見込み",
+    "地元高校が全国大会で初優勝、市内でパレード",
+    "ずんだ餅の消費量が過去最高を記録",
+    "週末は広い範囲で晴れ、行楽日和になりそう",
+]
+
+# シナリオ（名前 -> (シミュレーションの長さ(秒), 来訪者の数, 最接近距離の範囲, 滞在時間の範囲, 速さの範囲)）
+SIM_SCENARIOS = {
+    "single": (120, 1, (40, 40), (20, 20), (60, 60)),
+    "stream": (1800, 20, (30, 140), (5, 40), (40, 120)),
+    "passersby": (1800, 30, (100, 145), (0.5, 3), (100, 140)),
+}
+
+# 仮想時計
+class VirtualClock:
+    """シミュレーションの時刻です。EventLoopの clock として渡し、ハーネスが進めます。"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+# 指定秒数の無音のWAVを作る
+def make_silent_wav(duration):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(zunda.AUDIO_CHANNELS)
+        wav.setsampwidth(zunda.AUDIO_SAMPLE_WIDTH)
+        wav.setframerate(zunda.AUDIO_SAMPLE_RATE)
+        wav.writeframes(bytes(int(duration * zunda.AUDIO_SAMPLE_RATE) * zunda.AUDIO_SAMPLE_WIDTH))
+    return buf.getvalue()
+
+# VoicevoxCoreの代わり
+class FakeVoicevoxCore:
+    """仮想時計の上で latency + per_char × 文字数 秒かかったことにして、無音のWAVを返します。
+
+    合成は1つずつ順番に行われる（VOICEVOX Coreと同じ）ので、前の合成が終わる
+    仮想時刻 busy_until から次の合成が始まります。
+    """
+
+    def __init__(self, clock, latency=0.8, per_char=0.02, failure_rate=0.0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.per_char = per_char
+        self.failure_rate = failure_rate
+        self.busy_until = clock()
+        self.calls = 0
+        self.queries = 0
+        self.busy_time = 0.0
+        self._random = random.Random(seed)
+
+    def is_model_loaded(self, speaker_id):
+        return True
+
+    def load_model(self, speaker_id):
+        pass
+
+    def _spend(self, cost):
+        # 前の処理が終わる仮想時刻から cost 秒使う
+        start = max(self.clock(), self.busy_until)
+        self.busy_until = start + cost
+        self.busy_time += cost
+
+    def tts(self, text, speaker_id):
+        return self.synthesis(self.audio_query(text, speaker_id), speaker_id)
+
+    def audio_query(self, text, speaker_id):
+        self._spend(self.per_char * SIM_ANALYSIS_SHARE * len(text))
+        self.queries += 1
+        moras = [{"text": char, "vowel": "a", "vowel_length": 0.1, "pitch": 5.0} for char in text]
+        return FakeAudioQuery([{"moras": moras, "accent": 1, "pause_mora": None}])
+
+    def mora_data(self, accent_phrases, speaker_id):
+        return [dict(phrase) for phrase in accent_phrases]
+
+    def synthesis(self, query, speaker_id):
+        moras = sum(len(phrase["moras"]) + bool(phrase.get("pause_mora"))
+                    for phrase in query.accent_phrases)
+        self._spend(self.latency + self.per_char * (1 - SIM_ANALYSIS_SHARE) * moras)
+        self.calls += 1
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("合成に失敗しました（模擬）")
+        return make_silent_wav(moras * SIM_SPEECH_SEC_PER_CHAR / query.speed_scale)
+
+# VOICEVOXのAudioQueryの代わり（アクセント句は辞書のまま持つ）
+@dataclasses.dataclass
+class FakeAudioQuery:
+    accent_phrases: list
+    speed_scale: float = 1.0
+    pitch_scale: float = 0.0
+    intonation_scale: float = 1.0
+    volume_scale: float = 1.0
+    pre_phoneme_length: float = 0.1
+    post_phoneme_length: float = 0.1
+    output_sampling_rate: int = 24000
+    output_stereo: bool = False
+    kana: str = ""
+
+# 保存したAudioQueryを模擬のAudioQueryに戻す（zunda_talk6.audio_query_from_dictの代わり）
+def fake_audio_query_from_dict(data):
+    return FakeAudioQuery(**data)
+
+# 仮想時計で再生する音声出力先
+class VirtualAudioSink:
+    """AudioSinkと同じ使い方で、クリップの再生開始・終了をイベントループのタイマーで再現します。"""
+
+    def __init__(self, loop, on_state_change=None):
+        self.loop = loop
+        self.on_state_change = on_state_change
+        self.active = False
+        self.current_clip = None
+        self.current_start = 0.0
+        self.started = []  # (再生開始時刻, ラベル)
+        self._play_end = 0.0
+        self._timers = []
+
+    def enqueue(self, pcm, label="", on_start=None, on_finish=None, envelope=None):
+        clip = zunda.AudioClip(pcm, label, on_start, on_finish, envelope)
+        clip.enqueued_at = self.loop.clock()  # 再生開始の遅れを仮想時刻で計る
+        start = max(self.loop.clock(), self._play_end)
+        self._play_end = start + clip.duration
+        self._set_active(True)
+        self._timers = [timer for timer in self._timers if timer.when >= self.loop.clock()]
+        self._timers.append(self.loop.call_at(start, self._start_clip, clip, start))
+        self._timers.append(self.loop.call_at(self._play_end, self._finish_clip, clip))
+        return clip
+
+    def _start_clip(self, clip, start):
+        self.current_clip = clip
+        self.current_start = start
+        self.started.append((start, clip.label))
+        if clip.on_start:
+            clip.on_start(clip, start)
+
+    def _finish_clip(self, clip):
+        if clip.on_finish:
+            clip.on_finish(clip, True)
+        if self.loop.clock() >= self._play_end:
+            self.current_clip = None
+            self._set_active(False)
+
+    def _set_active(self, active):
+        if self.active != active:
+            self.active = active
+            if self.on_state_change:
+                self.on_state_change(active)
+
+    def stop(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        self._play_end = 0.0
+        self.current_clip = None
+        self._set_active(False)
+
+    def wait_until_idle(self, timeout=None):
+        return not self.active
+
+    def get_position(self):
+        if self.current_clip is None:
+            return None, 0.0
+        return self.current_clip, max(0.0, self.loop.clock() - self.current_start)
+
+    def close(self):
+        self.stop()
+
+# 合成の終わる仮想時刻に音声を出力先へ渡す再生キュー
+class VirtualAudioQueue:
+    """audio_queue の代わりです。put() された音声を、模擬合成が終わる仮想時刻に play_audio() します。"""
+
+    def __init__(self, loop, core):
+        self.loop = loop
+        self.core = core
+        self.unfinished_tasks = 0
+        self._pending = []  # (タイマー, 音声)
+
+    def put(self, item):
+        self.unfinished_tasks += 1
+        at = max(self.loop.clock(), self.core.busy_until)
+        self._pending.append((self.loop.call_at(at, self._deliver, item), item))
+
+    def _deliver(self, item):
+        self._pending = [(timer, pending) for timer, pending in self._pending if pending is not item]
+        self.unfinished_tasks -= 1
+        if not zunda.play_audio(item):
+            zunda.event_loop.post("playback_done")  # audio_player_thread と同じく、再生できなかったことを知らせる
+
+    def get_nowait(self):
+        if not self._pending:
+            raise queue.Empty
+        timer, item = self._pending.pop(0)
+        timer.cancel()
+        return item
+
+    def task_done(self):
+        self.unfinished_tasks -= 1
+
+# 来訪者1人の動き
+class Visitor:
+    """arrive 秒に遠くから speed cm/s で closest cm まで近づき、dwell 秒とどまって同じ速さで去ります。"""
+
+    def __init__(self, arrive, closest, dwell, speed):
+        self.arrive = arrive
+        self.closest = closest
+        self.dwell = dwell
+        self.speed = speed
+        self.travel = (SIM_BACKGROUND_DISTANCE - closest) / speed
+
+    def distance_at(self, t):
+        elapsed = t - self.arrive
+        if elapsed <= 0:
+            return SIM_BACKGROUND_DISTANCE
+        if elapsed < self.travel:
+            return SIM_BACKGROUND_DISTANCE - elapsed * self.speed
+        elapsed -= self.travel
+        if elapsed < self.dwell:
+            return self.closest
+        elapsed -= self.dwell
+        return min(SIM_BACKGROUND_DISTANCE, self.closest + elapsed * self.speed)
+
+# シナリオから距離の列を作る
+def make_scenario_trace(name, seed=0):
+    """シナリオの来訪者から、測定間隔ごとの (時刻, 距離) の列を作ります。"""
+    duration, count, closest, dwell, speed = SIM_SCENARIOS[name]
+    rng = random.Random(seed)
+    if count == 1:
+        visitors = [Visitor(10.0, closest[0], dwell[0], speed[0])]
+    else:
+        visitors = [Visitor(rng.uniform(5, duration - 60), rng.uniform(*closest),
+                            rng.uniform(*dwell), rng.uniform(*speed)) for _ in range(count)]
+    rows = []
+    for i in range(int(duration / SIM_SAMPLE_INTERVAL)):
+        t = i * SIM_SAMPLE_INTERVAL
+        distance = min(visitor.distance_at(t) for visitor in visitors)
+        if rng.random() < SIM_OUTLIER_RATE:
+            distance = 400.0
+        else:
+            distance = max(2.0, distance + rng.gauss(0, SIM_NOISE_CM))
+        rows.append((t, distance))
+    return rows
+
+# 記録ファイルから距離の列を作る
+def load_trace_file(path):
+    """「時刻,距離」のCSVを、測定間隔ごとの (時刻, 距離) の列にします。"""
+    replay = ReplayBackend(path)
+    duration = replay.times[-1]
+    return [(i * SIM_SAMPLE_INTERVAL, replay.distance_at(i * SIM_SAMPLE_INTERVAL))
+            for i in range(int(duration / SIM_SAMPLE_INTERVAL) + 1)]
+
+# 来訪（人が範囲に入ってから出るまで）の区間を求める
+def find_visits(rows, enter_distance=PRESENCE_ENTER_DISTANCES[0], min_samples=3):
+    """距離が enter_distance 未満の区間を (入った時刻, 出た時刻) のリストで返します。
+
+    外れ値やノイズで途切れないよう、min_samples 回続いた時だけ入った・出たとみなします。
+    """
+    visits = []
+    inside = False
+    run = 0
+    start = None
+    for t, distance in rows:
+        if (distance < enter_distance) != inside:
+            run += 1
+            if run == 1:
+                edge = t
+            if run >= min_samples:
+                inside = not inside
+                run = 0
+                if inside:
+                    start = edge
+                else:
+                    visits.append((start, edge))
+        else:
+            run = 0
+    if inside:
+        visits.append((start, rows[-1][0]))
+    return visits
+
+# 百分位数
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+# シミュレーション
+class Simulation:
+    """zunda_talk6 の対話処理を、仮想時計・模擬センサー・模擬VOICEVOX・仮想音声出力で動かします。
+
+    main() と同じイベントハンドラを登録し、スレッドの代わりにハーネスが
+    イベントループ・合成・距離の測定を順番に進めるので、同じ引数なら毎回同じ結果になります。
+    """
+
+    def __init__(self, rows, latency=0.8, per_char=0.02, failure_rate=0.0, warm=False, seed=0,
+                 verbose=False):
+        self.rows = rows
+        self.duration = rows[-1][0]
+        self.latency = latency
+        self.per_char = per_char
+        self.failure_rate = failure_rate
+        self.warm = warm
+        self.seed = seed
+        self.verbose = verbose
+        self.iterations = 0
+        self.loop_cpu = 0.0
+
+    def setup(self):
+        random.seed(self.seed)
+        self.clock = VirtualClock()
+        zunda.log_buffer = zunda.LogBuffer(zunda.LOG_BUFFER_LINES, echo=self.verbose)
+        zunda.event_loop = EventLoop(clock=self.clock)
+        zunda.hw = Hardware(SimBackend())
+        self.cache_dir = tempfile.mkdtemp(prefix="zunda_sim_")
+        zunda.audio_cache = zunda.AudioCache(
+            self.cache_dir, os.path.join(self.cache_dir, "manifest.json"),
+            zunda.AUDIO_CACHE_MAX_BYTES, zunda.AUDIO_CACHE_EVICTION)
+        zunda.query_cache = zunda.QueryCache(os.path.join(self.cache_dir, "query"))
+        zunda.audio_query_from_dict = fake_audio_query_from_dict
+        self.core = FakeVoicevoxCore(self.clock, self.latency, self.per_char, self.failure_rate,
+                                     self.seed)
+        zunda.core = self.core
+        self.sink = VirtualAudioSink(zunda.event_loop, zunda.on_audio_sink_state)
+        zunda.audio_sink = self.sink
+        zunda.audio_queue = VirtualAudioQueue(zunda.event_loop, self.core)
+        zunda.fetch_news = self.fetch_news
+
+        zunda.emotion_classifier.maybe_reload()
+        zunda.fetch_news()
+        zunda.audio_cache.load()
+        zunda.pin_canned_utterances()
+        if self.warm:
+            # 先行合成が終わった状態（全フレーズがキャッシュ済み）から始める
+            for text, voice in zunda.enumerate_utterances():
+                for unit in zunda.synthesis_units(text):
+                    zunda.generate_voice(unit, voice=voice)
+            self.core.busy_until = self.clock()
+            self.core.calls = 0
+            self.core.queries = 0
+            self.core.busy_time = 0.0
+            zunda.audio_cache.hits = zunda.audio_cache.misses = 0
+
+        zunda.set_emotion_led("normal")
+        zunda.register_event_handlers()
+        zunda.event_loop.call_at(self.rows[0][0], self._sample, 0)
+
+    def fetch_news(self):
+        # ネットワークを使わず固定のニュースを使う（見出しの感情は取り込む時と同じく付ける）
+        zunda.state.update(news_data=tuple({"title": title, **zunda.score_headline({"title": title})}
+                                           for title in SIM_NEWS_TITLES))
+        return True
+
+    def _sample(self, index):
+        # 模擬センサー：測定スレッドと同じく on_distance_reading に測定値を渡す
+        t, distance = self.rows[index]
+        zunda.on_distance_reading(distance, t)
+        if index + 1 < len(self.rows):
+            zunda.event_loop.call_at(self.rows[index + 1][0], self._sample, index + 1)
+
+    def _pump_synthesis(self):
+        # 合成スレッドの代わり：前の合成が終わっていれば次のジョブを処理する
+        processed = 0
+        while not zunda.synth_queue.empty() and self.clock() >= self.core.busy_until:
+            zunda.process_synthesis_job(zunda.synth_queue.get_nowait())
+            processed += 1
+        return processed
+
+    def run(self):
+        """シミュレーションを最後まで進め、結果の辞書を返します。"""
+        wall_start = time.perf_counter()
+        self.setup()
+        loop = zunda.event_loop
+        while True:
+            cpu_start = time.process_time()
+            handled = loop.run_once(block=False)
+            self.loop_cpu += time.process_time() - cpu_start
+            self.iterations += 1
+            if self._pump_synthesis() or handled:
+                continue
+
+            deadlines = [loop.next_deadline()]
+            if not zunda.synth_queue.empty():
+                deadlines.append(self.core.busy_until)
+            deadlines = [deadline for deadline in deadlines if deadline is not None]
+            if not deadlines or min(deadlines) > self.duration:
+                break
+            self.clock.now = max(self.clock.now, min(deadlines))
+        zunda.log_buffer.flush()
+        result = self.report(time.perf_counter() - wall_start)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        return result
+
+    def report(self, wall_sec):
+        latencies = []
+        missed = 0
+        visits = find_visits(self.rows)
+        for enter, leave in visits:
+            starts = [start for start, _ in self.sink.started if enter <= start <= leave]
+            if starts:
+                latencies.append(starts[0] - enter)
+            else:
+                missed += 1
+        stats = zunda.audio_cache.get_stats()
+        return {
+            "visits": len(visits),
+            "missed": missed,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "cache_hit_rate": stats["hit_rate"],
+            "cache_hits": stats["hits"],
+            "cache_misses": stats["misses"],
+            "clips_played": len(self.sink.started),
+            "synth_calls": self.core.calls,
+            "query_calls": self.core.queries,
+            "loop_iterations": self.iterations,
+            "cpu_us_per_iteration": self.loop_cpu / max(1, self.iterations) * 1e6,
+            "simulated_sec": self.duration,
+            "wall_sec": wall_sec,
+        }
+
+# 結果を1行で表示
+def format_result(name, result):
+    def seconds(value):
+        return "   -  " if value is None else f"{value:6.2f}"
+    return (f"{name:<28} 来訪{result['visits']:3d} 取りこぼし{result['missed']:3d} "
+            f"p50{seconds(result['latency_p50'])}s p95{seconds(result['latency_p95'])}s "
+            f"ヒット率{result['cache_hit_rate']:5.0%} CPU{result['cpu_us_per_iteration']:7.1f}µs/回 "
+            f"(実時間{result['wall_sec']:.1f}s)")
+
+# ベンチマークの組み合わせ
+BENCH_CASES = [
+    (scenario, latency, warm)
+    for scenario in ("single", "stream", "passersby")
+    for latency in (0.3, 1.5)
+    for warm in (False, True)
+]
+
+# ベンチマーク（組み合わせごとに別プロセスで実行して、状態を持ち越さない）
+def run_bench(args):
+    results = {}
+    for scenario, latency, warm in BENCH_CASES:
+        name = f"{scenario}/{latency}s/{'warm' if warm else 'cold'}"
+        command = [sys.executable, os.path.abspath(__file__), "run", "--scenario", scenario,
+                   "--latency", str(latency), "--seed", str(args.seed), "--json"]
+        if warm:
+            command.append("--warm")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+        if not args.json:
+            print(format_result(name, results[name]), flush=True)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="ずんだもん対話システムのシミュレーションとベンチマーク")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="1つのシナリオを実行する")
+    run_parser.add_argument("--scenario", choices=sorted(SIM_SCENARIOS), default="single")
+    run_parser.add_argument("--trace", help="シナリオの代わりに再生する「時刻,距離」のCSV")
+    run_parser.add_argument("--latency", type=float, default=0.8, help="模擬VOICEVOXの1回の合成時間(秒)")
+    run_parser.add_argument("--per-char", type=float, default=0.02, help="1文字あたりの追加の合成時間(秒)")
+    run_parser.add_argument("--failure-rate", type=float, default=0.0, help="合成が失敗する割合")
+    run_parser.add_argument("--warm", action="store_true", help="全フレーズをキャッシュ済みの状態から始める")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--verbose", action="store_true", help="ログも表示する")
+    run_parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    bench_parser = sub.add_parser("bench", help="シナリオ・合成時間・キャッシュの組み合わせを全て実行する")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_bench(args)
+        return
+
+    rows = load_trace_file(args.trace) if args.trace else make_scenario_trace(args.scenario, args.seed)
+    simulation = Simulation(rows, args.latency, args.per_char, args.failure_rate, args.warm,
+                            args.seed, args.verbose)
+    result = simulation.run()
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(format_result(args.trace or args.scenario, result))
+        if args.verbose:
+            print(zunda.metrics.REGISTRY.summary())
+
+if __name__ == "__main__":
+    main()
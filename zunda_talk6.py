@@ -1,8 +1,6 @@
 # 初期化部分にVOICEVOXのimport追加（ファイル先頭部分）
 import time
-import board
-import pwmio
-import RPi.GPIO as GPIO
+IMPORT_STARTED = time.monotonic()  # モジュールの読み込みを始めた時刻（起動時間の計測用）
 import sys
 import os
 import random
@@ -10,398 +8,2024 @@ import datetime
 import threading
 import queue
 import json
-import requests
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-from PIL import Image, ImageTk
-import threading
-import pandas as pd
-from typing import Dict, Any
 import hashlib  # ファイル先頭のimport部分に追加
+import collections
+import mmap
+import shutil
+import struct
+import subprocess
+import wave
+import itertools
+import array
+import math
+import operator
+import logging
+import logging.handlers
+import importlib.util
+import concurrent.futures
+import dataclasses
+from hardware import get_hardware, HardwareBusyError
+from presence import DistanceFilter, PresenceTracker
+from event_loop import EventLoop
+import metrics
+from gui_assets import WidgetUpdater, FrameStats, SpriteAtlas
+from led_engine import Envelope, LED_MAX
+from voice_pool import VoiceModelPool
+from voice_query import QueryCache, match_template, match_template_parts, split_template, join_audio_queries
+from voice_compose import pcm_samples, voiced_range, splice_pcm
+from startup import Startup
+from news import NewsDataClient, NewsRefresher, NewsStore, DEFAULT_BASE_URL
+from emotion import EmotionClassifier
 
-# VOICEVOXのインポートを追加
-try:
-    from voicevox_core import VoicevoxCore
-except ImportError:
+# VOICEVOXがあるかだけ確認する（ネイティブライブラリの読み込みは起動処理の裏で行う）
+VOICEVOX_AVAILABLE = importlib.util.find_spec("voicevox_core") is not None
+if not VOICEVOX_AVAILABLE:
     print("VOICEVOXモジュールがインストールされていません。音声合成は無効です。")
-    VoicevoxCore = None
 
-# グローバル変数に音声生成状態フラグを追加
-is_playing_audio = False  # 音声再生中フラグ
-is_generating_voice = False  # 音声生成中フラグ
+# ALSAを直接使う音声出力（無ければ常駐aplayにフォールバック）
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
 
-# GPIOピンの設定
-# PWM出力用に設定
-red_pin = pwmio.PWMOut(board.D16, frequency=1000, duty_cycle=0)
-green_pin = pwmio.PWMOut(board.D20, frequency=1000, duty_cycle=0)
-blue_pin = pwmio.PWMOut(board.D21, frequency=1000, duty_cycle=0)
+# LEDと超音波センサーのピンの持ち主（実際にピンを初期化するのは最初に使った時）
+hw = get_hardware()
 
-# 超音波センサーの設定
-trig_pin = 15  # GPIO 15
-echo_pin = 14  # GPIO 14
-speed_of_sound = 34370  # 20℃での音速(cm/s)
+# 感情ごとのLEDの色と、色を切り替える時のフェード時間
+EMOTION_LED_COLORS = {
+    "normal": (LED_MAX // 2, LED_MAX // 2, LED_MAX // 2),  # 白色
+    "happy": (0, LED_MAX, 0),  # 緑色
+    "angry": (LED_MAX, 0, 0),  # 赤色
+    "sad": (0, 0, LED_MAX),  # 青色
+    "surprised": (LED_MAX, LED_MAX, 0),  # 黄色
+}
+LED_EMOTION_FADE_SEC = 0.4
+EMOTION_LEXICON_FILE = "./emotion_lexicon.json"  # 感情の判定に使う重み付きの語彙
+EMOTION_LEXICON_CHECK_SEC = 60  # 語彙ファイルの変更を確認する間隔（変わっていれば読み直す）
+LED_LIPSYNC_MIN_LEVEL = 0.15  # 話している間の無音部分のLEDの明るさ
 
-GPIO.setmode(GPIO.BCM)  # GPIOをBCMモードで使用
-GPIO.setwarnings(False)  # GPIO警告無効化
-GPIO.setup(trig_pin, GPIO.OUT)  # Trigピン出力モード設定
-GPIO.setup(echo_pin, GPIO.IN)  # Echoピン入力モード設定
+distance_filter = DistanceFilter()  # 距離の平滑化・外れ値除去・速度推定
+presence = PresenceTracker()  # 在室状態（absent → approaching → near → close）
+event_loop = EventLoop()  # メインスレッドで回すイベントループ
+interaction_timer = None  # 次の対話を始めるタイマー
+idle_timer = None  # 独り言のタイマー
+cancel_voices_timer = None  # 立ち去った人向けの合成待ちを破棄するタイマー
 
 # VOICEVOX Core設定
 VOICEVOX_DICT_PATH = "./open_jtalk_dic_utf_8-1.11"
-SPEAKER_ID = 1  # 1:ずんだもん, 2:四国めたん
+SPEAKER_ID = 1  # 1:ずんだもん, 2:四国めたん（感情に対応するスタイルが無い時に使う）
+# 感情ごとの話者・スタイルID（ずんだもん 1:あまあま, 3:ノーマル, 7:ツンツン, 22:ささやき）
+EMOTION_VOICE_STYLES = {
+    "normal": SPEAKER_ID,
+    "happy": 1,
+    "angry": 7,
+    "sad": 22,
+    "surprised": 3,
+}
+# 感情ごとの話速・音高・抑揚（AudioQueryの speed_scale, pitch_scale, intonation_scale）
+EMOTION_VOICE_PARAMS = {
+    "happy": {"speed": 1.05, "intonation": 1.2},
+    "angry": {"speed": 1.1, "intonation": 1.3},
+    "sad": {"speed": 0.9, "pitch": -0.03, "intonation": 0.8},
+    "surprised": {"pitch": 0.05, "intonation": 1.4},
+}
+# 声の指定（話者・スタイルIDと、話速・音高・抑揚）
+VoiceSpec = collections.namedtuple("VoiceSpec", ["style", "speed", "pitch", "intonation"],
+                                   defaults=(1.0, 0.0, 1.0))
+DEFAULT_VOICE = VoiceSpec(SPEAKER_ID)
+VOICE_MODEL_CAPACITY = 3  # 同時に読み込んでおくモデルの数（1つ数百MBなのでPiのメモリに合わせる）
+VOICE_PRELOAD_STYLES = (SPEAKER_ID,)  # 起動時に先読みするスタイル
 AUDIO_CACHE_DIR = "./audio_cache"
 USE_VOICEBOX_ONLY_FOR_NEWS = True  # ニュースのみVOICEBOXを使用
+AUDIO_CACHE_MANIFEST = os.path.join(AUDIO_CACHE_DIR, "manifest.json")  # キャッシュの索引
+AUDIO_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 音声キャッシュの上限サイズ（SDカード容量対策）
+AUDIO_CACHE_EVICTION = "lru"  # 上限を超えた時の削除方針（lru: 最後に使ったのが古い順, lfu: 使用回数が少ない順）
+AUDIO_CACHE_SAVE_INTERVAL_SEC = 60  # ヒット情報だけが変わった時の索引書き戻し間隔
+ENVELOPE_FRAME_SEC = 0.02  # 音量の包絡線（LEDと口パク用）の1区間の長さ
+ENVELOPE_MAGIC = b"ENV1"  # 包絡線ファイル（<キー>.env）の先頭
+QUERY_CACHE_DIR = "./query_cache"  # テキスト解析の結果（AudioQuery）の保存先
+QUERY_CACHE_MAX_FILES = 5000  # テキスト解析の結果（./query_cache）を残すテキストの数
 
 # NewsAPI設定を変更
 NEWS_API_KEY = os.environ.get("NEWS_API_KEY", "あなたのAPIキーをここに設定")
-BASE_URL = "https://newsdata.io/api/1"
-NEWS_CACHE_FILE = "./news_cache.json"  # ニュースキャッシュファイル
+BASE_URL = os.environ.get("NEWS_BASE_URL", DEFAULT_BASE_URL)  # オフラインで試す時は news.py のスタブサーバー
+NEWS_RETRY_BASE_SEC = 30  # 取得に失敗した時の最初の再試行間隔（失敗のたびに倍）
+NEWS_RETRY_MAX_SEC = 60 * 60  # 再試行間隔の上限
+NEWS_CACHE_FILE = "./news_cache.json"  # 以前のニュースキャッシュ（news_storeへ移したら使わない）
+NEWS_STORE_FILE = "./news_store.jsonl"  # ニュースの保存先（1行1記事の追記型）
+NEWS_STORE_MAX_ARTICLES = 50  # 保存しておく記事数（古いものから消える）
+NEWS_ACTIVE_ARTICLES = 10  # 話題にする新しい記事の数
 
 # グローバル変数
 core = None  # VOICEVOXインスタンス
-audio_queue = queue.Queue()  # 音声再生キュー
-news_data = []  # ニュースデータ保存用
-last_news_update = datetime.datetime.now() - datetime.timedelta(days=1)  # 前回ニュース更新時間
-last_interaction_time = 0  # 最後の対話時間
-emotion_state = "normal"  # 感情状態（normal, happy, angry, sad, surprised）
-current_distance = 0  # 現在の距離
-log_messages = []  # ログメッセージ保存用
-log_max_lines = 10  # ログの最大行数
-is_playing_audio = False  # 音声再生中フラグ
+audio_queue = queue.Queue()  # 音声再生キュー（ファイルパスまたはPCMのbytes）
+audio_sink = None  # 音声出力先（AudioSink）
+synth_queue = queue.Queue()  # 音声合成キュー（SynthesisJobを入れる）
+pending_synth_jobs = []  # 合成待ち・合成中のジョブ
+synth_jobs_lock = threading.Lock()  # pending_synth_jobs用のロック
+last_interaction_time = float("-inf")  # 最後の対話時間（time.monotonic基準）
+log_max_lines = 10  # ログの最大行数（GUIに表示する行数）
+
+# 複数のスレッドで共有する状態
+StateSnapshot = collections.namedtuple("StateSnapshot", [
+    "version", "is_playing_audio", "is_generating_voice", "current_distance",
+    "emotion_state", "news_data"])
+
+class RobotState:
+    """メインループ・音声スレッド・GUIスレッドが共有する状態をまとめたものです。
+    
+    読むのは属性をそのまま参照するか、snapshot()で全項目をそろった状態で取り出します。
+    書き込みはupdate()だけで行い、変わった項目をsubscribe()した関数に通知します。
+    wait_for()を使えば、フラグをポーリングせずに状態の変化を待てます。
+    リストの項目（news_data）はタプルで保持し、丸ごと差し替えます。
+    ログは量が多いので、ここではなくLogBufferが持ちます。
+    """
+    
+    __slots__ = ("_cond", "_subscribers", "version", "is_playing_audio",
+                 "is_generating_voice", "current_distance", "emotion_state",
+                 "news_data")
+    
+    def __init__(self):
+        object.__setattr__(self, "_cond", threading.Condition())
+        object.__setattr__(self, "_subscribers", [])
+        object.__setattr__(self, "version", 0)
+        object.__setattr__(self, "is_playing_audio", False)  # 音声再生中フラグ
+        object.__setattr__(self, "is_generating_voice", False)  # 音声生成中フラグ
+        object.__setattr__(self, "current_distance", 0)  # 現在の距離（フィルタ後）
+        object.__setattr__(self, "emotion_state", "normal")  # 感情状態（normal, happy, angry, sad, surprised）
+        object.__setattr__(self, "news_data", ())  # ニュースデータ保存用
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("RobotStateはupdate()で変更してください")
+    
+    def update(self, **changes):
+        """項目をまとめて変更し、実際に値が変わった項目を購読者に通知します。"""
+        with self._cond:
+            changed, snapshot, subscribers = self._apply(changes)
+        self._notify(changed, snapshot, subscribers)
+        return changed
+    
+    def _apply(self, changes):
+        # self._condを持った状態で呼ぶ
+        changed = {}
+        for name, value in changes.items():
+            if name not in StateSnapshot._fields or name == "version":
+                raise AttributeError(f"不明な状態です: {name}")
+            if getattr(self, name) != value:
+                object.__setattr__(self, name, value)
+                changed[name] = value
+        if not changed:
+            return changed, None, ()
+        object.__setattr__(self, "version", self.version + 1)
+        self._cond.notify_all()
+        return changed, self._snapshot(), list(self._subscribers)
+    
+    def _notify(self, changed, snapshot, subscribers):
+        # 購読者はロックの外で呼ぶ（購読者の中からupdate()してもデッドロックしない）
+        for fields, callback in subscribers:
+            if fields is None or not fields.isdisjoint(changed):
+                callback(changed, snapshot)
+    
+    def _snapshot(self):
+        return StateSnapshot(*(getattr(self, name) for name in StateSnapshot._fields))
+    
+    def snapshot(self):
+        """全項目をそろった状態で取り出します（StateSnapshot）。"""
+        with self._cond:
+            return self._snapshot()
+    
+    def subscribe(self, callback, fields=None):
+        """項目が変わった時に callback(変わった項目の辞書, StateSnapshot) を呼ぶよう登録します。
+        
+        fieldsに項目名を渡すと、その項目が変わった時だけ呼びます。登録解除する関数を返します。
+        """
+        entry = (frozenset(fields) if fields else None, callback)
+        with self._cond:
+            self._subscribers.append(entry)
+        
+        def unsubscribe():
+            # update() が通知先の一覧を写し取るのと同じロックの中で外す
+            with self._cond:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+    
+    def wait_for(self, predicate, timeout=None):
+        """predicate(StateSnapshot) が真になるまで待ちます。タイムアウトしたらFalseを返します。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: predicate(self._snapshot()), timeout)
+
+state = RobotState()
+
+# ログの設定
+LOG_BUFFER_LINES = 500  # メモリに残すログの行数（リングバッファ）
+LOG_GUI_MAX_FPS = 4  # GUIのログ表示を更新する最大回数（1秒あたり）
+LOG_FILE = os.path.join("logs", "zunda_talk6.log")
+LOG_FILE_MAX_BYTES = 1024 * 1024  # ログファイルをローテートするサイズ
+LOG_FILE_BACKUP_COUNT = 5  # 残す古いログファイルの数
+
+# 計測の設定（http://127.0.0.1:<ポート>/metrics でPrometheusのテキスト形式を返す）
+METRICS_PORT = int(os.environ.get("ZUNDA_METRICS_PORT", "9101"))  # 0なら公開しない
+METRICS_SUMMARY_INTERVAL_SEC = 300  # 計測のまとめをログに出す間隔
+
+# ホットパスの計測（ヒストグラムに観測値を数えるだけなので、ほぼ負担にならない）
+distance_measure_span = metrics.histogram(
+    "zunda_distance_measure_seconds", "超音波センサーの1回の測定（エコー待ちを含む）の時間")
+distance_reading_span = metrics.histogram(
+    "zunda_distance_reading_seconds", "測定値1回分のフィルタと在室状態の判定の時間")
+voice_spans = {
+    path: metrics.histogram("zunda_generate_voice_seconds",
+                            "generate_voice() の時間（cache: キャッシュ, synth: 合成, "
+                            "backoff: 再試行待ち, error: 失敗）", path=path)
+    for path in ("cache", "synth", "backoff", "error")
+}
+tts_span = metrics.histogram("zunda_tts_seconds", "VOICEVOXの core.synthesis()（波形の生成）の時間")
+query_span = metrics.histogram("zunda_audio_query_seconds", "VOICEVOXの core.audio_query()（テキスト解析）の時間")
+playback_delay_span = metrics.histogram(
+    "zunda_playback_start_delay_seconds", "再生キューに積んでから鳴り始めるまでの時間")
+playback_span = metrics.histogram("zunda_playback_seconds", "再生した音声の長さ",
+                                  buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+compose_span = metrics.histogram(
+    "zunda_compose_voice_seconds", "テンプレート文の音声を部分からつなぎ合わせる時間（合成は含まない）")
+news_fetch_span = metrics.histogram("zunda_news_fetch_seconds", "fetch_news() の時間")
+gui_frame_spans = {
+    frame: metrics.histogram("zunda_gui_frame_seconds", "GUIの1フレームの処理時間", frame=frame)
+    for frame in ("log", "clock", "sprite")
+}
+interaction_counters = {
+    kind: metrics.counter("zunda_interactions_total", "始めた対話の数", kind=kind)
+    for kind in ("greeting", "news", "question", "idle")
+}
+
+# GUIの設定
+SPRITE_DIR = "./pic_zunda"  # zunda_<表情>.png と zunda_<表情>_mouth_open.png を置く
+SPRITE_ATLAS_MAX_BYTES = 48 * 1024 * 1024  # デコード済みのキャラクター画像に使うメモリの上限
+SPRITE_FPS = 15  # 音声再生中にキャラクター画像を切り替える回数（1秒あたり）
+SPRITE_IDLE_FPS = 4  # 再生していない時に表情の変化を確認する回数（1秒あたり）
+SPRITE_MOUTH_PERIOD_SEC = 0.12  # 口パクで口を開け閉めする間隔（包絡線が無い音声の場合）
+SPRITE_MOUTH_OPEN_LEVEL = 64  # 包絡線がこの値（0～255）以上の区間は口を開ける
+GUI_FRAME_REPORT_SEC = 600  # GUIの1フレームにかかった時間をログに出す間隔（秒）
+
+# ログのリングバッファと非同期書き出し
+class LogBuffer:
+    """ログを固定長のリングバッファに溜め、ターミナルとファイルへは専用スレッドで書き出します。
+    
+    append()は通し番号を振ってdequeとキューに積むだけなので、どのスレッドからでも
+    数マイクロ秒で呼べます。番号を振ってから seq を更新するまでは1つのロックの中で行うので、
+    dequeの行は番号順に並び、seq の番号の行は必ずdequeに入っています。
+    GUIは since() で前回表示した番号より新しい行だけを取り出します。
+    """
+    
+    def __init__(self, maxlen, log_file=None, max_bytes=0, backup_count=0, echo=True):
+        self.lines = collections.deque(maxlen=maxlen)  # (通し番号, 時刻, メッセージ)
+        self.echo = echo  # ターミナルにも出力するか
+        self.seq = 0  # 最後に追加した行の通し番号
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._counter = itertools.count(1)
+        self._pending = queue.SimpleQueue()  # 書き出し待ちの (時刻, メッセージ)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._lock = threading.Lock()  # 通し番号・lines・seq・書き出し待ちの順序を揃える
+    
+    def append(self, message):
+        now = time.time()
+        with self._lock:
+            seq = next(self._counter)
+            self.lines.append((seq, now, message))
+            self.seq = seq
+            self._pending.put((now, message))
+        if self._writer is None:
+            self._start_writer()
+    
+    def since(self, seq):
+        """通し番号がseqより新しい行を古い順に返します。"""
+        with self._lock:
+            lines = list(self.lines)
+        return [line for line in lines if line[0] > seq]
+    
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+    
+    def _open_file_logger(self):
+        if not self.log_file:
+            return None
+        try:
+            os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_file, maxBytes=self.max_bytes, backupCount=self.backup_count,
+                encoding="utf-8")
+        except OSError as e:
+            print(f"ログファイルを開けません: {e}")
+            return None
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        file_logger = logging.getLogger("zunda_talk6")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        file_logger.addHandler(handler)
+        return file_logger
+    
+    def _write_loop(self):
+        file_logger = self._open_file_logger()
+        while True:
+            item = self._pending.get()
+            # 溜まっている分をまとめて書き出す
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            flush_event = None
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    flush_event = entry
+                    continue
+                now, message = entry
+                # ターミナルにも出力
+                if self.echo:
+                    print(format_log_line(now, message))
+                if file_logger:
+                    file_logger.info(format_log_line(now, message, with_date=True))
+            sys.stdout.flush()
+            if flush_event:
+                flush_event.set()
+    
+    def flush(self, timeout=1.0):
+        """書き出し待ちのログを書き終えるまで待ちます（終了時用）。"""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._pending.put(done)
+        done.wait(timeout)
+
+# ログの1行を整形
+def format_log_line(timestamp, message, with_date=False):
+    fmt = "%Y-%m-%d %H:%M:%S" if with_date else "%H:%M:%S"
+    return f"[{datetime.datetime.fromtimestamp(timestamp).strftime(fmt)}] {message}"
+
+log_buffer = LogBuffer(LOG_BUFFER_LINES, LOG_FILE, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT)
 
 # GUIのグローバル参照
 gui_root = None
 distance_label = None
 time_label = None
+clock_label = None  # 時:分を大きく表示するラベル
 log_text = None
+log_shown_seq = 0  # GUIに表示済みのログの通し番号
 character_label = None
+sprite_atlas = None  # 表情と口パクの画像（create_guiで読み込む）
+widget_updater = WidgetUpdater()  # 表示内容が変わった時だけウィジェットを更新する
+gui_frame_stats = None  # GUIの1フレームにかかった時間の集計（create_guiで作成）
 news_client = None  # NewsAPIクライアント
+news_refresher = None  # ニュースの定期更新スレッド（start_newsで作成）
+emotion_classifier = EmotionClassifier(EMOTION_LEXICON_FILE, log=lambda message: add_log(message))
+# 見出しの感情は記事を取り込む時に1回だけ判定する
+news_store = NewsStore(NEWS_STORE_FILE, NEWS_STORE_MAX_ARTICLES, log=lambda message: add_log(message),
+                       annotate=lambda article: score_headline(article))
+startup = None  # 起動処理の段階と所要時間（mainで作成）
+tts_lock = threading.Lock()  # VOICEVOX Coreを同時に1スレッドだけが使うためのロック
+failed_voices = {}  # 合成に失敗したテキスト（キャッシュキー -> [テキスト, 失敗回数, 最終失敗時刻, 次の再試行時刻, 声]）
+failed_voices_lock = threading.Lock()  # failed_voices用のロック
+
+# 対話で使うフレーズ一覧（先行音声合成で全パターンを列挙するためモジュール定数にしている）
+GREETINGS = [
+    "こんにちはなのだ！ボクはずんだもんなのだ！",
+    "わーい！お客さんが来たのだ！",
+    "いらっしゃいなのだ！何かお手伝いできることはあるのだ？",
+    "こんにちはなのだ！今日はいい天気なのだ！",
+    "ずんだもんだよ！よろしくなのだ！"
+]
+RANDOM_QUESTIONS = [
+    "あなたは何が好きなのだ？",
+    "今日はどんな日だったのだ？",
+    "何か面白いことがあったのかな？",
+    "好きな食べ物は何なのだ？",
+    "ボクのこと、どう思うのだ？"
+]
+IDLE_TOPICS = [
+    "今日の天気はどうかな？",
+    "何か面白いことがあったのだ？",
+    "ボクはずんだもちが大好きなのだ！",
+    "プログラミング楽しいのだ！",
+    "何か質問があれば言ってほしいのだ",
+]
+RESPONSE_TEMPLATES = [
+    "うん、それは面白いのだ！{prompt}について考えてみたのだ",
+    "{prompt}? なるほどなのだ！ボクはずんだもんなのだ",
+    "ボクは{prompt}が好きなのだ！",
+    "{prompt}についてはよく分からないのだ…",
+    "わーい！{prompt}について話せて嬉しいのだ！"
+]
+NEWS_TOPIC_TEMPLATE = "最近のニュースで「{title}」というのがあるのだ。これについてどう思うのだ？"
+NEWS_FETCH_FAILED_MESSAGE = "ニュースの取得に失敗したのだ。ごめんなさいなのだ。"
+NEWS_BAD_TITLE_MESSAGE = "ニュースのタイトルが不適切なのだ。別のニュースを探すのだ。"
+NEWS_EMPTY_MESSAGE = "最近のニュース情報がないのだ。また後で試してみるのだ。"
+# テキスト解析で固定部分の結果を使い回すテンプレート
+QUERY_TEMPLATES = RESPONSE_TEMPLATES + [NEWS_TOPIC_TEMPLATE]
+
+# 先行音声合成（人がいない間に未キャッシュのフレーズを合成しておく）の設定
+PRESYNTH_ENABLED = True
+PRESYNTH_IDLE_DISTANCE = 150  # この距離(cm)より近くに人がいる間は先行合成を止める
+PRESYNTH_PAUSE_SEC = 1.0  # 一時停止中の再確認間隔
+PRESYNTH_RESCAN_SEC = 300  # 全部合成済みの時に再列挙する間隔（ニュース更新への追従用）
+PRESYNTH_ERROR_WAIT_SEC = 60  # 合成エラー時の待機秒数
+PRESYNTH_NICE = 10  # 先行合成スレッドのnice値（Linuxのみ有効）
+
+# 合成失敗時の再試行設定（失敗したテキストはダミー音声ではなくネガティブキャッシュに記録する）
+VOICE_RETRY_BASE_SEC = 30  # 1回目の失敗後の待ち時間。失敗のたびに倍にする
+VOICE_RETRY_MAX_SEC = 3600  # 待ち時間の上限
+VOICE_RETRY_CHECK_SEC = 10  # 再試行スレッドが期限を確認する間隔
+
+# 分割ストリーミング合成の設定（長い文を句読点で区切って、合成できた所から再生する）
+STREAM_SYNTHESIS = True
+STREAM_BREAK_AFTER = "。！？、」!?"  # この文字の直後で区切る
+STREAM_BREAK_BEFORE = "「"  # この文字の直前で区切る
+STREAM_MIN_CHUNK_CHARS = 4  # これより短い断片は次の断片とまとめる
+
+# テンプレート文の組み立て設定
+TEMPLATE_COMPOSITION = True  # テンプレートの文は固定部分と差し込み部分の音声をつないで作る
+COMPOSE_CROSSFADE_SEC = 0.01  # つなぎ目で前後の音声を重ねる長さ
+COMPOSE_SILENCE_LEVEL = 300  # つなぎ目の前後で、この振幅以下の部分を無音として削る
+COMPOSE_SILENCE_MARGIN_SEC = 0.03  # 無音を削る時に声の前後に残す長さ
+COMPOSE_PAUSE_AFTER = "。！？、!?"  # この文字で終わる部分の後の無音は削らない（自然な間として残す）
+
+# 音声出力の設定（VOICEVOXの出力形式 24kHz/モノラル/16bit に合わせて開きっぱなしにする）
+AUDIO_SINK = os.environ.get("ZUNDA_AUDIO_SINK", "auto")  # auto, alsa, aplay, null, file:<パス>
+AUDIO_ALSA_DEVICE = "default"
+AUDIO_SAMPLE_RATE = 24000
+AUDIO_CHANNELS = 1
+AUDIO_SAMPLE_WIDTH = 2  # 16bit
+AUDIO_PERIOD_FRAMES = 480  # 1回の書き込み単位（20ms）
+AUDIO_MAX_AHEAD_SEC = 0.1  # 実時間より先に書き込む最大秒数（停止の反応速度に効く）
+
+# 音声合成パイプラインの設定
+SYNTH_CANCEL_AFTER_SEC = 2.0  # 在室状態がabsentになってこの秒数続いたら合成待ちジョブを破棄する
+
+# 対話のタイミング設定（秒、単調時計で計る）
+GREETING_COOLDOWN_SEC = 30  # 前回の対話からこの秒数たったら挨拶する
+NEWS_COOLDOWN_SEC = 15  # near以上で、前回の対話からこの秒数たったらニュースを話す
+QUESTION_COOLDOWN_SEC = 10  # closeで、前回の対話からこの秒数たったら質問する
+IDLE_TALK_INTERVAL_SEC = 600  # 人がいない状態がこの秒数続いたら独り言を言う
+NEWS_REFRESH_INTERVAL_SEC = 24 * 60 * 60  # ニュースを取り直す間隔
 
 # ディレクトリ作成
 os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 
 # LEDの明るさを設定する関数
-def set_led_color(r, g, b):
-    """LEDの色を設定します。
+def set_led_color(r, g, b, fade=0.0):
+    """LEDの色を設定します（LEDエンジンに渡すだけで待ちません）。
     Args:
         r (int): 赤色の明るさ (0～65535)。
         g (int): 緑色の明るさ (0～65535)。
         b (int): 青色の明るさ (0～65535)。
+        fade (float): 今の色からこの秒数かけて切り替えます。
     """
-    red_pin.duty_cycle = r
-    green_pin.duty_cycle = g
-    blue_pin.duty_cycle = b
-
-# 超音波センサーで距離を取得する関数
-def get_distance():
-    GPIO.output(trig_pin, GPIO.HIGH)
-    time.sleep(0.000010)
-    GPIO.output(trig_pin, GPIO.LOW)
-
-    while not GPIO.input(echo_pin):
-        pass
-    t1 = time.time()
-
-    while GPIO.input(echo_pin):
-        pass
-    t2 = time.time()
-
-    return (t2 - t1) * speed_of_sound / 2
+    hw.set_led_color(r, g, b, fade)
 
 # 感情に合わせたLEDセット
 def set_emotion_led(emotion):
-    global emotion_state
-    emotion_state = emotion
-    
-    if emotion == "normal":
-        set_led_color(32767, 32767, 32767)  # 白色
-    elif emotion == "happy":
-        set_led_color(0, 65535, 0)  # 緑色
-    elif emotion == "angry":
-        set_led_color(65535, 0, 0)  # 赤色
-    elif emotion == "sad":
-        set_led_color(0, 0, 65535)  # 青色
-    elif emotion == "surprised":
-        set_led_color(65535, 65535, 0)  # 黄色
+    state.update(emotion_state=emotion)
+    
+    color = EMOTION_LED_COLORS.get(emotion)
+    if color:
+        set_led_color(*color, fade=LED_EMOTION_FADE_SEC)
+    # この感情の声で話すことが多いので、モデルを先に読み込んでおく。
+    # 合成中に読み込むと、使っているモデルを外して読み直すことになるので、手が空いている時だけ
+    style = voice_for_emotion(emotion).style
+    if not voice_pool.is_resident(style) and not state.is_generating_voice and not is_voice_busy():
+        voice_pool.prefetch(style)
 
 # ログ追加関数
 def add_log(message):
-    """ログにメッセージを追加し、GUIのログ表示を更新します。"""
-    global log_messages
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    log_message = f"[{timestamp}] {message}"
+    """ログにメッセージを追加します。どのスレッドからでも呼べます。
     
-    # ターミナルにも出力
-    print(log_message)
+    ターミナル・ファイルへの出力とGUIの更新はそれぞれ別のスレッドがまとめて行います。
+    """
+    log_buffer.append(message)
+
+# ログテキスト更新（GUIスレッドで定期的に呼ばれる）
+def update_log_text():
+    """前回の表示より新しいログだけをGUIのログ表示に追加します。"""
+    global log_shown_seq
     
-    # ログリストに追加
-    log_messages.append(log_message)
+    started = gui_frame_stats.start()
+    if log_text and log_buffer.seq != log_shown_seq:
+        new_lines = log_buffer.since(log_shown_seq)[-log_max_lines:]
+        if new_lines:
+            log_text.config(state=tk.NORMAL)
+            log_text.insert(tk.END, "".join(format_log_line(now, message) + "\n"
+                                            for _, now, message in new_lines))
+            # 最大行数を超えた古い行を削除（末尾の改行の分で+1行）
+            line_count = int(log_text.index("end-1c").split(".")[0])
+            if line_count > log_max_lines + 1:
+                log_text.delete("1.0", f"{line_count - log_max_lines}.0")
+            log_text.config(state=tk.DISABLED)
+            log_text.see(tk.END)  # 自動スクロール
+            log_shown_seq = new_lines[-1][0]
+    gui_frame_stats.end(started, "log")
     
-    # 最大行数を超えた場合、古いものを削除
-    if len(log_messages) > log_max_lines:
-        log_messages = log_messages[-log_max_lines:]
+    # 次の更新をスケジュール（ログが多くても1秒にLOG_GUI_MAX_FPS回まで）
+    if gui_root:
+        gui_root.after(int(1000 / LOG_GUI_MAX_FPS), update_log_text)
+
+# WAVデータ中のfmtとdataチャンクを探す
+def find_wav_data(view, name=""):
+    """WAVデータ（bytes/memoryview）から (fmt, dataの開始位置, dataの終了位置) を返します。
+    
+    fmtは (形式, チャンネル数, サンプリングレート, バイトレート, ブロック長, ビット数) です。
+    """
+    if view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise ValueError(f"WAVファイルではありません: {name}")
     
-    # GUIのログ表示を更新
-    if log_text:
-        gui_root.after(10, update_log_text)
+    # チャンクを順にたどってfmtとdataを探す
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError(f"fmtチャンクがありません: {name}")
+            # 途中で切れたファイルはある分だけ使う
+            end = min(body + chunk_size, len(view))
+            block_align = max(1, fmt[4])
+            end -= (end - body) % block_align
+            return fmt, body, end
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError(f"dataチャンクがありません: {name}")
 
-# ログテキスト更新
-def update_log_text():
-    """GUI上のログテキストを更新します。"""
-    if log_text:
-        log_text.config(state=tk.NORMAL)
-        log_text.delete(1.0, tk.END)
-        for msg in log_messages:
-            log_text.insert(tk.END, msg + "\n")
-        log_text.config(state=tk.DISABLED)
-        log_text.see(tk.END)  # 自動スクロール
+# WAVファイルのヘッダだけを読んでfmtとdataチャンクを探す
+def read_wav_header(f, name=""):
+    """開いたWAVファイルのチャンクの見出しを seek でたどり、(fmt, dataの開始位置, dataの宣言サイズ) を返します。
+
+    音声のデータは読まないので、dataチャンクの前に大きなチャンクがあっても読む量は変わりません。
+    """
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError(f"WAVファイルではありません: {name}")
+    
+    offset = 12
+    fmt = None
+    while True:
+        f.seek(offset)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError(f"dataチャンクがありません: {name}")
+        chunk_id, chunk_size = chunk[:4], struct.unpack_from("<I", chunk, 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError(f"fmtチャンクがありません: {name}")
+            return fmt, body, chunk_size
+        offset = body + chunk_size + (chunk_size & 1)
+
+# WAVデータの再生時間
+def wav_duration(data):
+    """WAVデータの再生時間（秒）を返します。読めない場合は0.0です。"""
+    try:
+        fmt, start, end = find_wav_data(memoryview(data))
+    except (ValueError, struct.error):
+        return 0.0
+    return (end - start) / fmt[3] if fmt[3] else 0.0
+
+# 音量の包絡線を計算
+def compute_envelope(data, frame_sec=ENVELOPE_FRAME_SEC):
+    """16bitのWAVデータの frame_sec ごとのRMSを、一番大きい区間を255とした bytes で返します。"""
+    view = memoryview(data)
+    fmt, start, end = find_wav_data(view)
+    if fmt[5] != 16:
+        raise ValueError(f"16bit以外のWAVには対応していません ({fmt[5]}bit)")
+    return compute_pcm_envelope(view[start:end], fmt[2] * fmt[1], frame_sec)
+
+# PCMの音量の包絡線を計算
+def compute_pcm_envelope(pcm, samples_per_sec=AUDIO_SAMPLE_RATE * AUDIO_CHANNELS,
+                         frame_sec=ENVELOPE_FRAME_SEC):
+    """16bitのPCMについて compute_envelope() と同じ包絡線を返します。"""
+    samples = array.array("h")
+    samples.frombytes(memoryview(pcm).cast("B"))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    
+    step = max(1, int(samples_per_sec * frame_sec))
+    rms = []
+    for offset in range(0, len(samples), step):
+        chunk = samples[offset:offset + step]
+        rms.append(math.sqrt(sum(map(operator.mul, chunk, chunk)) / len(chunk)))
+    peak = max(rms, default=0.0)
+    if not peak:
+        return bytes(len(rms))
+    return bytes(min(255, int(value / peak * 255 + 0.5)) for value in rms)
+
+# 包絡線をファイルに保存
+def write_envelope(path, levels, frame_sec=ENVELOPE_FRAME_SEC):
+    """包絡線を「ENV1 + 区間の長さ(ms, uint16) + 1区間1バイト」の形式で保存します。"""
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(ENVELOPE_MAGIC + struct.pack("<H", round(frame_sec * 1000)) + bytes(levels))
+    os.replace(tmp_path, path)
+
+# 包絡線をファイルから読む
+def read_envelope(path):
+    """(区間の長さ(秒), 包絡線のbytes) を返します。無い・壊れている場合はNoneです。"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < 6 or data[:4] != ENVELOPE_MAGIC:
+        return None
+    frame_ms = struct.unpack_from("<H", data, 4)[0]
+    return (frame_ms / 1000, data[6:]) if frame_ms else None
+
+# 索引付きの音声キャッシュ
+class AudioCache:
+    """音声キャッシュの索引をメモリに持ち、上限サイズを超えたら古いものから削除します。
+    
+    索引（キー → ファイル名, サイズ, 再生時間, 最終ヒット時刻, ヒット回数）は
+    manifest.jsonに保存し、起動時に一度だけ読み込みます。検索はメモリ上の索引だけで
+    行い、ファイルシステムには触りません。pin()したキーは削除しません。
+    音声と同じ名前の <キー>.env には、LEDと口パク用の音量の包絡線を保存します。
+    """
+    
+    def __init__(self, cache_dir, manifest_path, max_bytes, eviction="lru"):
+        self.cache_dir = cache_dir
+        self.manifest_path = manifest_path
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.entries = {}  # key -> [ファイル名, サイズ, 再生時間, 最終ヒット時刻, ヒット回数]
+        self.pinned = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = 0.0
+    
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+    
+    def envelope_path_for(self, audio_path):
+        return os.path.splitext(audio_path)[0] + ".env"
+    
+    def load(self):
+        """manifest.jsonを読み込み、ディレクトリの実際の内容と突き合わせます。"""
+        with self._lock:
+            entries = {}
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", {})
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                add_log(f"音声キャッシュ索引の読み込みエラー: {e}")
+            
+            # ファイルが消えたエントリは捨て、索引に無いファイルは追加する
+            files = {}
+            envelopes = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".wav") and entry.is_file():
+                        files[entry.name[:-4]] = entry
+                    elif entry.name.endswith(".env"):
+                        envelopes.append(entry)
+            # 音声が消えた包絡線は削除する
+            for entry in envelopes:
+                if entry.name[:-4] not in files:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+            self.entries = {}
+            for key, dir_entry in files.items():
+                if key in entries:
+                    self.entries[key] = entries[key]
+                else:
+                    stat = dir_entry.stat()
+                    self.entries[key] = [dir_entry.name, stat.st_size,
+                                         self._read_duration(dir_entry.path), stat.st_mtime, 0]
+            self.total_bytes = sum(entry[1] for entry in self.entries.values())
+            self._loaded = True
+            self._dirty = self.entries.keys() != entries.keys()
+            self._evict()
+            self.save()
+    
+    def _read_duration(self, path):
+        try:
+            with open(path, "rb") as f:
+                fmt, start, declared = read_wav_header(f, path)
+                size = os.fstat(f.fileno()).st_size
+            return min(declared, size - start) / fmt[3] if fmt[3] else 0.0
+        except (OSError, ValueError, struct.error):
+            return 0.0
+    
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+    
+    def contains(self, key):
+        """ヒット回数を数えずに、キャッシュにあるかだけを返します。"""
+        with self._lock:
+            self._ensure_loaded()
+            return key in self.entries
+    
+    def lookup(self, key):
+        """キャッシュにあればファイルパスを返し、ヒット情報を更新します。無ければNoneです。"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[3] = time.time()
+            entry[4] += 1
+            self._dirty = True
+            self.maybe_save()
+            return os.path.join(self.cache_dir, entry[0])
+    
+    def store(self, key, wave_bytes):
+        """音声データを一時ファイル経由で書き込み、索引に登録してパスを返します。"""
+        path = self.path_for(key)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(wave_bytes)
+        os.replace(tmp_path, path)  # 書きかけのファイルを再生しないよう置き換えで公開する
+        self._store_envelope(path, wave_bytes)
+        
+        with self._lock:
+            self._ensure_loaded()
+            old = self.entries.get(key)
+            if old:
+                self.total_bytes -= old[1]
+            self.entries[key] = [os.path.basename(path), len(wave_bytes),
+                                 wav_duration(wave_bytes), time.time(), old[4] if old else 0]
+            self.total_bytes += len(wave_bytes)
+            self._evict(keep=key)
+            self._dirty = True
+            self.save()
+        return path
+    
+    def _store_envelope(self, path, wave_bytes):
+        # 合成した時に一度だけ包絡線を計算しておく（再生中は音声を解析しない）
+        try:
+            write_envelope(self.envelope_path_for(path), compute_envelope(wave_bytes))
+        except (OSError, ValueError, struct.error) as e:
+            add_log(f"包絡線の保存エラー: {e}")
+    
+    def get_envelope(self, path):
+        """音声ファイルの (区間の長さ(秒), 包絡線) を返します。
+        
+        包絡線が無い古いキャッシュは、ここで一度だけ計算して保存します。
+        """
+        envelope = read_envelope(self.envelope_path_for(path))
+        if envelope is None:
+            try:
+                with open(path, "rb") as f:
+                    self._store_envelope(path, f.read())
+            except OSError:
+                return None
+            envelope = read_envelope(self.envelope_path_for(path))
+        return envelope
+    
+    def remove(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            self.total_bytes -= entry[1]
+            self._dirty = True
+        path = os.path.join(self.cache_dir, entry[0])
+        for remove_path in (path, self.envelope_path_for(path)):
+            try:
+                os.remove(remove_path)
+            except OSError:
+                pass
+    
+    def remove_path(self, path):
+        """再生できなかった音声ファイルを索引から外して削除します（次は合成し直されます）。"""
+        self.remove(os.path.splitext(os.path.basename(path))[0])
+    
+    def pin(self, keys):
+        """定型フレーズなど、削除させたくないキーを登録します。"""
+        with self._lock:
+            self.pinned.update(keys)
+    
+    def _evict(self, keep=None):
+        # 上限を超えている間、ピン留めされていないものを方針に従って削除する
+        if self.total_bytes <= self.max_bytes:
+            return
+        if self.eviction == "lfu":
+            order = lambda key: (self.entries[key][4], self.entries[key][3])
+        else:
+            order = lambda key: (self.entries[key][3], self.entries[key][4])
+        candidates = sorted((key for key in self.entries
+                             if key not in self.pinned and key != keep), key=order)
+        for key in candidates:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.remove(key)
+            self.evictions += 1
+    
+    def validate(self):
+        """壊れた・途中で切れたWAVを索引とディスクから削除し、削除した件数を返します。"""
+        with self._lock:
+            self._ensure_loaded()
+            items = list(self.entries.items())
+        
+        invalid = [key for key, entry in items
+                   if not self._is_valid_file(os.path.join(self.cache_dir, entry[0]))]
+        for key in invalid:
+            self.remove(key)
+        if invalid:
+            self.save()
+        return len(invalid)
+    
+    def _is_valid_file(self, path):
+        # ヘッダが読めて、dataチャンクが空でなく、宣言されたサイズ分のデータが揃っているか
+        try:
+            size = os.path.getsize(path)
+            if size < 100:  # play_audioと同じ基準
+                return False
+            with open(path, "rb") as f:
+                _, start, declared = read_wav_header(f, path)
+            return declared > 0 and start + declared <= size
+        except (OSError, ValueError, struct.error):
+            return False
+    
+    def maybe_save(self):
+        """ヒット情報の書き戻しは一定間隔にまとめます。"""
+        if self._dirty and time.time() - self._last_save > AUDIO_CACHE_SAVE_INTERVAL_SEC:
+            self.save()
+    
+    def save(self):
+        """索引を一時ファイル経由でmanifest.jsonに書き込みます。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f"{self.manifest_path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "entries": self.entries}, f, separators=(",", ":"))
+                os.replace(tmp_path, self.manifest_path)
+                self._dirty = False
+                self._last_save = time.time()
+            except Exception as e:
+                add_log(f"音声キャッシュ索引の保存エラー: {e}")
+    
+    def get_stats(self):
+        """ヒット・ミス数などの統計を辞書で返します。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self.pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
 
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MANIFEST, AUDIO_CACHE_MAX_BYTES,
+                         AUDIO_CACHE_EVICTION)
+query_cache = QueryCache(QUERY_CACHE_DIR, QUERY_CACHE_MAX_FILES)
+
+# 感情に対応する声
+def voice_for_emotion(emotion):
+    return VoiceSpec(EMOTION_VOICE_STYLES.get(emotion, SPEAKER_ID), **EMOTION_VOICE_PARAMS.get(emotion, {}))
+
+# テキストを読み上げる声
+def voice_for_text(text):
+    """テキストの感情から声を決めます（先行合成でも同じ声を使えるよう、テキストだけで決めます）。"""
+    return voice_for_emotion(detect_emotion(text))
+
+# 音声キャッシュのキーを返す
+def get_voice_cache_key(text, voice=DEFAULT_VOICE):
+    """テキストと声に対応する音声キャッシュのキーを返します。"""
+    # hash関数ではなくhashlibを使用。既定の声は以前のキャッシュをそのまま使えるようテキストだけにする
+    if voice == DEFAULT_VOICE:
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+    if voice[1:] == DEFAULT_VOICE[1:]:
+        return hashlib.md5(f"{voice.style}:{text}".encode('utf-8')).hexdigest()
+    return hashlib.md5(f"{voice.style}:{voice.speed}:{voice.pitch}:{voice.intonation}:{text}"
+                       .encode('utf-8')).hexdigest()
+
+# 有効な音声キャッシュがあるか確認
+def is_voice_cached(text, voice=DEFAULT_VOICE):
+    """テキストの音声がキャッシュの索引にあればTrueを返します。"""
+    return audio_cache.contains(get_voice_cache_key(text, voice))
+
+# 定型フレーズをキャッシュから削除されないようにする
+def pin_canned_utterances():
+    keys = []
+    for text, voice in enumerate_utterances(include_news=False):
+        # 共通の断片（「なるほどなのだ！」など）やテンプレートの固定部分も残す
+        for piece in [text] + split_text_chunks(text) + synthesis_units(text):
+            keys.append(get_voice_cache_key(piece, voice))
+    # ニュースの話題の共通の断片（「これについてどう思うのだ？」など）と固定部分。
+    # ニュースは見出しの感情の声で話すので、どの感情の声の分も残す
+    pieces = split_text_chunks(NEWS_TOPIC_TEMPLATE) + list(split_template(NEWS_TOPIC_TEMPLATE))
+    for voice in dict.fromkeys(voice_for_emotion(emotion) for emotion in ("normal", *EMOTION_VOICE_STYLES)):
+        keys += [get_voice_cache_key(piece, voice) for piece in pieces if piece]
+    audio_cache.pin(keys)
+
+# VOICEVOX Coreを返す（初期化前なら初期化する）
+def get_voicevox_core():
+    global core
+    if core is None:
+        from voicevox_core import VoicevoxCore
+        add_log("VOICEVOX Coreを初期化中...")
+        core = VoicevoxCore(open_jtalk_dict_dir=Path(VOICEVOX_DICT_PATH))
+    return core
+
+voice_pool = VoiceModelPool(get_voicevox_core, tts_lock, VOICE_MODEL_CAPACITY, SPEAKER_ID,
+                            log=lambda message: add_log(message))
+
+# AudioQueryを辞書にする（保存用）
+def audio_query_to_dict(query):
+    return dataclasses.asdict(query)
+
+# 辞書からAudioQueryに戻す
+def audio_query_from_dict(data):
+    from voicevox_core import AudioQuery
+    return AudioQuery(**data)
+
+# テキスト解析の結果（AudioQuery）を返す。tts_lockを持った状態で呼ぶ
+def get_audio_query(vv_core, text, speaker):
+    """text を speaker で読む時のAudioQuery（辞書）を返します。
+    
+    保存済みならそれを使います。別の話者で解析済みなら、アクセント句はそのままで
+    音高と長さだけを mora_data で予測し直します（Open JTalkの解析はしません）。
+    テンプレートから作った文は、固定部分の解析結果をつなげて差し込み部分だけを解析します。
+    """
+    query = query_cache.get(text, speaker)
+    if query is not None:
+        return query
+    
+    other = query_cache.get_any(text)
+    parts = match_template(text, QUERY_TEMPLATES)
+    if other is not None:
+        base = audio_query_from_dict(other)
+        query = audio_query_to_dict(dataclasses.replace(
+            base, accent_phrases=vv_core.mora_data(base.accent_phrases, speaker)))
+    elif parts and len(parts) > 1:
+        query = join_audio_queries([get_audio_query(vv_core, part, speaker) for part in parts])
+    else:
+        with query_span.time():
+            query = audio_query_to_dict(vv_core.audio_query(text, speaker))
+    query_cache.put(text, speaker, query)
+    return query
+
+# VOICEVOXで合成してキャッシュに保存（例外はそのまま呼び出し元へ）
+def synthesize_voice(text, voice=DEFAULT_VOICE):
+    """VOICEVOXで音声合成してキャッシュに保存し、ファイルパスを返します。
+    
+    テキスト解析（AudioQuery）と波形の生成を分けて行い、解析の結果は query_cache に保存します。
+    話速・音高・抑揚は解析の結果に声の設定を入れるだけなので、解析し直しません。
+    モデルの上限のため別のスタイルで代用した場合も、voice のキーで保存します
+    （代用した音声を次回も使い、モデルの読み込みを繰り返さないため）。
+    """
+    with tts_lock:
+        # モデルがロードされているか確認し、必要ならロード（上限を超えたら古いモデルを外す）
+        speaker = voice_pool.acquire(voice.style)
+        vv_core = get_voicevox_core()
+        
+        query = get_audio_query(vv_core, text, speaker)
+        query.update(speed_scale=voice.speed, pitch_scale=voice.pitch, intonation_scale=voice.intonation)
+        with tts_span.time():
+            wave_bytes = vv_core.synthesis(audio_query_from_dict(query), speaker)
+    
+    # キャッシュに保存
+    return audio_cache.store(get_voice_cache_key(text, voice), wave_bytes)
 
 # 音声生成関数（修正版）
-def generate_voice(text, force_generate=False):
+def generate_voice(text, force_generate=False, voice=DEFAULT_VOICE):
     """VOICEVOXを使用して音声を生成し、ファイルパスを返します。"""
-    global core, is_generating_voice
-    
     # 音声生成開始フラグをセット
-    is_generating_voice = True
+    state.update(is_generating_voice=True)
+    started = time.perf_counter()
+    path = "error"  # 計測の分類
     
     try:
-        # キャッシュファイル名を作成（テキストのハッシュ値を使用）
-        # hash関数ではなくhashlibを使用
-        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-        cache_filename = os.path.join(AUDIO_CACHE_DIR, f"{text_hash}.wav")
-        
-        # キャッシュが存在すれば、それを返す
-        if os.path.exists(cache_filename) and not force_generate:
+        # キャッシュの索引にあれば、それを返す（キーはテキストのハッシュ値）
+        cache_key = get_voice_cache_key(text, voice)
+        cache_filename = None if force_generate else audio_cache.lookup(cache_key)
+        if cache_filename:
+            path = "cache"
             add_log(f"キャッシュ使用: {text[:20]}...")
-            is_generating_voice = False  # 生成完了
             return cache_filename
         
-        # VOICEVOXインスタンスが初期化されていない場合は初期化
-        if core is None:
-            from voicevox_core import VoicevoxCore
-            from pathlib import Path
-            add_log("VOICEVOX Coreを初期化中...")
-            core = VoicevoxCore(open_jtalk_dict_dir=Path(VOICEVOX_DICT_PATH))
-        
-        # モデルがロードされているか確認し、必要ならロード
-        if not core.is_model_loaded(SPEAKER_ID):
-            add_log(f"VOICEVOX モデル {SPEAKER_ID} をロード中...")
-            core.load_model(SPEAKER_ID)
+        # 最近失敗したテキストは再試行スレッドに任せ、ここでは待たずに諦める
+        if not force_generate and is_voice_failure_backing_off(cache_key):
+            path = "backoff"
+            add_log(f"合成失敗のため再試行待ち: {text[:20]}...")
+            return None
         
         # 音声合成を実行
         add_log("音声生成中...")
-        wave_bytes = core.tts(text, SPEAKER_ID)
-        
-        # ファイルに保存
-        with open(cache_filename, "wb") as f:
-            f.write(wave_bytes)
+        cache_filename = synthesize_voice(text, voice)
+        path = "synth"
             
         add_log(f"音声生成完了: {text[:20]}...")
         return cache_filename
     
     except Exception as e:
         add_log(f"音声生成エラー: {e}")
-        # エラーが発生した場合、簡易的なダミーファイルを作成（テスト用）
-        try:
-            with open(cache_filename, "wb") as f:
-                # テスト用の空ファイル
-                f.write(b'RIFF\x24\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x44\xac\x00\x00\x88\x58\x01\x00\x02\x00\x10\x00data\x00\x00\x00\x00')
-            add_log(f"ダミー音声ファイル作成: {text[:20]}...")
-            return cache_filename
-        except:
-            return None
+        # ダミー音声はキャッシュせず、失敗として記録して後で再試行する
+        record_voice_failure(text, voice)
+        return None
     
     finally:
         # 生成完了フラグをリセット
-        is_generating_voice = False
+        voice_spans[path].observe(time.perf_counter() - started)
+        state.update(is_generating_voice=False)
 
-# 音声再生関数（修正版）
-def play_audio(audio_file):
-    """音声ファイルを再生します。"""
-    global is_playing_audio
+# 合成失敗を記録
+def record_voice_failure(text, voice=DEFAULT_VOICE):
+    """合成に失敗したテキストを記録し、失敗回数に応じて次の再試行時刻を遅らせます。"""
+    cache_key = get_voice_cache_key(text, voice)
+    now = time.time()
+    with failed_voices_lock:
+        entry = failed_voices.get(cache_key)
+        failures = entry[1] + 1 if entry else 1
+        wait = min(VOICE_RETRY_BASE_SEC * 2 ** (failures - 1), VOICE_RETRY_MAX_SEC)
+        failed_voices[cache_key] = [text, failures, now, now + wait, voice]
+    return wait
+
+# 再試行待ちのテキストか
+def is_voice_failure_backing_off(cache_key):
+    with failed_voices_lock:
+        entry = failed_voices.get(cache_key)
+    return entry is not None and time.time() < entry[3]
+
+# 合成に成功したら失敗記録を消す
+def clear_voice_failure(text, voice=DEFAULT_VOICE):
+    with failed_voices_lock:
+        failed_voices.pop(get_voice_cache_key(text, voice), None)
+
+# 合成失敗の再試行スレッド
+def voice_retry_thread():
+    """再試行時刻を過ぎた失敗テキストを、人がいない間に合成し直します。"""
+    while True:
+        time.sleep(VOICE_RETRY_CHECK_SEC)
+        now = time.time()
+        with failed_voices_lock:
+            due = sorted((entry for entry in failed_voices.values() if entry[3] <= now),
+                         key=lambda entry: entry[3])
+        
+        for text, failures, _, _, voice in due:
+            if should_pause_presynthesis():
+                break
+            if is_voice_cached(text, voice):
+                clear_voice_failure(text, voice)
+                continue
+            try:
+                synthesize_voice(text, voice)
+                clear_voice_failure(text, voice)
+                add_log(f"再合成成功（{failures}回失敗後）: {text[:20]}...")
+            except Exception as e:
+                wait = record_voice_failure(text, voice)
+                add_log(f"再合成エラー: {e}（{wait}秒後に再試行）")
+
+# 句読点でテキストを分割
+def split_text_chunks(text):
+    """テキストを日本語の句読点・かぎ括弧で合成単位の断片に分割します。"""
+    chunks = []
+    current = ""
+    for char in text:
+        if char in STREAM_BREAK_BEFORE and current:
+            chunks.append(current)
+            current = ""
+        current += char
+        if char in STREAM_BREAK_AFTER:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
     
-    try:
-        if not os.path.exists(audio_file):
-            add_log(f"音声ファイルが見つかりません: {audio_file}")
+    # 短すぎる断片（「？」だけ等）は前の断片に、先頭なら次の断片にまとめる
+    merged = []
+    carry = ""
+    for chunk in chunks:
+        chunk = carry + chunk
+        carry = ""
+        if len(chunk.strip()) < STREAM_MIN_CHUNK_CHARS:
+            if merged:
+                merged[-1] += chunk
+            else:
+                carry = chunk
+            continue
+        merged.append(chunk)
+    if carry:
+        if merged:
+            merged[-1] += carry
+        else:
+            merged.append(carry)
+    return [chunk.strip() for chunk in merged if chunk.strip()]
+
+# 合成してキャッシュする単位
+def synthesis_units(text):
+    """text の音声を作るために合成する単位を返します。
+
+    テンプレートから作った文なら [固定部分, 差し込み部分, 固定部分]（空の部分は除く）、
+    そうでなければ [text] です。
+    """
+    if TEMPLATE_COMPOSITION:
+        parts = match_template(text, QUERY_TEMPLATES)
+        if parts and len(parts) > 1:
+            return parts
+    return [text]
+
+# 部分ごとの音声から組み立てた音声（envelopeは (区間の長さ(秒), 包絡線)）
+ComposedAudio = collections.namedtuple("ComposedAudio", ["pcm", "label", "envelope"])
+
+# テンプレート文の音声を部分ごとの音声から組み立てる
+def compose_voice(parts, label, voice=DEFAULT_VOICE, cancelled=None, continued=False):
+    """parts（テンプレートの差し込み部分と後ろの固定部分など）の音声をつないだ ComposedAudio を返します。
+    
+    固定部分（「なるほどなのだ！」など）は一度合成すればキャッシュされるので、
+    新しく合成するのは差し込み部分だけです。つなぎ目では前後の無音を削り、
+    短いクロスフェードで重ねます。continued がTrueなら直前に再生した部分に続くので、
+    最初の部分の前の無音も削ります。包絡線は部分ごとのキャッシュの包絡線をつなぎます
+    （区間の音量は部分ごとの一番大きい区間が基準のままです）。どれかの部分の合成に失敗した場合や、
+    cancelled() がTrueになった場合はNoneです。
+    """
+    files = []
+    for part in parts:
+        if cancelled and cancelled():
+            return None
+        audio_file = generate_voice(part, voice=voice)
+        if audio_file is None:
+            return None
+        files.append(audio_file)
+    
+    with compose_span.time():
+        margin = int(AUDIO_SAMPLE_RATE * COMPOSE_SILENCE_MARGIN_SEC)
+        segments = []
+        levels = bytearray()
+        frame_sec = None
+        for i, (part, audio_file) in enumerate(zip(parts, files)):
+            # メモリマップしたPCMの一部を見るだけで、ここではコピーしない
+            samples = pcm_samples(load_wav_pcm(audio_file))
+            start, end = voiced_range(samples, COMPOSE_SILENCE_LEVEL, margin)
+            if i == 0 and not continued:
+                start = 0  # 文頭の無音はそのまま
+            if i == len(parts) - 1 or part[-1] in COMPOSE_PAUSE_AFTER:
+                end = len(samples)  # 文末と句読点の後の間はそのまま
+            segments.append(samples[start:end])
+            # 包絡線はつないだPCMを解析し直さず、部分ごとに保存済みのものから使った範囲の区間を切り出す
+            envelope = audio_cache.get_envelope(audio_file)
+            if levels is not None and envelope is not None and frame_sec in (None, envelope[0]):
+                frame_sec = envelope[0]
+                step = max(1, int(AUDIO_SAMPLE_RATE * frame_sec))
+                levels += envelope[1][start // step:-(-end // step)]
+            else:
+                levels = None  # 包絡線が無い部分があれば、音量なしで再生する
+        pcm = splice_pcm(segments, int(AUDIO_SAMPLE_RATE * COMPOSE_CROSSFADE_SEC))
+    envelope = (frame_sec, bytes(levels)) if levels else None
+    return ComposedAudio(pcm, label, envelope)
+
+# 分割ストリーミング音声生成
+def generate_voice_stream(text, voice=DEFAULT_VOICE, cancelled=None):
+    """音声（ファイルのパスまたはComposedAudio）を再生順に返すジェネレータです。
+    
+    文全体がキャッシュ済みならそのファイルを1つだけ返します。テンプレートから作った文で
+    差し込み部分がキャッシュ済みなら、前の固定部分をすぐに返し、差し込み部分と
+    後ろの固定部分を compose_voice() でつないだ音声を続けて返します。そうでなければ
+    句読点で区切った断片ごとに合成し、できた順に返すので、最初の断片の
+    合成が終わった時点で再生を始められます。断片は個別にキャッシュされるため、
+    「これについてどう思うのだ？」のような共通の断片は別のニュースでも再利用されます。
+    cancelled() がTrueになったら、次の部分を合成せずに終わります。
+    """
+    cancelled = cancelled or (lambda: False)
+    if is_voice_cached(text, voice):
+        yield generate_voice(text, voice=voice)
+        return
+    
+    parts = match_template_parts(text, QUERY_TEMPLATES) if TEMPLATE_COMPOSITION else None
+    if parts and is_voice_cached(parts[1], voice):
+        prefix, slot, suffix = parts
+        if prefix:
+            yield generate_voice(prefix, voice=voice)  # 固定部分はキャッシュ済みなのですぐ鳴らせる
+        composed = compose_voice([part for part in (slot, suffix) if part], text, voice,
+                                 cancelled, continued=bool(prefix))
+        if not cancelled():
+            yield composed
+        return
+    
+    chunks = split_text_chunks(text)
+    if not STREAM_SYNTHESIS or len(chunks) <= 1:
+        yield generate_voice(text, voice=voice)
+        return
+    
+    for chunk in chunks:
+        if cancelled():
             return
+        yield generate_voice(chunk, voice=voice)
+
+# 対話で発話しうる全フレーズを列挙
+def enumerate_utterances(include_news=True):
+    """対話で発話しうるフレーズと読み上げる声の組を、初対面の応答に近い順（優先度順）に列挙します。"""
+    utterances = list(GREETINGS)
+    utterances += [template.format(prompt=question)
+                   for question in RANDOM_QUESTIONS
+                   for template in RESPONSE_TEMPLATES]
+    news = []
+    if include_news:
+        for article in state.news_data:
+            title = article.get("title", "")
+            if len(title) > 5:  # get_random_news_topicと同じ基準
+                # ニュースは取り込んだ時に判定した見出しの感情の声で話す
+                news.append((NEWS_TOPIC_TEMPLATE.format(title=title),
+                             voice_for_emotion(article.get("emotion", "normal"))))
+    others = [NEWS_FETCH_FAILED_MESSAGE, NEWS_BAD_TITLE_MESSAGE, NEWS_EMPTY_MESSAGE] + IDLE_TOPICS
+    pairs = ([(text, voice_for_text(text)) for text in utterances] + news
+             + [(text, voice_for_text(text)) for text in others])
+    
+    # 重複を除いて順序を保つ
+    return list(dict.fromkeys(pairs))
+
+# 先行合成を止めるべきか（人が近くにいる・本番の合成や再生中）
+def should_pause_presynthesis():
+    return state.current_distance < PRESYNTH_IDLE_DISTANCE or is_voice_busy()
+
+# 先行音声合成スレッド
+def presynthesis_thread():
+    """人がいない間に、まだキャッシュされていないフレーズを低優先度で合成します。"""
+    # このスレッドだけnice値を上げて、センサーや本番の合成を優先させる
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PRESYNTH_NICE)
+    except (AttributeError, OSError):
+        pass
+    
+    while True:
+        # テンプレートの文は文全体ではなく、組み立てに使う部分を合成しておく
+        pending = [(unit, voice) for text, voice in enumerate_utterances()
+                   for unit in synthesis_units(text)]
+        pending = [(text, voice) for text, voice in dict.fromkeys(pending)
+                   if not is_voice_cached(text, voice)]
+        # モデルの読み込み直しが少なくなるよう、スタイルごとにまとめて合成する（既定のスタイルが先）
+        pending.sort(key=lambda item: (item[1].style != SPEAKER_ID, item[1].style))
+        if not pending:
+            time.sleep(PRESYNTH_RESCAN_SEC)
+            continue
+        
+        add_log(f"先行合成: 未キャッシュ {len(pending)}件")
+        for text, voice in pending:
+            # 人が近くにいる間は一時停止（状態の変化を待つ。合成待ちジョブは状態に無いので時々確認する）
+            while should_pause_presynthesis():
+                state.wait_for(lambda snapshot: snapshot.current_distance >= PRESYNTH_IDLE_DISTANCE
+                               and not snapshot.is_generating_voice
+                               and not snapshot.is_playing_audio,
+                               timeout=PRESYNTH_PAUSE_SEC)
             
-        # ファイルサイズチェック
-        if os.path.getsize(audio_file) < 100:  # 極端に小さいファイルはスキップ
-            add_log(f"無効な音声ファイルをスキップします: {audio_file}")
+            # 待っている間に本番側で合成された場合や、再試行待ちの場合はスキップ
+            cache_key = get_voice_cache_key(text, voice)
+            if audio_cache.contains(cache_key) or is_voice_failure_backing_off(cache_key):
+                continue
+            
+            try:
+                synthesize_voice(text, voice)
+                clear_voice_failure(text, voice)
+                add_log(f"先行合成完了: {text[:20]}...")
+            except Exception as e:
+                add_log(f"先行合成エラー: {e}")
+                record_voice_failure(text, voice)
+                time.sleep(PRESYNTH_ERROR_WAIT_SEC)
+                break
+
+# WAVファイルのPCM部分を読み込む
+def load_wav_pcm(audio_file):
+    """WAVファイルをメモリマップし、dataチャンク部分のmemoryviewを返します。
+    
+    コピーせずにそのままAudioSinkへ渡せます。形式が出力設定と違う場合はValueErrorです。
+    """
+    with open(audio_file, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    
+    fmt, start, end = find_wav_data(view, audio_file)
+    _, channels, rate, _, _, bits = fmt
+    if (rate, channels, bits) != (AUDIO_SAMPLE_RATE, AUDIO_CHANNELS, AUDIO_SAMPLE_WIDTH * 8):
+        raise ValueError(f"未対応の形式です ({rate}Hz, {channels}ch, {bits}bit): {audio_file}")
+    return view[start:end]
+
+# 音声出力先に積まれる1クリップ
+class AudioClip:
+    def __init__(self, pcm, label="", on_start=None, on_finish=None, envelope=None):
+        self.pcm = memoryview(pcm).cast("B")
+        self.label = label
+        self.envelope = envelope  # (区間の長さ(秒), 包絡線) またはNone
+        self.enqueued_at = time.monotonic()
+        self.on_start = on_start  # on_start(clip, 再生開始時刻) を出力スレッドから呼ぶ
+        self.on_finish = on_finish  # on_finish(clip, 最後まで再生したか)
+        self.duration = len(self.pcm) / (AUDIO_SAMPLE_RATE * AUDIO_CHANNELS * AUDIO_SAMPLE_WIDTH)
+
+# 音声出力先の基底クラス
+class AudioSink:
+    """24kHz/モノラル/16bitのPCMを再生し続ける出力先の基底クラスです。
+    
+    出力ストリームは開いたままにして、enqueue()で積まれたクリップを専用スレッドが
+    周期（AUDIO_PERIOD_FRAMES）単位で書き込みます。続けて積んだクリップは隙間なく
+    つながり、stop()を呼ぶと積まれているものも含めてすぐに止まります。
+    サブクラスは_open/_write/_discard/_closeを実装します。
+    """
+    
+    def __init__(self, realtime=True, on_state_change=None):
+        self.realtime = realtime  # Falseなら実時間を待たずに書き込む（ファイル出力用）
+        self.on_state_change = on_state_change  # on_state_change(再生中か) をロック内から呼ぶ
+        self.active = False
+        self.current_clip = None
+        self.current_start = 0.0  # current_clipの再生開始時刻（time.monotonic基準）
+        self._clips = collections.deque()
+        self._cond = threading.Condition()
+        self._generation = 0  # stop()のたびに増やして書き込み中のクリップを打ち切る
+        self._play_end = 0.0  # 書き込み済みの音が鳴り終わる時刻
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def enqueue(self, pcm, label="", on_start=None, on_finish=None, envelope=None):
+        """PCM（bytesやmemoryview）を再生キューの最後に積み、AudioClipを返します。"""
+        clip = AudioClip(pcm, label, on_start, on_finish, envelope)
+        with self._cond:
+            self._clips.append(clip)
+            self._set_active(True)
+            self._cond.notify_all()
+        return clip
+    
+    def stop(self):
+        """再生中のクリップと積まれているクリップをすべて破棄します。"""
+        with self._cond:
+            dropped = list(self._clips)
+            self._clips.clear()
+            self._generation += 1
+            self._play_end = 0.0
+            self._cond.notify_all()
+        self._discard()
+        for clip in dropped:
+            if clip.on_finish:
+                clip.on_finish(clip, False)
+    
+    def wait_until_idle(self, timeout=None):
+        """再生が終わるまで待ちます。タイムアウトしたらFalseを返します。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.active, timeout)
+    
+    def get_position(self):
+        """(再生中のクリップ, 再生開始からの秒数) を返します。再生していなければ (None, 0.0) です。"""
+        with self._cond:
+            clip = self.current_clip
+            start = self.current_start
+        if clip is None:
+            return None, 0.0
+        return clip, max(0.0, time.monotonic() - start)
+    
+    def close(self):
+        self.stop()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+    
+    def _set_active(self, active):
+        # self._condを持った状態で呼ぶ
+        if self.active != active:
+            self.active = active
+            if self.on_state_change:
+                self.on_state_change(active)
+            self._cond.notify_all()
+    
+    def _run(self):
+        try:
+            self._open()
+        except Exception as e:
+            add_log(f"音声出力の初期化エラー: {e}")
             return
         
-        # 再生中フラグをセット
-        is_playing_audio = True
-            
-        # aplayコマンドを使用して音声を再生
+        period_bytes = AUDIO_PERIOD_FRAMES * AUDIO_CHANNELS * AUDIO_SAMPLE_WIDTH
+        period_sec = AUDIO_PERIOD_FRAMES / AUDIO_SAMPLE_RATE
+        try:
+            while True:
+                with self._cond:
+                    # 次のクリップを待つ。無ければ書き込んだ分が鳴り終わってから停止状態にする
+                    while not self._clips and not self._closed:
+                        remaining = self._play_end - time.monotonic() if self.realtime else 0
+                        if remaining > 0:
+                            self._cond.wait(remaining)
+                            continue
+                        self.current_clip = None
+                        self._set_active(False)
+                        self._cond.wait()
+                    if self._closed:
+                        break
+                    clip = self._clips.popleft()
+                    generation = self._generation
+                    self._set_active(True)
+                
+                completed = True
+                started = False
+                for offset in range(0, len(clip.pcm), period_bytes):
+                    now = time.monotonic()
+                    with self._cond:
+                        if self.realtime:
+                            # 実時間よりAUDIO_MAX_AHEAD_SEC以上先行しないよう待つ（stop()で起こされる）
+                            ahead = self._play_end - now - AUDIO_MAX_AHEAD_SEC
+                            if ahead > 0:
+                                self._cond.wait(ahead)
+                        if self._generation != generation or self._closed:
+                            completed = False
+                            break
+                        start = max(self._play_end, time.monotonic())
+                        if not started:
+                            self.current_clip = clip
+                            self.current_start = start
+                        data = clip.pcm[offset:offset + period_bytes]
+                        self._play_end = start + len(data) / period_bytes * period_sec
+                    if not started:
+                        started = True
+                        if clip.on_start:
+                            clip.on_start(clip, start)
+                    self._write(data)
+                
+                if clip.on_finish:
+                    clip.on_finish(clip, completed)
+        finally:
+            with self._cond:
+                self.current_clip = None
+                self._set_active(False)
+            self._close()
+    
+    # サブクラスで実装
+    def _open(self):
+        pass
+    
+    def _write(self, data):
+        raise NotImplementedError
+    
+    def _discard(self):
+        pass
+    
+    def _close(self):
+        pass
+
+# ALSAに直接書き込む出力先
+class AlsaAudioSink(AudioSink):
+    def _open(self):
+        self._pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, device=AUDIO_ALSA_DEVICE,
+                                  channels=AUDIO_CHANNELS, rate=AUDIO_SAMPLE_RATE,
+                                  format=alsaaudio.PCM_FORMAT_S16_LE,
+                                  periodsize=AUDIO_PERIOD_FRAMES)
+    
+    def _write(self, data):
+        self._pcm.write(data)
+    
+    def _discard(self):
+        # デバイスのバッファに残っている音も捨てる（古いpyalsaaudioには無い）
+        drop = getattr(self._pcm, "drop", None)
+        if drop:
+            drop()
+    
+    def _close(self):
+        self._pcm.close()
+
+# 常駐させたaplayにパイプで流し込む出力先（pyalsaaudioが無い場合）
+class AplayAudioSink(AudioSink):
+    def _open(self):
+        self._process = subprocess.Popen(
+            ["aplay", "-q", "-D", AUDIO_ALSA_DEVICE, "-t", "raw", "-f", "S16_LE",
+             "-r", str(AUDIO_SAMPLE_RATE), "-c", str(AUDIO_CHANNELS)],
+            stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    
+    def _write(self, data):
+        process = self._process
+        try:
+            process.stdin.write(data)
+            process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # _discard()で止めたaplayに書いていた分は捨てる
+    
+    def _discard(self):
+        # パイプとaplayのバッファに残っている音も捨てるため、aplayを起動し直す
+        old = getattr(self, "_process", None)
+        if old is None:
+            return
+        self._open()
+        old.kill()
+        try:
+            old.stdin.close()
+        except OSError:
+            pass
+        old.wait(timeout=1.0)
+    
+    def _close(self):
+        self._process.stdin.close()
+        self._process.wait(timeout=1.0)
+
+# 何も鳴らさない出力先（ハードウェア無しでのテスト用）
+class NullAudioSink(AudioSink):
+    def _open(self):
+        self.bytes_written = 0
+    
+    def _write(self, data):
+        self.bytes_written += len(data)
+
+# WAVファイルに書き出す出力先（ハードウェア無しでのテスト用）
+class FileAudioSink(AudioSink):
+    def __init__(self, path, realtime=False, on_state_change=None):
+        self.path = path
+        super().__init__(realtime=realtime, on_state_change=on_state_change)
+    
+    def _open(self):
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(AUDIO_CHANNELS)
+        self._wav.setsampwidth(AUDIO_SAMPLE_WIDTH)
+        self._wav.setframerate(AUDIO_SAMPLE_RATE)
+    
+    def _write(self, data):
+        self._wav.writeframesraw(data)
+    
+    def _close(self):
+        self._wav.close()
+
+# 設定に合わせて音声出力先を作る
+def create_audio_sink(spec=None, on_state_change=None):
+    """AUDIO_SINKの指定（auto, alsa, aplay, null, file:<パス>）に合わせてAudioSinkを作ります。"""
+    spec = spec or AUDIO_SINK
+    if spec == "auto":
+        if alsaaudio is not None:
+            spec = "alsa"
+        elif shutil.which("aplay"):
+            spec = "aplay"
+        else:
+            spec = "null"
+    
+    if spec == "alsa":
+        return AlsaAudioSink(on_state_change=on_state_change)
+    if spec == "aplay":
+        return AplayAudioSink(on_state_change=on_state_change)
+    if spec == "null":
+        return NullAudioSink(on_state_change=on_state_change)
+    if spec.startswith("file:"):
+        return FileAudioSink(spec[len("file:"):], on_state_change=on_state_change)
+    raise ValueError(f"不明な音声出力先です: {spec}")
+
+# 音声出力の状態変化（AudioSinkのスレッドから呼ばれる）
+def on_audio_sink_state(active):
+    state.update(is_playing_audio=active)
+
+# 再生中・再生待ちの音声をすべて止める
+def stop_audio():
+    """再生キューを空にし、再生中の音声をすぐに止めます。"""
+    while True:
+        try:
+            audio_queue.get_nowait()
+            audio_queue.task_done()
+        except queue.Empty:
+            break
+    if audio_sink:
+        audio_sink.stop()
+
+# クリップが鳴り始めた時（AudioSinkのスレッドから呼ばれる）
+def on_clip_start(clip, start):
+    if startup:
+        first_voice = startup.mark("最初の発話")
+        if first_voice is not None:
+            add_log(f"起動から最初の発話まで {first_voice:.2f}秒")
+    playback_delay_span.observe(max(0.0, start - clip.enqueued_at))
+    playback_span.observe(clip.duration)
+    start_lipsync(clip, start)
+
+# 再生開始に合わせてLEDを音量に追従させる
+def start_lipsync(clip, start):
+    if clip.envelope is None:
+        return
+    frame_sec, levels = clip.envelope
+    color = EMOTION_LED_COLORS.get(state.emotion_state, EMOTION_LED_COLORS["normal"])
+    hw.led_engine.post(Envelope(color, levels, frame_sec, LED_LIPSYNC_MIN_LEVEL), start=start)
+
+# 音声再生関数（修正版）
+def play_audio(audio):
+    """音声ファイル（またはPCMのbytes、ComposedAudio）を出力先の再生キューに積みます。
+    
+    積めた時はTrue、積めなかった時（ファイルが読めないなど）はFalseを返します。
+    """
+    try:
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio_sink.enqueue(audio, label="pcm", on_start=on_clip_start)
+            return True
+        
+        if isinstance(audio, ComposedAudio):
+            add_log(f"音声再生（組み立て）: {audio.label[:20]}...")
+            audio_sink.enqueue(audio.pcm, label=audio.label,
+                               on_start=on_clip_start, envelope=audio.envelope)
+            return True
+        
+        # ファイルの有無は確かめない（キャッシュの索引にあるものだけが渡される）
+        audio_file = audio
+        try:
+            pcm = load_wav_pcm(audio_file)
+        except (OSError, ValueError, struct.error) as e:
+            # 索引にあるのにファイルが消えた・壊れている場合は索引から外す
+            add_log(f"音声ファイルを再生できません: {audio_file} ({e})")
+            audio_cache.remove_path(audio_file)
+            return False
+        
+        # メモリマップしたPCMをそのまま出力先に渡す（前の音声に隙間なく続く）
         add_log(f"音声再生: {os.path.basename(audio_file)}")
-        os.system(f"aplay {audio_file}")
+        audio_sink.enqueue(pcm, label=os.path.basename(audio_file),
+                           on_start=on_clip_start, envelope=audio_cache.get_envelope(audio_file))
+        return True
     except Exception as e:
         add_log(f"音声再生エラー: {e}")
-    finally:
-        # 再生完了後にフラグをリセット
-        is_playing_audio = False
+        return False
 
 # 音声再生スレッド（修正版）
 def audio_player_thread():
-    global is_playing_audio
+    global audio_sink
+    
+    if audio_sink is None:
+        audio_sink = create_audio_sink(on_state_change=on_audio_sink_state)
     
     while True:
-        audio_file = audio_queue.get()
-        if audio_file is None:
+        audio = audio_queue.get()
+        if audio is None:
+            audio_queue.task_done()
             continue
         
+        played = False
         try:
-            # 音声再生フラグをセット
-            is_playing_audio = True
-            
-            # 音声再生
-            add_log(f"再生中: {os.path.basename(audio_file)}")
-            play_audio(audio_file)
+            # 再生キューに積むだけなので、次の断片もすぐに受け取れる
+            if isinstance(audio, str):
+                add_log(f"再生中: {os.path.basename(audio)}")
+            played = play_audio(audio)
                 
         except Exception as e:
             add_log(f"音声再生エラー: {e}")
         
         finally:
-            # 再生完了後にフラグをリセット
-            is_playing_audio = False
             audio_queue.task_done()
+            if not played:
+                # 再生が始まらないと playback_done が来ないので、ここで知らせる
+                event_loop.post("playback_done")
+
+# 音声合成ジョブ
+class SynthesisJob:
+    """合成キューに積まれる1発話分のジョブ。cancel()で破棄できます。"""
+    
+    def __init__(self, text, kind, voice=DEFAULT_VOICE):
+        self.text = text
+        self.kind = kind  # "greeting", "news", "question", "idle"
+        self.voice = voice  # 声（VoiceSpec）
+        self.audio_file = None
+        self.done = threading.Event()  # 合成（または破棄）が終わったらセット
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """ジョブを破棄します。合成前なら合成せず、合成後なら再生しません。"""
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+# 音声合成をキューに積む（すぐに戻る）
+def request_voice(text, kind, voice=None):
+    """テキストを合成キューに積み、キャンセル用のジョブを返します。
+    
+    voice を省略するとテキストの感情に合った声で読み上げます。
+    """
+    if voice is None:
+        voice = voice_for_text(text)
+    job = SynthesisJob(text, kind, voice)
+    with synth_jobs_lock:
+        pending_synth_jobs.append(job)
+    synth_queue.put(job)
+    return job
+
+# 合成待ちジョブの破棄
+def cancel_pending_voices(keep_kinds=("idle",)):
+    """keep_kinds以外の合成待ち・合成中のジョブを破棄し、破棄した件数を返します。"""
+    with synth_jobs_lock:
+        jobs = [job for job in pending_synth_jobs
+                if job.kind not in keep_kinds and not job.cancelled]
+    for job in jobs:
+        job.cancel()
+    return len(jobs)
+
+# 音声の合成待ち・再生待ち・再生中のいずれかがあるか
+def is_voice_busy():
+    with synth_jobs_lock:
+        has_pending_jobs = bool(pending_synth_jobs)
+    return has_pending_jobs or state.is_playing_audio or audio_queue.unfinished_tasks > 0
+
+# 合成ジョブを1つ処理する
+def process_synthesis_job(job):
+    """ジョブの音声を生成し、断片ができるたびに再生キューに渡します。"""
+    try:
+        if job.cancelled:
+            add_log(f"合成を破棄: {job.text[:20]}...")
+            return
+        
+        # 断片ができるたびに再生キューへ渡す
+        for audio_file in generate_voice_stream(job.text, job.voice, lambda: job.cancelled):
+            if audio_file is None:
+                add_log(f"音声の生成に失敗しました: {job.text[:20]}...")
+                continue
+            
+            # 合成中に相手がいなくなった場合は残りも含めて再生しない
+            if job.cancelled:
+                add_log(f"再生を破棄: {job.text[:20]}...")
+                break
+            
+            if job.audio_file is None:
+                job.audio_file = audio_file  # 最初の断片
+            audio_queue.put(audio_file)
+    except Exception as e:
+        add_log(f"音声合成スレッドエラー: {e}")
+    finally:
+        with synth_jobs_lock:
+            pending_synth_jobs.remove(job)
+        job.done.set()
+        synth_queue.task_done()
+        event_loop.post("synthesis_done", job)
+
+# 音声合成スレッド
+def synthesis_worker_thread():
+    """合成キューからジョブを取り出して音声を生成し、再生キューに渡します。"""
+    while True:
+        process_synthesis_job(synth_queue.get())
+
+# 距離の測定値を処理する（距離測定スレッドから呼ばれる）
+def on_distance_reading(distance, measured_at):
+    """測定値をフィルタと在室状態に通し、状態が変わった時だけイベントループに知らせます。"""
+    with distance_reading_span.time():
+        filtered_distance, velocity = distance_filter.update(distance, measured_at)
+        state.update(current_distance=filtered_distance)
+        events = presence.update(filtered_distance, velocity, measured_at)
+    for event in events:
+        event_loop.post("presence", event)
+
+# 在室状態の変化に反応する
+def handle_presence_event(event):
+    """PresenceTrackerが出した状態変化イベントを処理します。"""
+    global cancel_voices_timer
+    add_log(f"在室状態: {event.previous} → {event.state} "
+            f"({event.distance:.0f}cm, {event.motion})")
+    
+    if event.state == "absent":
+        # 立ち去った状態が続いたら、その人向けの合成待ちジョブを破棄する
+        cancel_voices_timer = event_loop.call_later(SYNTH_CANCEL_AFTER_SEC, cancel_visitor_voices)
+        schedule_idle_talk()
+    else:
+        if cancel_voices_timer:
+            cancel_voices_timer.cancel()
+            cancel_voices_timer = None
+        if idle_timer:
+            idle_timer.cancel()
+    schedule_interaction()
+
+# 立ち去った人向けの合成待ちと再生中の音声を破棄
+def cancel_visitor_voices():
+    cancelled = cancel_pending_voices()
+    if cancelled:
+        add_log(f"人がいなくなったので合成待ち {cancelled}件を破棄")
+    # 独り言は立ち去ってから IDLE_TALK_INTERVAL_SEC 後なので、今鳴っているのはその人向けの音声
+    if state.is_playing_audio or audio_queue.unfinished_tasks > 0:
+        add_log("人がいなくなったので再生を停止")
+        stop_audio()
+
+# 在室状態から次の対話の種類と、それを始められる時刻を決める
+def next_interaction(state):
+    """(対話の種類, 開始できる時刻) を返します。人がいなければ (None, None) です。"""
+    if state == "absent":
+        return None, None
+    
+    # 優先順（挨拶 → ニュース → 質問）に、クールダウンが明けているものを選ぶ
+    candidates = [("greeting", GREETING_COOLDOWN_SEC)]
+    if state in ("near", "close"):
+        candidates.append(("news", NEWS_COOLDOWN_SEC))
+    if state == "close":
+        candidates.append(("question", QUESTION_COOLDOWN_SEC))
+    
+    now = event_loop.clock()
+    for kind, cooldown in candidates:
+        if now - last_interaction_time >= cooldown:
+            return kind, now
+    # どれもまだなら、一番早く明けるものの時刻
+    kind, cooldown = min(candidates, key=lambda candidate: candidate[1])
+    return kind, last_interaction_time + cooldown
+
+# 次の対話をスケジュール
+def schedule_interaction():
+    """在室状態に応じて、今すぐ対話を始めるか、クールダウンが明ける時刻にタイマーを掛けます。"""
+    global interaction_timer
+    if interaction_timer:
+        interaction_timer.cancel()
+        interaction_timer = None
+    
+    # 合成待ち・再生中なら、終わった時のイベントで改めて呼ばれる
+    if is_voice_busy():
+        return
+    
+    kind, start_at = next_interaction(presence.state)
+    if kind is None:
+        return
+    if start_at > event_loop.clock():
+        interaction_timer = event_loop.call_at(start_at, schedule_interaction)
+        return
+    start_interaction(kind)
+
+# 対話を始める
+def start_interaction(kind):
+    """種類に合った発話を作って合成スレッドに依頼します。"""
+    global last_interaction_time
+    
+    voice = None  # 省略するとテキストの感情に合った声
+    if kind == "greeting":
+        # 挨拶メッセージと時刻表示
+        greeting = greeting_on_approach()
+        message = f"{greeting}"
+        add_log(f"挨拶: {message}")
+    elif kind == "news":
+        # ニュース話題（見出しの感情で表情と声を決める）
+        message, emotion = get_random_news_topic()
+        add_log(f"ニュース提供: {message}")
+        set_emotion_led(emotion)
+        voice = voice_for_emotion(emotion)
+    else:
+        # ランダムな話題と質問
+        question = generate_random_question()
+        add_log(f"質問: {question}")
+        
+        # 応答生成
+        message = generate_response(question)
+        add_log(f"応答: {message}")
+    
+    # 音声生成と再生（合成スレッドに依頼）
+    request_voice(message, kind, voice)
+    interaction_counters[kind].inc()
+    last_interaction_time = event_loop.clock()
+    schedule_idle_talk()
+
+# 再生状態が変わった時（状態の購読者として呼ばれる）
+def on_playing_audio_changed(changes, snapshot):
+    if not changes["is_playing_audio"]:
+        event_loop.post("playback_done")
+
+# 合成・再生が終わった時
+def handle_voice_done(_):
+    if not is_voice_busy():
+        schedule_interaction()
+
+# 独り言のタイマーを掛け直す
+def schedule_idle_talk():
+    global idle_timer
+    if idle_timer:
+        idle_timer.cancel()
+    idle_timer = event_loop.call_later(IDLE_TALK_INTERVAL_SEC, idle_talk)
+
+# 人がいない時の独り言
+def idle_talk():
+    global idle_timer
+    idle_timer = None
+    if presence.state != "absent":
+        return
+    if is_voice_busy():
+        schedule_idle_talk()
+        return
+    idle_topic = get_idle_topic()
+    add_log(f"独り言: {idle_topic}")
+    
+    # 音声生成と再生（合成スレッドに依頼）
+    request_voice(idle_topic, "idle")
+    interaction_counters["idle"].inc()
+    schedule_idle_talk()
+
+# テキストの感情を推測
+def detect_emotion(text):
+    """テキストから感情（normal, happy, angry, sad, surprised）を推測します。"""
+    return emotion_classifier.classify(text)[0]
+
+# ニュースの見出しの感情
+def score_headline(article):
+    """記事を取り込む時に見出しの感情を判定し、記事に加える項目を返します。"""
+    emotion, scores = emotion_classifier.classify(article.get("title", ""))
+    return {"emotion": emotion, "emotion_score": scores.get(emotion, 0.0)}
+
+# 感情の語彙が変わっていたら読み直す
+def reload_emotion_lexicon():
+    try:
+        if emotion_classifier.maybe_reload():
+            # 見出しの感情も新しい語彙で付け直す
+            news_store.reannotate()
+            state.update(news_data=tuple(news_store.recent(NEWS_ACTIVE_ARTICLES)))
+    finally:
+        event_loop.call_later(EMOTION_LEXICON_CHECK_SEC, reload_emotion_lexicon)
 
 # 感情分析
 def analyze_emotion(text):
     """テキストから感情を推測して、LEDの色を変更します。"""
     try:
-        # 簡易的な感情分析（キーワードベース）
-        if any(word in text for word in ["嬉しい", "楽しい", "やったー", "！！", "わーい"]):
-            set_emotion_led("happy")
-        elif any(word in text for word in ["怒", "むかっ", "許さない", "ひどい"]):
-            set_emotion_led("angry")
-        elif any(word in text for word in ["悲しい", "さみしい", "泣", "つらい"]):
-            set_emotion_led("sad")
-        elif any(word in text for word in ["びっくり", "えっ", "まさか", "驚"]):
-            set_emotion_led("surprised")
-        else:
-            set_emotion_led("normal")
+        emotion, scores = emotion_classifier.classify(text)
+        if scores:
+            add_log(f"感情: {emotion} ({', '.join(f'{name} {score:.1f}' for name, score in scores.items())})")
+        set_emotion_led(emotion)
     except Exception as e:
         add_log(f"感情分析エラー: {e}")
         set_emotion_led("normal")
 
-# NewsData.io APIクライアントの実装
-class NewsDataClient:
-    def __init__(self, api_key):
-        self.api_key = api_key
-        self.cache_file = NEWS_CACHE_FILE
-        
-    def get_latest_news(self, country: str = "jp", category: str = "top", limit: int = 10):
-        """
-        指定した国とカテゴリの最新ニュースを取得
-        
-        Args:
-            country (str): 国コード (例: jp, us, gb)
-            category (str): カテゴリ (例: top, business, technology)
-            limit (int): 取得するニュースの数
-            
-        Returns:
-            Dict[str, Any]: API応答データ
-        """
-        url = f"{BASE_URL}/latest"
-        params = {
-            "country": country,
-            "category": category,
-            "apikey": self.api_key
-        }
-        
-        try:
-            add_log("NewsData.io APIからニュース取得中...")
-            response = requests.get(url, params=params)
-            if response.ok:
-                data = response.json()
-                if data.get("status") == "success" and "results" in data:
-                    # 記事数をlimitに制限
-                    if len(data["results"]) > limit:
-                        data["results"] = data["results"][:limit]
-                    return data
-                else:
-                    add_log(f"ニュース取得エラー: API応答が正しくありません")
-                    return None
-            else:
-                add_log(f"ニュース取得エラー: ステータスコード {response.status_code}")
-                return None
-        except Exception as e:
-            add_log(f"ニュース取得エラー: {e}")
-            return None
-    
-    def load_cached_news(self):
-        """キャッシュからニュースを読み込む"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    # キャッシュの有効期限をチェック (1日)
-                    cache_time = datetime.datetime.fromisoformat(cache_data.get('timestamp', ''))
-                    if datetime.datetime.now() - cache_time < datetime.timedelta(days=1):
-                        return cache_data.get('results', [])
-            except Exception as e:
-                add_log(f"キャッシュ読み込みエラー: {e}")
-        return None
-    
-    def save_to_cache(self, results):
-        """ニュースをキャッシュに保存"""
-        try:
-            cache_data = {
-                'timestamp': datetime.datetime.now().isoformat(),
-                'results': results
-            }
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-            add_log(f"ニュースキャッシュ更新: {len(results)}件")
-        except Exception as e:
-            add_log(f"キャッシュ保存エラー: {e}")
+# 以前のニュースキャッシュ（news_cache.json）を保存先へ移す
+def migrate_news_cache():
+    """保存先がまだ無く、以前のキャッシュがあれば、その記事と取得時刻を保存先へ移します。"""
+    if os.path.exists(NEWS_STORE_FILE) or not os.path.exists(NEWS_CACHE_FILE):
+        return
+    try:
+        with open(NEWS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+        cache_time = datetime.datetime.fromisoformat(cache_data.get('timestamp', ''))
+        news_store.merge(cache_data.get('results', []))
+        os.utime(NEWS_STORE_FILE, (cache_time.timestamp(), cache_time.timestamp()))
+        add_log(f"ニュースキャッシュを {NEWS_STORE_FILE} へ移しました")
+    except Exception as e:
+        add_log(f"キャッシュ読み込みエラー: {e}")
 
 # ニュース取得関数の修正
 def fetch_news():
-    """NewsData.io APIからニュースを取得します。キャッシュがある場合はそれを使用します。"""
-    global news_data, last_news_update, news_client
+    """NewsData.io APIからニュースを1回取得し、成功したら記事を差し替えます（更新スレッドから呼ばれます）。"""
+    with news_fetch_span.time():
+        return _fetch_news()
+
+def _fetch_news():
+    global news_client
     
-    # NewsAPIクライアントが初期化されていない場合は初期化
+    # NewsAPIクライアントが初期化されていない場合は初期化（接続はセッションで使い回す）
     if news_client is None:
-        news_client = NewsDataClient(NEWS_API_KEY)
-    
-    # キャッシュからニュースを取得
-    cached_news = news_client.load_cached_news()
-    if cached_news:
-        add_log(f"キャッシュからニュース取得: {len(cached_news)}件")
-        news_data = cached_news
-        last_news_update = datetime.datetime.now()
-        return True
+        news_client = NewsDataClient(NEWS_API_KEY, BASE_URL, log=add_log)
     
-    # キャッシュがない場合はAPIからニュースを取得
     add_log("APIからニュース取得中...")
     result = news_client.get_latest_news(country="jp", category="top", limit=10)
     
+    if result == NewsDataClient.NOT_MODIFIED:
+        add_log("ニュースに変更なし")
+        news_store.touch()
+        return True
     if result and 'results' in result:
-        news_data = result['results']
-        news_client.save_to_cache(news_data)
-        last_news_update = datetime.datetime.now()
-        add_log(f"APIからニュース取得完了: {len(news_data)}件")
+        # 新しい記事だけを保存先に追記する
+        added = news_store.merge(result['results'])
+        # 取得が終わってから丸ごと差し替えるので、話している途中のニュースは変わらない
+        state.update(news_data=tuple(news_store.recent(NEWS_ACTIVE_ARTICLES)))
+        add_log(f"APIからニュース取得完了: {len(result['results'])}件（新着 {added}件）")
         return True
     else:
         add_log("ニュース取得失敗")
         return False
 
+# キャッシュのニュースを使い始め、裏で定期的に取り直す
+def start_news():
+    """キャッシュがあればすぐに使い、古くなる時刻（無ければ今すぐ）から更新スレッドで取り直します。"""
+    global news_refresher
+    migrate_news_cache()
+    delay = 0.0
+    if news_store.load():
+        updated = news_store.last_updated()
+        age = time.time() - updated
+        cached_news = news_store.recent(NEWS_ACTIVE_ARTICLES)
+        add_log(f"保存先からニュース取得: {len(cached_news)}件（{age / 3600:.1f}時間前）")
+        state.update(news_data=tuple(cached_news))
+        delay = max(0.0, NEWS_REFRESH_INTERVAL_SEC - age)
+    
+    news_refresher = NewsRefresher(lambda: fetch_news(), NEWS_REFRESH_INTERVAL_SEC,
+                                   NEWS_RETRY_BASE_SEC, NEWS_RETRY_MAX_SEC, log=add_log)
+    news_refresher.start(delay)
+
 # ランダムニュースの話題提供関数の修正
 def get_random_news_topic():
-    """取得したニュースからランダムに一つ選び、トピックとして返します。"""
-    global news_data
-    
-    # ニュースデータが空か1日以上経過していたら更新
-    if not news_data or (datetime.datetime.now() - last_news_update).days >= 1:
-        success = fetch_news()
-        if not success:
-            return "ニュースの取得に失敗したのだ。ごめんなさいなのだ。"
+    """取得したニュースからランダムに一つ選び、(トピック, 見出しの感情) を返します。"""
+    # 取得は更新スレッドに任せ、ここでは待たずに今あるニュースを使う
+    news_data = state.news_data
+    if not news_data and news_refresher:
+        news_refresher.refresh_now()
+        if news_refresher.failures:
+            return NEWS_FETCH_FAILED_MESSAGE, detect_emotion(NEWS_FETCH_FAILED_MESSAGE)
     
     if news_data:
         article = random.choice(news_data)
@@ -410,50 +2034,28 @@ def get_random_news_topic():
         # タイトルが短すぎる場合はエラーメッセージ
         if len(title) <= 5:
             add_log(f"ニュース: タイトルが短すぎます ({title})")
-            return "ニュースのタイトルが不適切なのだ。別のニュースを探すのだ。"
+            return NEWS_BAD_TITLE_MESSAGE, detect_emotion(NEWS_BAD_TITLE_MESSAGE)
             
         # ログにニュースタイトルを表示
         add_log(f"選択したニュース: {title}")
-        return f"最近のニュースで「{title}」というのがあるのだ。これについてどう思うのだ？"
+        return NEWS_TOPIC_TEMPLATE.format(title=title), article.get("emotion", "normal")
     
-    return "最近のニュース情報がないのだ。また後で試してみるのだ。"
+    return NEWS_EMPTY_MESSAGE, detect_emotion(NEWS_EMPTY_MESSAGE)
 
 # アイドル時の話題提供
 def get_idle_topic():
     """アイドル状態（人がいない時）の話題をランダムに提供します。"""
-    topics = [
-        "今日の天気はどうかな？",
-        "何か面白いことがあったのだ？",
-        "ボクはずんだもちが大好きなのだ！",
-        "プログラミング楽しいのだ！",
-        "何か質問があれば言ってほしいのだ",
-    ]
-    
-    return random.choice(topics)
+    return random.choice(IDLE_TOPICS)
 
 # ランダム質問生成
 def generate_random_question():
     """ランダムな質問を生成します。"""
-    questions = [
-        "あなたは何が好きなのだ？",
-        "今日はどんな日だったのだ？",
-        "何か面白いことがあったのかな？",
-        "好きな食べ物は何なのだ？",
-        "ボクのこと、どう思うのだ？"
-    ]
-    return random.choice(questions)
+    return random.choice(RANDOM_QUESTIONS)
 
 # 人が接近したときの挨拶
 def greeting_on_approach():
     """人が接近したときに使用する挨拶文をランダムに返します。"""
-    greetings = [
-        "こんにちはなのだ！ボクはずんだもんなのだ！",
-        "わーい！お客さんが来たのだ！",
-        "いらっしゃいなのだ！何かお手伝いできることはあるのだ？",
-        "こんにちはなのだ！今日はいい天気なのだ！",
-        "ずんだもんだよ！よろしくなのだ！"
-    ]
-    return random.choice(greetings)
+    return random.choice(GREETINGS)
 
 # 現在時刻表示
 def display_current_time():
@@ -466,59 +2068,76 @@ def generate_response(prompt):
     """ずんだもんの応答を生成します。"""
     # 実際のプロジェクトではOpenAI APIを使用するが、
     # このリファクタリングでは簡易版を実装
-    responses = [
-        f"うん、それは面白いのだ！{prompt}について考えてみたのだ",
-        f"{prompt}? なるほどなのだ！ボクはずんだもんなのだ",
-        f"ボクは{prompt}が好きなのだ！",
-        f"{prompt}についてはよく分からないのだ…",
-        f"わーい！{prompt}について話せて嬉しいのだ！"
-    ]
-    response = random.choice(responses)
+    response = random.choice(RESPONSE_TEMPLATES).format(prompt=prompt)
     # 感情を分析して表現する
     analyze_emotion(response)
     return response
 
 # 時刻表示関数の更新（update_gui関数内）
 def update_gui():
-    """GUIを更新する関数"""
-    global current_distance
+    """GUIを更新する関数（表示内容が変わったウィジェットだけ更新します）"""
+    started = gui_frame_stats.start()
+    snapshot = state.snapshot()
     
-    # 現在時刻を更新
+    # 現在時刻を更新（日付は1日1回、時刻は1分に1回しか変わらない）
     now = datetime.datetime.now()
-    time_str = now.strftime("%H:%M")  # 時:分
-    date_str = now.strftime("%Y-%m-%d")  # 年-月-日
-    
     if time_label:
-        # HTML形式で時刻部分を大きくする
-        time_label.config(
-            text=f"現在時刻: {date_str} ",
-            font=("Helvetica", 18),
-            compound=tk.LEFT
-        )
-        
-        # 時刻を別ラベルで大きく表示
-        if not hasattr(time_label, 'time_only_label'):
-            time_label.time_only_label = tk.Label(
-                time_label.master,
-                font=("Helvetica", 200 ),
-                fg="#000000"
-            )
-            time_label.time_only_label.pack(side=tk.LEFT, padx=0)
-        
-        time_label.time_only_label.config(text=time_str)
+        widget_updater.set(time_label, text=f"現在時刻: {now.strftime('%Y-%m-%d')} ")
+    if clock_label:
+        widget_updater.set(clock_label, text=now.strftime("%H:%M"))
     
     # 距離を更新
     if distance_label:
-        distance_label.config(text=f"距離: {current_distance:.1f} cm")
+        widget_updater.set(distance_label, text=f"距離: {snapshot.current_distance:.1f} cm")
+    gui_frame_stats.end(started, "clock")
     
     # 次の更新をスケジュール
     if gui_root:
         gui_root.after(1000, update_gui)
 
+# GUIの1フレームの時間を計測に記録
+def observe_gui_frame(name, elapsed):
+    gui_frame_spans[name].observe(elapsed)
+
+# 音声の再生位置から口の形を決める
+def get_mouth_shape():
+    """再生中なら再生位置の音量（包絡線）に合わせて "open" か "closed" を返します。
+    
+    包絡線が無い音声では、再生開始からの秒数に合わせて交互に返します。
+    """
+    if audio_sink is None:
+        return "closed"
+    clip, position = audio_sink.get_position()
+    if clip is None:
+        return "closed"
+    if clip.envelope is not None:
+        frame_sec, levels = clip.envelope
+        index = int(position / frame_sec)
+        return "open" if index < len(levels) and levels[index] >= SPRITE_MOUTH_OPEN_LEVEL else "closed"
+    return "open" if int(position / SPRITE_MOUTH_PERIOD_SEC) % 2 == 0 else "closed"
+
+# キャラクター画像の更新（GUIスレッドで定期的に呼ばれる）
+def update_sprite():
+    """感情と口の形に合わせてキャラクター画像を切り替えます（アトラスから選ぶだけです）。"""
+    if sprite_atlas and character_label:
+        started = gui_frame_stats.start()
+        image = sprite_atlas.get(state.emotion_state, get_mouth_shape())
+        widget_updater.set(character_label, image=image)
+        gui_frame_stats.end(started, "sprite")
+    
+    # 再生中は口パクのために細かく、それ以外は表情の変化に気付ける程度に更新する
+    if gui_root and sprite_atlas:
+        fps = SPRITE_FPS if audio_sink is not None and audio_sink.active else SPRITE_IDLE_FPS
+        gui_root.after(int(1000 / fps), update_sprite)
+
 # GUIを作成する関数
 def create_gui():
     """GUIウィンドウを作成します。"""
-    global gui_root, distance_label, time_label, log_text, character_label
+    global gui_root, distance_label, time_label, clock_label, log_text, character_label, gui_frame_stats
+    global sprite_atlas
+    
+    gui_frame_stats = FrameStats(report=add_log, report_interval=GUI_FRAME_REPORT_SEC,
+                                 observe=observe_gui_frame)
     
     # ウィンドウ作成
     gui_root = tk.Tk()
@@ -532,9 +2151,11 @@ def create_gui():
     top_frame = tk.Frame(gui_root)
     top_frame.pack(fill=tk.X, padx=10, pady=10)
     
-    # 現在時刻ラベル
-    time_label = tk.Label(top_frame, text="現在時刻: -", font=("Helvetica", 72))
+    # 現在時刻ラベル（日付）と、時:分を大きく表示するラベル
+    time_label = tk.Label(top_frame, text="現在時刻: -", font=("Helvetica", 18), compound=tk.LEFT)
     time_label.pack(side=tk.LEFT, padx=5)
+    clock_label = tk.Label(top_frame, font=("Helvetica", 200), fg="#000000")
+    clock_label.pack(side=tk.LEFT, padx=0)
     
     # 距離ラベル
     distance_label = tk.Label(top_frame, text="距離: - cm", font=("Helvetica", 14))
@@ -544,51 +2165,20 @@ def create_gui():
     character_frame = tk.Frame(gui_root, bg="#F0F0F0", height=300)
     character_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
     
-    # ずんだもん画像の読み込みと表示
+    # ずんだもん画像の読み込みと表示（全ての表情と口パクの画像を縮小・デコードしておく）
     try:
-        zundamon_image = Image.open("./pic_zunda/zunda_normal.png")
-
-        # フレームサイズを取得
         character_frame.update_idletasks()
-        frame_width = character_frame.winfo_width()
-        frame_height = character_frame.winfo_height()
-        
-        # 画像のサイズ取得と縦横比の計算
-        img_width, img_height = zundamon_image.size
-        aspect_ratio = img_width / img_height
-        
-        # 最低限のサイズを設定（小さい解像度の場合は引き伸ばす）
-        min_width = max(int(frame_width * 0.6), img_width)  # intに変換
-        min_height = max(int(frame_height * 0.6), img_height)  # intに変換
-        
-        # アスペクト比を維持しながら、必要なサイズまで引き伸ばす
-        if min_width / min_height > aspect_ratio:
-            # 高さを基準に幅を計算
-            new_height = min_height
-            new_width = int(new_height * aspect_ratio)
-        else:
-            # 幅を基準に高さを計算
-            new_width = min_width
-            new_height = int(new_width / aspect_ratio)
-        
-        # フレームに収める（大きすぎる場合は縮小）
-        if new_width > frame_width:
-            new_width = int(frame_width)  # intに明示的に変換
-            new_height = int(new_width / aspect_ratio)
-        
-        if new_height > frame_height:
-            new_height = int(frame_height)  # intに明示的に変換
-            new_width = int(new_height * aspect_ratio)
-        
-        # リサイズ
-        zundamon_image = zundamon_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        zundamon_photo = ImageTk.PhotoImage(zundamon_image)
-        character_label = tk.Label(character_frame, image=zundamon_photo, bg="#F0F0F0")
-        character_label.image = zundamon_photo  # 参照を保持
+        frame_size = (character_frame.winfo_width(), character_frame.winfo_height())
+        started = time.perf_counter()
+        sprite_atlas = SpriteAtlas(SPRITE_DIR, lambda path: tk.PhotoImage(file=path),
+                                   SPRITE_ATLAS_MAX_BYTES).load(frame_size)
+        add_log(f"{sprite_atlas.summary()} 読み込み{(time.perf_counter() - started) * 1000:.0f}ms")
+        character_label = tk.Label(character_frame, bg="#F0F0F0")
+        widget_updater.set(character_label, image=sprite_atlas.get("normal"))
         character_label.pack(expand=True)
     except Exception as e:
         # 画像が読み込めない場合はテキスト表示にフォールバック
+        sprite_atlas = None
         add_log(f"画像読み込みエラー: {e}")
         character_label = tk.Label(character_frame, text="ずんだもん", font=("Helvetica", 40))
         character_label.pack(expand=True)
@@ -604,140 +2194,171 @@ def create_gui():
     
     # GUI更新開始
     update_gui()
+    update_log_text()
+    update_sprite()
     
     return gui_root
 
 # GUIスレッド
-def run_gui():
-    """GUIスレッドを実行します。"""
-    gui = create_gui()
+def run_gui(ready=None):
+    """GUIスレッドを実行します。ready（Future）があれば、画面を作り終えた時に完了にします。"""
+    try:
+        gui = startup.run("GUI", create_gui) if startup else create_gui()
+    except Exception as e:
+        if ready:
+            ready.set_exception(e)
+        raise
+    if ready:
+        ready.set_result(gui)
     gui.mainloop()
 
+# イベントループに対話の処理を登録
+def register_event_handlers():
+    """在室状態・合成完了・再生完了のイベントと、独り言・計測のまとめ・語彙の確認のタイマーを登録します。"""
+    event_loop.error_handler = lambda e: add_log(f"イベント処理エラー: {e}")
+    event_loop.on("presence", handle_presence_event)
+    event_loop.on("synthesis_done", handle_voice_done)
+    event_loop.on("playback_done", handle_voice_done)
+    state.subscribe(on_playing_audio_changed, fields=["is_playing_audio"])
+    schedule_idle_talk()
+    event_loop.call_later(METRICS_SUMMARY_INTERVAL_SEC, log_metrics_summary)
+    event_loop.call_later(EMOTION_LEXICON_CHECK_SEC, reload_emotion_lexicon)
+
+# 計測のまとめを定期的にログに出す
+def log_metrics_summary():
+    add_log(metrics.REGISTRY.summary())
+    event_loop.call_later(METRICS_SUMMARY_INTERVAL_SEC, log_metrics_summary)
+
+# 距離測定スレッドとLEDアニメーションスレッドの開始
+def start_hardware():
+    hw.ranger.observe = distance_measure_span.observe  # 測定1回ごとの時間を計測に残す
+    hw.ranger.start()
+    hw.led_engine.start()
+
+# VOICEVOX Coreの初期化（辞書の読み込み。時間がかかるので裏で行う）
+def init_voicevox_core():
+    with tts_lock:
+        return get_voicevox_core()
+
+# 既定の話者のモデルを読み込む
+def load_default_voice_model():
+    with tts_lock:
+        voice_pool.acquire(SPEAKER_ID)
+    add_log("VOICEVOX Core 初期化完了")
+    # よく使うスタイルのモデルは裏で先読みする
+    voice_pool.start()
+    voice_pool.prefetch(*VOICE_PRELOAD_STYLES)
+
+# 音声キャッシュの索引を読み込み、定型フレーズをピン留めする
+def load_audio_cache():
+    audio_cache.load()
+    pin_canned_utterances()
+    stats = audio_cache.get_stats()
+    add_log(f"音声キャッシュ: {stats['entries']}件 {stats['bytes'] / 1024 / 1024:.1f}MB")
+
+# 壊れた・途中で切れたWAVを探して削除する（全ファイルのヘッダを読むので裏で行う）
+def validate_audio_cache():
+    purged = audio_cache.validate()
+    if purged:
+        add_log(f"壊れた音声キャッシュを削除: {purged}件")
+    removed = query_cache.load()
+    if removed:
+        add_log(f"古いテキスト解析の結果を削除: {removed}件")
+
+# 先行音声合成スレッドの開始（ニュースのタイトルも合成対象にするため、ニュースとVOICEVOXの準備後）
+def start_presynthesis(voicevox_ready):
+    if not PRESYNTH_ENABLED or voicevox_ready.exception() is not None:
+        return
+    threading.Thread(target=presynthesis_thread, daemon=True).start()
+
+# 段階ごとの起動時間をログに出す
+def report_startup():
+    for line in startup.report().splitlines():
+        add_log(line)
+
 def main():
-    # GUIスレッドの開始
-    gui_thread_instance = threading.Thread(target=run_gui, daemon=True)
-    gui_thread_instance.start()
+    """段階的に起動します。
     
-    # 音声再生スレッドの開始
-    audio_thread = threading.Thread(target=audio_player_thread, daemon=True)
-    audio_thread.start()
+    センサー・LED・キャッシュ済み音声の再生・イベントループを先に動かし、
+    VOICEVOXの辞書とモデルの読み込み、ニュース取得、GUIの作成は裏で並行して行います。
+    準備が終わるまでは、キャッシュにある音声だけで挨拶できます。
+    """
+    global startup
+    startup = Startup(started=IMPORT_STARTED, log=add_log)
+    startup.record("モジュール読み込み", IMPORT_STARTED, time.monotonic())
     
-    # VOICEVOXの初期化確認
-    global core
+    # 距離測定スレッドとLEDアニメーションスレッドの開始
     try:
-        if VoicevoxCore is not None:
-            from pathlib import Path
-            add_log("VOICEVOX Coreを初期化中...")
-            core = VoicevoxCore(open_jtalk_dict_dir=Path(VOICEVOX_DICT_PATH))
-            if core.is_model_loaded(SPEAKER_ID):
-                add_log(f"VOICEVOX モデル {SPEAKER_ID} はすでにロードされています")
-            else:
-                add_log(f"VOICEVOX モデル {SPEAKER_ID} をロード中...")
-                core.load_model(SPEAKER_ID)
-            add_log("VOICEVOX Core 初期化完了")
-    except Exception as e:
-        add_log(f"VOICEVOX初期化エラー: {e}")
-        core = None
+        startup.run("センサー・LED", start_hardware)
+    except HardwareBusyError as e:
+        print(e)
+        sys.exit(1)
+    
+    # 計測のHTTPエンドポイントを開始
+    if METRICS_PORT:
+        try:
+            metrics.start_http_server(METRICS_PORT)
+            add_log(f"計測: http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            add_log(f"計測のHTTPサーバーを開始できません: {e}")
+    
+    # 裏で準備する段階（辞書 → モデル、ニュース、GUI、キャッシュの検査）
+    if VOICEVOX_AVAILABLE:
+        core_ready = startup.background("VOICEVOX辞書", init_voicevox_core)
+        voicevox_ready = startup.background("VOICEVOXモデル", load_default_voice_model,
+                                            after=[core_ready])
+    else:
+        voicevox_ready = concurrent.futures.Future()
+        voicevox_ready.set_exception(RuntimeError("VOICEVOXがインストールされていません"))
+    # 見出しの感情を判定するので、感情の語彙はニュースより先に読み込む
+    startup.run("感情の語彙", emotion_classifier.maybe_reload)
+    news_ready = startup.background("ニュース読み込み", start_news)
+    gui_ready = concurrent.futures.Future()
+    threading.Thread(target=run_gui, args=(gui_ready,), name="GUI", daemon=True).start()
     
-    # 初回ニュース取得
-    fetch_news()
+    # キャッシュ済みの音声はすぐ再生できるようにする
+    startup.run("音声キャッシュ", load_audio_cache)
+    threading.Thread(target=audio_player_thread, daemon=True).start()
+    threading.Thread(target=synthesis_worker_thread, daemon=True).start()
+    cache_checked = startup.background("キャッシュ検査", validate_audio_cache)
     
-    global last_interaction_time, current_distance
-    idle_counter = 0
+    # 先行合成はニュースとVOICEVOXの準備後、合成失敗の再試行はすぐに開始
+    startup.when_done([voicevox_ready, news_ready], start_presynthesis, voicevox_ready)
+    threading.Thread(target=voice_retry_thread, daemon=True).start()
     
     # 初期状態設定
     set_emotion_led("normal")
     
+    # イベントの登録（距離は測定スレッドで処理し、在室状態が変わった時だけループに届く）
+    register_event_handlers()
+    hw.ranger.add_listener(on_distance_reading)
+    
+    # 全段階が終わったら所要時間を出す
+    startup.when_done([voicevox_ready, news_ready, gui_ready, cache_checked], report_startup)
+    
     add_log("ずんだもん対話システム起動完了！")
     
     try:
-        while True:
-            # 距離取得
-            current_distance = get_distance()
-            current_time = time.time()
-            
-            # 音声生成中または再生中は処理をスキップ
-            if is_generating_voice or is_playing_audio:
-                time.sleep(0.1)
-                continue
-                
-            # 人が近くにいる場合（1.5m以内）
-            if current_distance < 150:
-                # 前回の対話から30秒以上経過している場合
-                if current_time - last_interaction_time > 30:
-                    # 挨拶メッセージと時刻表示
-                    greeting = greeting_on_approach()
-                    message = f"{greeting}"
-                    add_log(f"挨拶: {message}")
-                    
-                    # 音声生成と再生
-                    audio_file = generate_voice(message)
-                    if audio_file:
-                        audio_queue.put(audio_file)
-                    
-                    last_interaction_time = current_time
-                    idle_counter = 0
-                
-                # 1m以内に近づいた場合はニュース提供
-                elif current_distance < 100 and current_time - last_interaction_time > 15:
-                    # ニュース話題
-                    topic = get_random_news_topic()
-                    add_log(f"ニュース提供: {topic}")
-                    
-                    # 音声生成と再生
-                    audio_file = generate_voice(topic)
-                    if audio_file:
-                        audio_queue.put(audio_file)
-                    else:
-                        add_log("ニュース音声の生成に失敗しました")
-                    
-                    last_interaction_time = current_time
-                    idle_counter = 0
-                
-                # 0.5m以内に近づいた場合はより対話的な会話
-                elif current_distance < 50 and current_time - last_interaction_time > 10:
-                    # ランダムな話題と質問
-                    question = generate_random_question()
-                    add_log(f"質問: {question}")
-                    
-                    # 応答生成
-                    response = generate_response(question)
-                    add_log(f"応答: {response}")
-                    
-                    # 音声生成と再生
-                    audio_file = generate_voice(response)
-                    if audio_file:
-                        audio_queue.put(audio_file)
-                    
-                    last_interaction_time = current_time
-                    idle_counter = 0
-            
-            # 人がいない場合のアイドル行動
-            else:
-                idle_counter += 1
-                
-                # 約10分ごとに独り言（600秒 ÷ 0.1秒のスリープ = 6000）
-                if idle_counter >= 6000:
-                    idle_topic = get_idle_topic()
-                    add_log(f"独り言: {idle_topic}")
-                    
-                    # 音声生成と再生
-                    audio_file = generate_voice(idle_topic)
-                    if audio_file:
-                        audio_queue.put(audio_file)
-                    
-                    idle_counter = 0
-            
-            # 少し待機
-            time.sleep(0.1)
+        # 何も起きていない間は眠り、イベントやタイマーが来たらすぐに反応する
+        event_loop.run_forever()
             
     except KeyboardInterrupt:
         add_log("プログラムを終了します。")
     
     finally:
         # 終了処理
-        GPIO.cleanup()
-        set_led_color(0, 0, 0)
+        if audio_sink:
+            audio_sink.close()
+        audio_cache.save()
+        stats = audio_cache.get_stats()
+        add_log(f"音声キャッシュ: ヒット率 {stats['hit_rate']:.0%} "
+                f"(ヒット {stats['hits']} / ミス {stats['misses']}, 削除 {stats['evictions']}件)")
+        add_log(voice_pool.summary())
+        stats = query_cache.get_stats()
+        add_log(f"テキスト解析キャッシュ: ヒット率 {stats['hit_rate']:.0%} "
+                f"(ヒット {stats['hits']} / ミス {stats['misses']})")
+        log_buffer.flush()
+        hw.close()  # 測定とLEDを止め、LEDを消してピンを解放する
         sys.exit()
         
 if __name__ == "__main__":